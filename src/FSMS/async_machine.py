@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+from collections.abc import AsyncIterator, Callable, Hashable, Iterable
+from concurrent.futures import Executor
+from functools import partial
+from itertools import islice
+from typing import Any
+
+from batch import ERROR, OK, REJECTED, BatchResult, normalize
+from condition import Condition
+from event import _replaying, Event, EventData
+from exception import MachineError
+from machine import Machine
+from parallel import DispatchResult, partition, trigger_chunk_async
+from state import State
+from transition import Transition
+from util import Callback, Callbacks, StateParam, StatesParam
+
+_in_transition: contextvars.ContextVar[bool] = contextvars.ContextVar('_in_transition', default=False)
+""" Set while a trigger is processed so that triggers fired from callbacks run inline. """
+
+
+async def maybe_await(result: Any) -> Any:
+    """ Awaits result if it is awaitable and returns it unchanged otherwise. """
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class AsyncCondition(Condition):
+    """ A Condition whose check is a coroutine. The predicate itself may be a regular function or a coroutine. """
+
+    __slots__ = ()
+
+    async def check(self, event_data: EventData) -> bool:
+        predicate = event_data.machine.resolve_callable(self._func, event_data)
+        if event_data.machine.send_event:
+            return await maybe_await(predicate(event_data)) == self._target
+        return await maybe_await(predicate(*event_data.args, **event_data.kwargs)) == self._target
+
+
+class AsyncState(State):
+    """ A State whose enter and exit callbacks are awaited. """
+
+    __slots__ = ()
+
+    async def enter(self, event_data: EventData) -> None:
+        """ Triggered when a state is entered. """
+        if self.timeout:
+            event_data.machine._arm_timeout(event_data.model, self)
+        await event_data.machine.callbacks(self._on_enter, event_data)
+
+    async def exit(self, event_data: EventData) -> None:
+        """ Triggered when a state is exited. """
+        await event_data.machine.callbacks(self._on_exit, event_data)
+        if event_data.machine._timers:
+            event_data.machine._cancel_timers(event_data.model, self.name)
+
+
+class AsyncTransition(Transition):
+    """ A Transition which awaits its conditions and callbacks.
+
+    Once all conditions passed, other transitions of the same model which are still in progress are cancelled.
+    """
+
+    condition_cls = AsyncCondition
+
+    __slots__ = ()
+
+    async def _eval_conditions(self, event_data: EventData) -> bool:
+        for cond in self._conditions:
+            if not await cond.check(event_data):
+                return False
+        return True
+
+    async def _change2dest(self, event_data: EventData, dest: State | None = None) -> None:
+        machine = event_data.machine
+        if dest is None:
+            dest = machine.get_state(self._dest)
+        await event_data.state.exit(event_data)
+        machine.set_state(event_data.model, dest)
+        event_data.update(dest)
+        await dest.enter(event_data)
+
+    async def execute(self, event_data: EventData) -> bool:
+        """ Execute the transition.
+
+        Args:
+            event_data: An EventData instance.
+
+        Returns:
+            Indicates whether the transition was successfully executed (True if successful, False if not).
+        """
+        machine = event_data.machine
+        await machine.callbacks(self._prepare, event_data)
+        if not await self._eval_conditions(event_data):
+            return False
+        machine.switch_model_context(event_data.model)
+        compiled = self._compiled if machine._dispatch is not None else None
+        if compiled is None:
+            await machine.callbacks(machine.before_state_change, event_data)
+            await machine.callbacks(self._before, event_data)
+            if self._dest:
+                await self._change2dest(event_data)
+            await machine.callbacks(machine.after_state_change, event_data)
+            await machine.callbacks(self._after, event_data)
+            return True
+
+        dest, before, after = compiled
+        await machine.callbacks(before, event_data)
+        if dest is not None:
+            await self._change2dest(event_data, dest)
+        await machine.callbacks(after, event_data)
+        return True
+
+
+class AsyncEvent(Event):
+    """ An Event whose trigger is a coroutine. """
+
+    __slots__ = ()
+
+    async def _trigger(self, model: Any, *args, **kwargs):
+        return await maybe_await(super()._trigger(model, *args, **kwargs))
+
+    async def _process(self, event_data: EventData):
+        machine = self._machine
+        await machine.callbacks(machine.prepare_event, event_data)
+        transitions = self._dispatch if machine._dispatch is not None else self.transitions
+        journal = machine.journal
+        seq = journal.begin() if journal is not None and _replaying.get() is not machine else None
+        try:
+            for trans in transitions[event_data.state.name]:
+                event_data.transition = trans
+                if await trans.execute(event_data):
+                    event_data.result = True
+                    break
+        except Exception as e:
+            event_data.error = e
+            if machine.on_exception:
+                await machine.callbacks(machine.on_exception, event_data)
+            else:
+                raise
+        finally:
+            try:
+                await machine.callbacks(machine.finalize_event, event_data)
+            except Exception:
+                pass
+            if seq is not None:
+                journal.end(seq, event_data)
+        return event_data.result
+
+    async def trigger(self, model: Any, *args, **kwargs):
+        func = partial(self._trigger, model, *args, **kwargs)
+        return await self._machine.process_context(func, model)
+
+
+class AsyncMachine(Machine):
+    """ A Machine whose triggers are coroutines.
+
+    Callbacks and conditions may be coroutine functions or regular functions. Every trigger which is not fired from
+    within a callback runs in its own task. When a transition of a model passes its conditions, all other tasks still
+    processing a trigger of the same model are cancelled and their triggers return False.
+
+    Attributes:
+        async_tasks (dict): Running trigger tasks per model id.
+    """
+
+    state_cls = AsyncState
+    event_cls = AsyncEvent
+    transition_cls = AsyncTransition
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get('pool_event_data'):
+            raise ValueError("AsyncMachine does not support pooled EventData since events may be processed "
+                             "concurrently.")
+        self.async_tasks: dict[int, list[asyncio.Task]] = {}
+        self._superseded: set[asyncio.Task] = set()
+        super().__init__(*args, **kwargs)
+
+    async def dispatch(self, trigger: str, *args, only_in: StateParam | StatesParam | None = None, **kwargs) -> bool:
+        """ Triggers an event on all models concurrently. See Machine.dispatch for the arguments. """
+        results = await asyncio.gather(*[getattr(model, trigger)(*args, **kwargs)
+                                         for model in self._dispatch_targets(trigger, only_in)])
+        return all(results)
+
+    async def dispatch_parallel(self, trigger: str, *args, executor: Executor | None = None, chunk_size: int = 1000,
+                                only_in: StateParam | StatesParam | None = None,
+                                key: Callable[[Any], Hashable] | None = None,
+                                **kwargs) -> AsyncIterator[DispatchResult]:
+        """ Triggers an event on all models in chunks which run as concurrent tasks of the running event loop.
+
+        The models of a chunk are triggered one after another. Results are yielded per model as soon as their chunk
+        has completed and errors are reported per model. Remaining tasks are cancelled when iteration stops early.
+        See Machine.dispatch_parallel for the arguments.
+
+            async for result in machine.dispatch_parallel('advance', chunk_size=100):
+                ...
+
+        Raises:
+            ValueError: If an executor is passed. Coroutine triggers cannot run in a concurrent.futures executor.
+        """
+        if executor is not None:
+            raise ValueError("AsyncMachine.dispatch_parallel runs chunks as tasks of the event loop and does not "
+                             "accept an executor.")
+        chunks = partition(list(self._dispatch_targets(trigger, only_in)), chunk_size, key)
+        tasks = [asyncio.ensure_future(trigger_chunk_async(chunk, trigger, args, kwargs)) for chunk in chunks]
+        try:
+            for future in asyncio.as_completed(tasks):
+                for result in await future:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def apply_batch(self, events: Iterable[tuple], batch_size: int = 10000) -> AsyncIterator[BatchResult]:
+        """ Applies a stream of events to models and reports the outcome of every event instead of raising.
+
+        Events are consumed in windows of batch_size. Within a window, the events of a model are awaited one after
+        another in the order they were passed while different models are processed concurrently. Transitions are
+        compiled once per call like in Machine.apply_batch. See Machine.apply_batch for the arguments.
+
+            async for result in machine.apply_batch(events):
+                ...
+        """
+        events = iter(events)
+        compiled = self._dispatch is None
+        if compiled:
+            self._compile()
+        try:
+            while True:
+                window = [normalize(item) for item in islice(events, batch_size)]
+                if not window:
+                    return
+                outcomes: list[BatchResult | None] = [None] * len(window)
+                by_model: dict[int, list[int]] = {}
+                for index, item in enumerate(window):
+                    by_model.setdefault(id(item[0]), []).append(index)
+                await asyncio.gather(*[self._apply_model(window, indices, outcomes) for indices in by_model.values()])
+                for outcome in outcomes:
+                    yield outcome
+        finally:
+            if compiled and not self.frozen:
+                self._dispatch = None
+
+    async def _apply_model(self, window: list[tuple[Any, str, tuple, dict]], indices: list[int],
+                           outcomes: list[BatchResult | None]) -> None:
+        for index in indices:
+            outcomes[index] = await self._apply_single(*window[index])
+
+    async def _apply_single(self, model: Any, trigger: str, args: tuple, kwargs: dict) -> BatchResult:
+        try:
+            result = await self._get_trigger(model, trigger, *args, **kwargs)
+        except MachineError as e:
+            return BatchResult(model, trigger, REJECTED, e)
+        except Exception as e:
+            return BatchResult(model, trigger, ERROR, e)
+        return BatchResult(model, trigger, OK if result else REJECTED, None)
+
+    async def callbacks(self, funcs: Callbacks, event_data: EventData) -> None:
+        for func in funcs:
+            await self.callback(func, event_data)
+
+    async def callback(self, func: Callback, event_data: EventData) -> None:
+        func = self.resolve_callable(func, event_data)
+        if self.send_event:
+            await maybe_await(func(event_data))
+        else:
+            await maybe_await(func(*event_data.args, **event_data.kwargs))
+
+    async def may_trigger(self, model: Any, trigger: str, *args, call_prepare: bool = False, **kwargs) -> bool:
+        """ Awaits the conditions (and prepare callbacks if call_prepare is set) of trigger. See Machine.may_trigger. """
+        candidates = self._may_trigger_candidates(model, trigger, args, kwargs)
+        if candidates is None:
+            return False
+        event_data, transitions = candidates
+        if call_prepare:
+            await self.callbacks(self.prepare_event, event_data)
+        for trans in transitions:
+            event_data.transition = trans
+            if call_prepare:
+                await self.callbacks(trans._prepare, event_data)
+            if await trans._eval_conditions(event_data):
+                return True
+        return False
+
+    def _fire_timer(self, model: Any, trigger: str, args: tuple, kwargs: dict, state: str) -> asyncio.Task:
+        """ Runs the trigger of an expired timer in a task. The timing wheel must be driven from the event loop,
+        e.g. by an AsyncioDriver. """
+        return asyncio.get_running_loop().create_task(super()._fire_timer(model, trigger, args, kwargs, state))
+
+    async def _get_trigger(self, model: Any, trigger_name: str, *args, **kwargs) -> bool:
+        return await maybe_await(super()._get_trigger(model, trigger_name, *args, **kwargs))
+
+    async def process_context(self, func: Callable, model: Any):
+        """ Runs a trigger coroutine function of model.
+
+        Triggers fired from callbacks of another trigger run inline. All others are wrapped into a task which is
+        registered in async_tasks and can be cancelled by switch_model_context.
+
+        Returns:
+            The result of the trigger or False if it has been cancelled by a newer transition of model.
+        """
+        if _in_transition.get():
+            return await self.process(func)
+        task = asyncio.ensure_future(self._run_in_transition(func))
+        key = id(model)
+        self.async_tasks.setdefault(key, []).append(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task in self._superseded:
+                return False
+            raise
+        finally:
+            self._superseded.discard(task)
+            tasks = self.async_tasks.get(key)
+            if tasks is not None:
+                tasks.remove(task)
+                if not tasks:
+                    del self.async_tasks[key]
+
+    async def _run_in_transition(self, func: Callable):
+        _in_transition.set(True)
+        return await self.process(func)
+
+    def switch_model_context(self, model: Any) -> None:
+        """ Cancels all tasks processing a trigger of model except the current one. """
+        current = asyncio.current_task()
+        for task in self.async_tasks.get(id(model), ()):
+            if task is not current and not task.done():
+                self._superseded.add(task)
+                task.cancel()
+
+    async def process(self, trigger: Callable):
+        """ Awaits a trigger coroutine function immediately or queues it. See Machine.process. """
+        if not self._queued:
+            return await trigger()
+
+        key, queue = self._get_queue(trigger.args[0])
+        queue.append(trigger)
+        if len(queue) > 1:
+            return True
+        try:
+            result = await queue[0]()
+            queue.popleft()
+            while queue:
+                await queue[0]()
+                queue.popleft()
+        except BaseException:
+            queue.clear()
+            raise
+        finally:
+            self._release_queue(key, queue)
+        return result
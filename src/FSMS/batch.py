@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from typing import Any, NamedTuple
+
+OK = 'ok'
+""" The event executed a transition. """
+REJECTED = 'rejected'
+""" The event was not valid in the current state of the model or no transition passed its conditions. """
+ERROR = 'error'
+""" The event raised an exception. """
+
+
+class BatchResult(NamedTuple):
+    """ Outcome of a single event of Machine.apply_batch.
+
+    Attributes:
+        model: The model the event has been applied to.
+        trigger: Name of the trigger.
+        status: One of OK, REJECTED or ERROR.
+        error: The raised exception for ERROR. The raised MachineError for REJECTED, e.g. of an invalid trigger or
+        an invalid trigger fired from a callback, or None if no transition passed its conditions or invalid triggers
+        are ignored. None for OK.
+    """
+    model: Any
+    trigger: str
+    status: str
+    error: BaseException | None
+
+
+def normalize(item: tuple) -> tuple[Any, str, tuple, dict]:
+    """ Expands (model, trigger), (model, trigger, args) and (model, trigger, args, kwargs) to four elements. """
+    if len(item) == 2:
+        return item[0], item[1], (), {}
+    model, trigger, *rest = item
+    args = rest[0] if rest and rest[0] is not None else ()
+    kwargs = rest[1] if len(rest) > 1 and rest[1] is not None else {}
+    return model, trigger, tuple(args), kwargs
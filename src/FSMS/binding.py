@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import copyreg
+from functools import partial
+from typing import Any, TYPE_CHECKING
+from weakref import WeakValueDictionary
+
+if TYPE_CHECKING:
+    from machine import Machine
+
+MACHINES = '__fsms_machines__'
+""" Name of the attribute holding the class or lazy bound machines of a model. """
+
+_model_classes: WeakValueDictionary[int, type] = WeakValueDictionary()
+""" Generated model classes by id of their original class. """
+_lazy_model_classes: WeakValueDictionary[int, type] = WeakValueDictionary()
+""" Generated lazy model classes by id of their original class. """
+
+
+class TriggerDescriptor:
+    """ Class level replacement for the trigger partials a Machine binds to every model.
+
+    The machines of a model are stored on the model itself (see MACHINES), so one descriptor serves all instances of
+    a class, even if they are attached to different machines. The event is looked up in the first machine of the model
+    that knows it when the attribute is accessed. Hence, events replaced at runtime are picked up.
+
+    Attributes:
+        _name (str): Name of the event.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __get__(self, model: Any, owner: type | None = None):
+        if model is None:
+            return self
+        name = self._name
+        for machine in model.__fsms_machines__:
+            event = machine.events.get(name)
+            if event is not None:
+                return partial(event.trigger, model)
+        raise AttributeError(f"'{type(model).__name__}' object has no attribute '{name}'")
+
+
+class StateCheckDescriptor:
+    """ Class level replacement for the is_{state} convenience functions of a model.
+
+    Attributes:
+        _attribute (str): The state attribute of the machines that own the check.
+        _state (str): The name of the checked state.
+    """
+
+    def __init__(self, attribute: str, state: str):
+        self._attribute = attribute
+        self._state = state
+
+    def __get__(self, model: Any, owner: type | None = None):
+        if model is None:
+            return self
+        for machine in model.__fsms_machines__:
+            if machine.state_attribute == self._attribute:
+                state = machine.states.get(self._state)
+                if state is not None:
+                    return partial(machine.is_state, model, state.value)
+        name = f'is_{self._state}' if self._attribute == 'state' else f'is_{self._attribute}_{self._state}'
+        raise AttributeError(f"'{type(model).__name__}' object has no attribute '{name}'")
+
+
+class TriggerFunctionDescriptor:
+    """ Class level replacement for the generic trigger(name, *args, **kwargs) function of a model. """
+
+    def __get__(self, model: Any, owner: type | None = None):
+        if model is None:
+            return self
+        if not model.__fsms_machines__:
+            raise AttributeError(f"'{type(model).__name__}' object has no attribute 'trigger'")
+        return partial(_trigger, model)
+
+
+def _trigger(model: Any, trigger_name: str, *args, **kwargs) -> bool:
+    """ Triggers an event of the first machine of model that knows it. The first machine handles unknown names. """
+    machines = model.__fsms_machines__
+    machine = next((machine for machine in machines if trigger_name in machine.events), machines[0])
+    return machine._get_trigger(model, trigger_name, *args, **kwargs)
+
+
+def model_class(cls: type, lazy: bool) -> type:
+    """ Returns the subclass of cls which carries the trigger and state descriptors of all machines.
+
+    One subclass is generated per original class (and binding mode) and shared by all machines. It does not add
+    instance attributes (empty __slots__). Thus, models can be switched to it by assigning __class__. The machines of a
+    model are stored in an instance attribute (see machine_class for models without one). Models are pickled and
+    copied as instances of their original class without their machines.
+
+    The lazy variant derives from the regular one and resolves triggers and is_{state} checks in __getattr__ on first
+    access. Resolved names get a descriptor on the class, so subsequent accesses do not reach __getattr__ again.
+    Unknown names are passed on to __getattr__ of cls if it defines one.
+
+    Args:
+        cls: The class of the model. Generated classes are mapped to their original class.
+        lazy: Whether the lazy variant is requested. Models that already use the lazy variant keep it.
+
+    Returns:
+        The generated subclass.
+    """
+    lazy = lazy or getattr(cls, '__fsms_lazy__', False)
+    cls = getattr(cls, '__fsms_class__', cls)
+    model_cls = _model_classes.get(id(cls))
+    if model_cls is None or model_cls.__fsms_class__ is not cls:
+        model_cls = _model_classes[id(cls)] = type(cls.__name__, (cls,), {
+            '__slots__': (), '__module__': cls.__module__, '__qualname__': cls.__qualname__, '__fsms_class__': cls,
+            MACHINES: (), '__reduce_ex__': _reduce_ex})
+        # descriptors are installed on this class, so they are visible to its lazy and per machine subclasses
+        model_cls.__fsms_model_class__ = model_cls
+        bind2cls(model_cls, 'trigger', TriggerFunctionDescriptor())
+    if not lazy:
+        return model_cls
+    lazy_cls = _lazy_model_classes.get(id(cls))
+    if lazy_cls is None or lazy_cls.__fsms_class__ is not cls:
+        lazy_cls = _lazy_model_classes[id(cls)] = type(cls.__name__, (model_cls,), {
+            '__slots__': (), '__module__': cls.__module__, '__qualname__': cls.__qualname__, '__fsms_lazy__': True,
+            '__getattr__': _lazy_getattr})
+    return lazy_cls
+
+
+def machine_class(model_cls: type, machines: tuple[Machine, ...]) -> type:
+    """ Creates a subclass of a generated model class whose instances are bound to machines. Models without an instance
+    dictionary cannot store their machines and use such a class instead. """
+    return type(model_cls.__name__, (model_cls,), {'__slots__': (), '__module__': model_cls.__module__,
+                                                   '__qualname__': model_cls.__qualname__, MACHINES: machines})
+
+
+def _lazy_getattr(model: Any, name: str) -> Any:
+    model_cls = type(model)
+    if not name.startswith('__'):
+        for machine in getattr(model, MACHINES):
+            descriptor = machine._binding_descriptor(name)
+            if descriptor is not None:
+                bind2cls(model_cls.__fsms_model_class__, name, descriptor)
+                return descriptor.__get__(model, model_cls)
+    fallback = getattr(model_cls.__fsms_class__, '__getattr__', None)
+    if fallback is not None:
+        return fallback(model, name)
+    raise AttributeError(f"'{model_cls.__name__}' object has no attribute '{name}'")
+
+
+def _reduce_ex(model: Any, protocol: int):
+    """ Reduces a model like its original class would and replaces the generated class and the machines. """
+    model_cls = type(model)
+    cls = model_cls.__fsms_class__
+    reduced = cls.__reduce_ex__(model, protocol)
+    if isinstance(reduced, str):
+        return reduced
+    func, args, *rest = reduced
+    if func is copyreg.__newobj__ and args[0] is model_cls:
+        # pickle requires __newobj__ to receive the class of the object
+        func, args = (copyreg._reconstructor, (cls, object, None)) if len(args) == 1 else (_new_model, (cls, *args[1:]))
+    elif func is copyreg.__newobj_ex__ and args[0] is model_cls:
+        func, args = _new_model_ex, (cls, *args[1:])
+    else:
+        func = cls if func is model_cls else func
+        args = tuple(cls if arg is model_cls else arg for arg in args)
+    if rest:
+        state = rest[0]
+        if isinstance(state, tuple) and len(state) == 2:
+            state = (_strip_machines(state[0]), state[1])
+        else:
+            state = _strip_machines(state)
+        rest[0] = state
+    return (func, args, *rest)
+
+
+def _new_model(cls: type, *args) -> Any:
+    return cls.__new__(cls, *args)
+
+
+def _new_model_ex(cls: type, args: tuple, kwargs: dict) -> Any:
+    return cls.__new__(cls, *args, **kwargs)
+
+
+def _strip_machines(state: Any) -> Any:
+    if isinstance(state, dict) and MACHINES in state:
+        state = dict(state)
+        del state[MACHINES]
+    return state
+
+
+def bind2cls(cls: type, name: str, descriptor: Any) -> None:
+    """ Like bind2obj, attributes already defined by the model class are not overridden. """
+    if hasattr(cls, name):
+        return
+    setattr(cls, name, descriptor)
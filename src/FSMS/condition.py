@@ -20,6 +20,8 @@ class Condition:
     level (rather than nesting under the Transition class).
     """
 
+    __slots__ = ('_func', '_target')
+
     def __init__(self, func: Callback, target: bool = True):
         self._func = func
         self._target = target
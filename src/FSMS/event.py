@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import contextvars
 from collections import defaultdict
-from typing import Any, Dict, List, TYPE_CHECKING
+from collections.abc import Iterator, Mapping
+from typing import Any, Dict, List, Sequence, Tuple, TYPE_CHECKING
 
 from itertools import chain
 from functools import partial
@@ -9,18 +11,28 @@ from functools import partial
 from exception import MachineError
 from state import State
 from transition import Transition
+from util import listify
 
 if TYPE_CHECKING:
     from machine import Machine
 
+_MISSING = object()
+""" Default of the state attribute lookup. Models without a state attribute load their state from the state store. """
+_replaying: contextvars.ContextVar[Machine | None] = contextvars.ContextVar('_replaying', default=None)
+""" The machine whose journal is replayed by Journal.replay in the current thread. Its events are not journaled and
+triggers fired from their callbacks are skipped. """
+
 
 class Event:
     """ A collection of transitions assigned to the same trigger. """
 
+    __slots__ = ('_name', '_machine', 'transitions', '_dispatch')
+
     def __init__(self, name: str, machine: Machine):
         self._name = name
         self._machine = machine
-        self.transitions: Dict[str, List[Transition]] = defaultdict(list)
+        self.transitions: Mapping[str, Sequence[Transition]] = defaultdict(list)
+        self._dispatch: Mapping[str, Sequence[Transition]] | None = None
 
     def _trigger(self, model: Any, *args, **kwargs):
         """ Internal trigger function called by the Machine instance.
@@ -34,8 +46,18 @@ class Event:
             Indicates whether a transition was successfully executed (True if successful, False if not).
         """
 
-        state = self._machine.get_model_state(model)
-        if state.name not in self.transitions:
+        machine = self._machine
+        if machine.frozen:
+            if machine._dispatch is None:
+                machine._compile()
+            state = machine._dispatch.get(getattr(model, machine.state_attribute, _MISSING))
+            if state is None:
+                state = machine.get_model_state(model)
+            transitions = self._dispatch
+        else:
+            state = machine.get_model_state(model)
+            transitions = self.transitions
+        if state.name not in transitions:
             ignore = state.ignore_invalid_triggers \
                 if state.ignore_invalid_triggers is not None \
                 else self._machine.ignore_invalid_triggers
@@ -43,13 +65,25 @@ class Event:
                 return False
             else:
                 raise MachineError(f"{self._machine.name} Cannot trigger event {self._name} from state {state.name}")
-        event_data = EventData(state, self, self._machine, model, args, kwargs)
-        return self._process(event_data)
+        pool = machine._event_data_pool
+        if pool is None:
+            return self._process(EventData(state, self, machine, model, args, kwargs))
+        event_data = pool.pop() if pool else EventData.__new__(EventData)
+        event_data.__init__(state, self, machine, model, args, kwargs)
+        try:
+            return self._process(event_data)
+        finally:
+            event_data.__init__(None, None, None, None, (), None)
+            if len(pool) < machine.EVENT_DATA_POOL_SIZE:
+                pool.append(event_data)
 
     def _process(self, event_data: EventData):
         self._machine.callbacks(self._machine.prepare_event, event_data)
+        transitions = self._dispatch if self._machine._dispatch is not None else self.transitions
+        journal = self._machine.journal
+        seq = journal.begin() if journal is not None and _replaying.get() is not self._machine else None
         try:
-            for trans in self.transitions[event_data.state.name]:
+            for trans in transitions[event_data.state.name]:
                 event_data.transition = trans
                 if trans.execute(event_data):
                     event_data.result = True
@@ -65,10 +99,35 @@ class Event:
                 self._machine.callbacks(self._machine.finalize_event, event_data)
             except Exception as e:
                 pass
+            if seq is not None:
+                journal.end(seq, event_data)
         return event_data.result
 
     def add_transition(self, transition: Transition):
-        self.transitions[transition.source].append(transition)
+        self.transitions.setdefault(transition.source, []).append(transition)
+        self._machine._invalidate()
+
+    def compile(self) -> None:
+        """ Builds the dispatch table of a frozen machine for this event.
+
+        Transitions are stored as tuples per source state name and resolve their destination state and merged callbacks
+        once instead of on every execution.
+        """
+        if isinstance(self.transitions, AutoTransitions):
+            self._dispatch = self.transitions
+        else:
+            self._dispatch = {source: tuple(transitions) for source, transitions in self.transitions.items()}
+        for trans in chain(*self.transitions.values()):
+            trans.compile(self._machine)
+
+    def bind(self, machine: Machine) -> Event:
+        """ Returns a copy of the event for machine which shares the transitions and the dispatch table. """
+        event = object.__new__(type(self))
+        event._name = self._name
+        event._machine = machine
+        event.transitions = self.transitions
+        event._dispatch = self._dispatch
+        return event
 
     def add_callback(self, trigger: str, func: str):
         for transition in chain(*self.transitions.values()):
@@ -79,9 +138,64 @@ class Event:
         return self._machine.process(func)
 
 
+class AutoTransitions(Mapping):
+    """ Transitions of an auto generated to_{state} event.
+
+    All states of the machine share a single transition to the target state which is resolved lazily on lookup instead
+    of being copied for every source state. This keeps memory per state constant and also covers states added later.
+    Transitions added explicitly for a source state are kept in order next to the shared transition.
+
+    Attributes:
+        _machine (Machine): The machine whose states are valid sources.
+        _shared (tuple): The shared transition returned for every state without custom transitions.
+        _custom (dict): Source state names mapped to explicitly added transitions (including the shared one).
+    """
+
+    def __init__(self, machine: Machine, transition: Transition,
+                 transitions: Mapping[str, Sequence[Transition]] | None = None):
+        self._machine = machine
+        self._shared: Tuple[Transition, ...] = (transition,)
+        self._custom: Dict[str, List[Transition]] = {}
+        if transitions:
+            for source, existing in transitions.items():
+                self._custom[source] = list(existing) + [transition]
+
+    def __getitem__(self, source: str) -> Sequence[Transition]:
+        try:
+            return self._custom[source]
+        except KeyError:
+            if source in self._machine.states:
+                return self._shared
+            raise
+
+    def __contains__(self, source: object) -> bool:
+        return source in self._custom or source in self._machine.states
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._machine.states
+        yield from (source for source in self._custom if source not in self._machine.states)
+
+    def __len__(self) -> int:
+        return len(self._machine.states) + sum(1 for source in self._custom if source not in self._machine.states)
+
+    def values(self) -> List[Sequence[Transition]]:
+        """ Returns every transition once, i.e. the shared transition is not repeated for every source state. """
+        shared = self._shared[0]
+        return [self._shared] + [[trans for trans in transitions if trans is not shared]
+                                 for transitions in self._custom.values()]
+
+    def setdefault(self, source: str, default: List[Transition] | None = None) -> List[Transition]:
+        """ Returns a mutable list of transitions for source which will be used for subsequent lookups. """
+        if source not in self._custom:
+            self._custom[source] = list(self._shared) if source in self._machine.states else listify(default)
+        return self._custom[source]
+
+
 class EventData:
     """ Collection of relevant data related to the ongoing transition attempt.
 
+    EventData uses __slots__ and may be reused for subsequent events when the machine pools EventData objects.
+
     Attributes:
         state (State): The State from which the Event was triggered.
         event (Event): The triggering Event.
@@ -94,6 +208,8 @@ class EventData:
         result (bool): True in case a transition has been successful, False otherwise.
     """
 
+    __slots__ = ('state', 'event', 'machine', 'model', 'args', 'kwargs', 'transition', 'error', 'result')
+
     def __init__(self, state: State, event: Event, machine: Machine, model: Any, args: tuple, kwargs: dict):
         """
         Args:
@@ -116,7 +232,8 @@ class EventData:
         """
 
         if not isinstance(state, State):
-            self.state = self.machine.get_state(state)
+            state = self.machine.get_state(state)
+        self.state = state
 
     def __repr__(self):
         return f"<{type(self).__name__}('{self.state}', {getattr(self, 'transition')})@{id(self)}>"
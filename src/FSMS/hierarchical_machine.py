@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from enum import Enum
+from itertools import chain
+from typing import Any, TYPE_CHECKING
+
+from event import AutoTransitions, Event
+from exception import MachineError
+from machine import Machine
+from state import State
+from transition import Transition
+from util import listify, Callback, Callbacks, StateParam, StatesParam
+
+if TYPE_CHECKING:
+    from event import EventData
+
+
+class NestedState(State):
+    """ A state which may be the child of another state and contain further states.
+
+    The name of a nested state is the path from the root state joined by Machine.SEPARATOR, e.g. 'A_1'. Models are
+    always assigned a full name.
+
+    Attributes:
+        parent (str): Name of the parent state or None for root states.
+        children (list): Names of the direct children.
+        initial (str): Name of the child that is entered when the state itself is the destination of a transition.
+        _path (tuple): Names of all ancestors from the root state down to (and including) this state.
+    """
+
+    __slots__ = ('parent', 'children', 'initial', '_path')
+
+    def __init__(self,
+                 name: str | Enum,
+                 on_enter: Callback | Callbacks | None = None,
+                 on_exit: Callback | Callbacks | None = None,
+                 ignore_invalid_triggers: bool | None = None,
+                 timeout: float = 0,
+                 timeout_trigger: str | None = None):
+        super().__init__(name, on_enter, on_exit, ignore_invalid_triggers, timeout, timeout_trigger)
+        self.parent: str | None = None
+        self.children: list[str] = []
+        self.initial: str | None = None
+        self._path: tuple[str, ...] = (self.name,)
+
+
+class NestedTransition(Transition):
+    """ A transition which exits and enters all states between the current state of the model and the destination.
+
+    Exit and enter chains are looked up in the table of the machine (see HierarchicalMachine._chain). The source of the
+    model might be a descendant of the transition's source since events bubble up to parent states.
+    """
+
+    __slots__ = ()
+
+    def _change2dest(self, event_data: EventData, dest: State | None = None) -> None:
+        machine = event_data.machine
+        chain_ = machine._chains.get((event_data.state.name, self._dest))
+        exits, enters, dest = chain_ if chain_ is not None else machine._chain(event_data.state.name, self._dest)
+        for state in exits:
+            state.exit(event_data)
+        machine.set_state(event_data.model, dest)
+        event_data.update(dest)
+        for state in enters:
+            state.enter(event_data)
+
+
+class NestedEvent(Event):
+    """ An event whose dispatch table contains the transitions of a state followed by those of its ancestors.
+
+    When no transition of the current state passes its conditions, the transitions of the parent are evaluated and so
+    forth. Since the bubbled transitions are collected when the machine compiles, triggering does a single lookup like
+    a flat machine.
+    """
+
+    __slots__ = ()
+
+    def compile(self) -> None:
+        if isinstance(self.transitions, AutoTransitions):
+            super().compile()
+            return
+        machine = self._machine
+        own = {machine._state_name(source): tuple(transitions) for source, transitions in self.transitions.items()}
+        dispatch: dict[str, tuple[Transition, ...]] = {}
+        # parents are registered before their children, so the bubbled transitions of a parent are already known
+        for name, state in machine.states.items():
+            bubbled = own.get(name, ()) + dispatch.get(state.parent, ())
+            if bubbled:
+                dispatch[name] = bubbled
+        self._dispatch = dispatch
+        for trans in chain(*self.transitions.values()):
+            trans.compile(machine)
+
+
+class HierarchicalMachine(Machine):
+    """ A machine with nested states.
+
+    States are passed as dictionaries with a list of 'children' and optionally an 'initial' child:
+
+        HierarchicalMachine(states=['idle', {'name': 'busy', 'children': ['loading', 'saving'], 'initial': 'loading'}],
+                            transitions=[['start', 'idle', 'busy'], ['save', 'busy_loading', 'busy_saving'],
+                                         ['cancel', 'busy', 'idle']], initial='idle')
+
+    Triggers valid in a parent state are valid in all of its descendants ('cancel' works in 'busy_saving'). A
+    transition exits every state from the current one up to the lowest common ancestor with the destination and enters
+    every state below it down to the destination's initial leaf. When the destination is an ancestor of the current
+    state (or the state itself), the destination is exited and entered again.
+
+    The exit and enter chains of every (source, destination) pair reachable through a transition are computed when the
+    machine compiles. Bubbled transitions are part of the compiled dispatch table of every event as well. Hence, a
+    HierarchicalMachine is always frozen and rebuilds its tables with the first trigger after the configuration
+    changed. Chains of pairs only reachable by to_{state} events are computed on first use and cached.
+
+    Enum states cannot be nested. Definitions of hierarchical machines cannot be dumped (see Machine.dump_definition).
+    """
+
+    state_cls = NestedState
+    event_cls = NestedEvent
+    transition_cls = NestedTransition
+
+    def __init__(self, *args, **kwargs):
+        self._chains: dict[tuple[str, str], tuple[tuple[NestedState, ...], tuple[NestedState, ...], NestedState]] = {}
+        super().__init__(*args, **kwargs)
+        self.freeze()
+
+    def unfreeze(self) -> None:
+        """ Drops the dispatch table which is rebuilt with the next trigger. The machine stays frozen. """
+        self._invalidate()
+
+    def dump_definition(self) -> bytes:
+        """ Raises a MachineError since snapshots of HierarchicalMachine are unsupported. """
+        raise MachineError(f"{self.name}Snapshots of {type(self).__name__} are unsupported since they do not cover "
+                           f"nested states.")
+
+    @classmethod
+    def load_definition(cls, data: bytes, model: Any | list[Any] = Machine.SELF_LITERAL, **kwargs):
+        """ Raises a MachineError since snapshots of HierarchicalMachine are unsupported. """
+        raise MachineError(f"Snapshots of {cls.__name__} are unsupported since they do not cover nested states.")
+
+    def add_states(self,
+                   states: StateParam | StatesParam | dict,
+                   on_enter: Callback | Callbacks | None = None,
+                   on_exit: Callback | Callbacks | None = None,
+                   ignore_invalid_triggers: bool | None = None,
+                   parent: str | None = None) -> None:
+        """ Adds states and their children.
+
+        Args:
+            states: Like Machine.add_states. Dictionaries may contain 'children' and 'initial' whose names are relative
+            to the state.
+            parent: Full name of the state the added states become children of.
+        """
+        parent_state: NestedState | None = self.get_state(parent) if parent is not None else None
+        ignore = ignore_invalid_triggers if ignore_invalid_triggers is not None else self.ignore_invalid_triggers
+        for state in listify(states):
+            children, initial = [], None
+            if isinstance(state, dict):
+                state = dict(state)
+                children = listify(state.pop('children', None))
+                initial = state.pop('initial', None)
+                state['name'] = self._child_name(parent, state['name'])
+                if 'ignore_invalid_triggers' not in state:
+                    state['ignore_invalid_triggers'] = ignore
+                state = self.state_cls(**state)
+            elif isinstance(state, (str, Enum)):
+                state = self.state_cls(self._child_name(parent, state), on_enter, on_exit, ignore_invalid_triggers)
+            state.parent = parent
+            state._path = (parent_state._path if parent_state is not None else ()) + (state.name,)
+            super().add_states(state)
+            if parent_state is not None:
+                parent_state.children.append(state.name)
+            if children:
+                self.add_states(children, parent=state.name)
+            if initial is not None:
+                state.initial = self.get_state(self._child_name(state.name, initial)).name
+
+    add_state = add_states
+
+    def _child_name(self, parent: str | None, name: StateParam) -> StateParam:
+        if parent is None:
+            return name
+        if isinstance(name, Enum):
+            raise ValueError(f"Enum state {name} cannot be nested in {repr(parent)}.")
+        return parent + self.SEPARATOR + name
+
+    def add_models(self, models: Any, initial: StateParam | None = None, restore: bool = True) -> None:
+        initial = initial if initial is not None else self.initial
+        if initial is not None:
+            initial = self._leaf(self.get_state(initial))
+        super().add_models(models, initial, restore)
+
+    def _leaf(self, state: NestedState) -> NestedState:
+        while state.initial is not None:
+            state = self.states[state.initial]
+        return state
+
+    def _subtree(self, name: str) -> Iterator[str]:
+        yield name
+        state = self.states.get(name)
+        if state is not None:
+            for child in state.children:
+                yield from self._subtree(child)
+
+    def _compile(self) -> None:
+        super()._compile()
+        for event in self.events.values():
+            if isinstance(event.transitions, AutoTransitions):
+                continue
+            for trans in chain(*event.transitions.values()):
+                if trans._dest is not None:
+                    for source in self._subtree(self._state_name(trans.source)):
+                        self._chain(source, trans._dest)
+
+    def _invalidate(self) -> None:
+        super()._invalidate()
+        self._chains = {}
+
+    def _chain(self, source: str, dest: str) -> tuple[tuple[NestedState, ...], tuple[NestedState, ...], NestedState]:
+        """ Returns the states to exit, the states to enter and the final state of a transition from source to dest.
+
+        The lowest common ancestor is the longest common prefix of both paths. If dest is source or one of its
+        ancestors, the lowest common ancestor is the parent of dest.
+        """
+        key = (source, dest)
+        chain_ = self._chains.get(key)
+        if chain_ is not None:
+            return chain_
+        source_path = self.states[source]._path
+        dest_state = self.states[dest]
+        dest_path = dest_state._path
+        depth = 0
+        for source_name, dest_name in zip(source_path, dest_path):
+            if source_name != dest_name:
+                break
+            depth += 1
+        if depth == len(dest_path):
+            depth -= 1
+        exits = tuple(self.states[name] for name in reversed(source_path[depth:]))
+        enters = [self.states[name] for name in dest_path[depth:]]
+        leaf = self._leaf(dest_state)
+        while enters[-1] is not leaf:
+            enters.append(self.states[enters[-1].initial])
+        chain_ = self._chains[key] = (exits, tuple(enters), leaf)
+        return chain_
+
+    def triggers_from(self, *states: StateParam) -> list[str]:
+        """ Collects the triggers of the given state(s) including those bubbling up to their ancestors. """
+        names = []
+        for state in states:
+            name = self._state_name(state)
+            names.extend(self.states[name]._path if name in self.states else (name,))
+        return super().triggers_from(*names)
+
+    def models_in(self, state: StateParam | State) -> Iterator[Any]:
+        """ Iterates over all models in state or one of its descendants. """
+        names = set(self._subtree(self._state_name(state)))
+        if self.index_models:
+            return iter([model for name in names for model in self._models_by_state.get(name, {}).values()])
+        return iter([model for model in self.models if self.get_model_state(model).name in names])
+
+    def count_in_state(self, state: StateParam | State) -> int:
+        """ Returns the number of models in state or one of its descendants. """
+        if self.index_models:
+            return sum(len(self._models_by_state.get(name, ())) for name in self._subtree(self._state_name(state)))
+        return sum(1 for _ in self.models_in(state))
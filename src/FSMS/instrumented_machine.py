@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Any
+
+from condition import Condition
+from event import Event, EventData
+from machine import Machine
+from metrics import Metrics
+from transition import Transition
+from util import Callback
+
+
+def callback_name(func: Callback) -> str:
+    """ Returns the name callbacks and conditions are recorded under. """
+    if isinstance(func, str):
+        return func
+    return getattr(func, '__qualname__', None) or repr(func)
+
+
+class InstrumentedCondition(Condition):
+    """ A Condition that records the latency and outcome of every check per condition name. """
+
+    __slots__ = ()
+
+    def check(self, event_data: EventData) -> bool:
+        metrics = event_data.machine.metrics
+        if metrics is None:
+            return super().check(event_data)
+        result = None
+        start = perf_counter()
+        try:
+            result = super().check(event_data)
+            return result
+        finally:
+            metrics.observe('conditions', callback_name(self._func), perf_counter() - start, result)
+
+
+class InstrumentedTransition(Transition):
+    """ A Transition that records the latency and outcome of every execution per (source, dest). """
+
+    condition_cls = InstrumentedCondition
+
+    __slots__ = ()
+
+    def execute(self, event_data: EventData) -> bool:
+        metrics = event_data.machine.metrics
+        if metrics is None:
+            return super().execute(event_data)
+        source = event_data.state.name
+        result = None
+        start = perf_counter()
+        try:
+            result = super().execute(event_data)
+            return result
+        finally:
+            metrics.observe('transitions', (source, self._dest), perf_counter() - start, result)
+
+
+class InstrumentedEvent(Event):
+    """ An Event that records the latency and outcome of every processed trigger. """
+
+    __slots__ = ()
+
+    def _process(self, event_data: EventData):
+        metrics = self._machine.metrics
+        if metrics is None:
+            return super()._process(event_data)
+        result = None
+        start = perf_counter()
+        try:
+            result = super()._process(event_data)
+            return result
+        finally:
+            metrics.observe('events', self._name, perf_counter() - start,
+                            None if event_data.error is not None else result)
+
+
+class InstrumentedMachine(Machine):
+    """ A Machine that records counts, failures and latency histograms of events, transitions, conditions and
+    callbacks.
+
+    Durations are inclusive, i.e. the latency of an event contains the latency of its transitions which contains the
+    latency of their callbacks. Plain Machine instances are not affected by instrumentation at all. Instrumentation of
+    an InstrumentedMachine can be paused by setting metrics to None. InstrumentedMachine can be combined with
+    LockedMachine, e.g. class Machine(InstrumentedMachine, LockedMachine), but not with AsyncMachine.
+
+    Attributes:
+        metrics: The collector observations are recorded in. A new Metrics instance is created if none is passed.
+    """
+
+    event_cls = InstrumentedEvent
+    transition_cls = InstrumentedTransition
+
+    def __init__(self, *args, metrics: Metrics | None = None, **kwargs):
+        self.metrics: Metrics | None = metrics if metrics is not None else Metrics()
+        super().__init__(*args, **kwargs)
+
+    def callback(self, func: Callback, event_data: EventData) -> None:
+        metrics = self.metrics
+        if metrics is None:
+            return super().callback(func, event_data)
+        result = None
+        start = perf_counter()
+        try:
+            super().callback(func, event_data)
+            result = True
+        finally:
+            metrics.observe('callbacks', callback_name(func), perf_counter() - start, result)
+
+    def snapshot(self) -> dict[str, dict[Any, dict[str, Any]]]:
+        """ Returns a snapshot of the collected metrics (see Metrics.snapshot). """
+        return self.metrics.snapshot() if self.metrics is not None else {}
@@ -0,0 +1,492 @@
+from __future__ import annotations
+
+import glob
+import inspect
+import mmap
+import os
+import pickle
+import struct
+import threading
+from collections import deque
+from collections.abc import Callable, Hashable, Iterator, Mapping
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+from event import _replaying
+
+if TYPE_CHECKING:
+    from event import EventData
+    from machine import Machine
+
+_HEADER = struct.Struct('<I')
+""" Length prefix of a serialized journal entry. """
+
+
+class JournalEntry(NamedTuple):
+    """ A processed event that changed (or kept) the state of a model.
+
+    Attributes:
+        seq: Sequence number. Events are numbered in the order they started processing.
+        key: The key of the model (see Journal).
+        trigger: Name of the processed trigger.
+        args: Positional arguments passed to the trigger.
+        kwargs: Keyword arguments passed to the trigger.
+        state: Name of the state the event transitioned the model to. Events triggered from callbacks of this event
+        are recorded as separate entries.
+    """
+    seq: int
+    key: Hashable
+    trigger: str
+    args: tuple
+    kwargs: dict
+    state: str
+
+
+class JournalBackend:
+    """ Storage of journal entries and the latest snapshot. """
+
+    def append(self, entry: JournalEntry) -> None:
+        raise NotImplementedError
+
+    def entries(self, after: int = 0) -> Iterator[JournalEntry]:
+        """ Returns all stored entries with a sequence number larger than after in the order they were appended. """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """ Makes all appended entries durable. """
+
+    def save_snapshot(self, seq: int, states: dict[Hashable, str]) -> None:
+        raise NotImplementedError
+
+    def load_snapshot(self) -> tuple[int, dict[Hashable, str]] | None:
+        raise NotImplementedError
+
+    def compact(self, seq: int) -> None:
+        """ Drops entries with a sequence number up to seq. Backends may keep some of them. """
+        raise NotImplementedError
+
+    def last_seq(self) -> int:
+        """ Returns the largest stored sequence number including the one of the snapshot or 0. """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MemoryBackend(JournalBackend):
+    """ Keeps entries in a ring buffer. The oldest entries are dropped once capacity is exceeded, so snapshots have to
+    be taken more often than every capacity events to be able to recover all models. Nothing survives the process. """
+
+    def __init__(self, capacity: int = 100000):
+        self._entries: deque[JournalEntry] = deque(maxlen=capacity)
+        self._snapshot: tuple[int, dict[Hashable, str]] | None = None
+
+    def append(self, entry: JournalEntry) -> None:
+        self._entries.append(entry)
+
+    def entries(self, after: int = 0) -> Iterator[JournalEntry]:
+        return (entry for entry in list(self._entries) if entry.seq > after)
+
+    def save_snapshot(self, seq: int, states: dict[Hashable, str]) -> None:
+        self._snapshot = (seq, dict(states))
+
+    def load_snapshot(self) -> tuple[int, dict[Hashable, str]] | None:
+        return self._snapshot
+
+    def compact(self, seq: int) -> None:
+        self._entries = deque((entry for entry in self._entries if entry.seq > seq), maxlen=self._entries.maxlen)
+
+    def last_seq(self) -> int:
+        seq = max((entry.seq for entry in self._entries), default=0)
+        return max(seq, self._snapshot[0]) if self._snapshot else seq
+
+
+class FileBackend(JournalBackend):
+    """ Appends length prefixed, pickled entries to a file.
+
+    Entries are written through a buffer and synced to disk (fsync) every sync_every entries, on flush and by a timer
+    at most sync_interval seconds after an entry has been appended, even if no further entries are appended. If the
+    timer fails to sync, the next flush raises the error again. Entries appended since the last sync may be lost on a
+    crash. A partially written last entry is ignored when the journal is read. The snapshot is stored next to
+    the journal as <path>.snapshot.
+
+    Attributes:
+        path: Path of the journal file.
+        sync_every: Maximum number of entries between two syncs.
+        sync_interval: Maximum number of seconds an appended entry stays unsynced. Entries are synced immediately if
+        it is 0.
+    """
+
+    def __init__(self, path: str, sync_every: int = 1000, sync_interval: float = 1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._unsynced = 0
+        self._timer: threading.Timer | None = None
+        self._lock = threading.RLock()
+        self._file = open(path, 'a+b')
+        self._file.seek(0)
+        entries, end = _scan(self._file.read())
+        self._file.truncate(end)  # drops an entry that has been partially written before a crash
+        self._last_seq = max((entry.seq for entry in entries), default=0)
+
+    def append(self, entry: JournalEntry) -> None:
+        with self._lock:
+            self._file.write(_encode(entry))
+            self._last_seq = max(self._last_seq, entry.seq)
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or self.sync_interval <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.sync_interval, self._sync_due)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync_due(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._file.closed or not self._unsynced:
+                return
+            try:
+                self.flush()
+            except Exception:
+                # the entries stay unsynced and the next flush raises again
+                pass
+
+    def entries(self, after: int = 0) -> Iterator[JournalEntry]:
+        with self._lock:
+            self._file.flush()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        return (entry for entry in _scan(data)[0] if entry.seq > after)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def save_snapshot(self, seq: int, states: dict[Hashable, str]) -> None:
+        _write_atomic(self.path + '.snapshot', pickle.dumps((seq, states), pickle.HIGHEST_PROTOCOL))
+
+    def load_snapshot(self) -> tuple[int, dict[Hashable, str]] | None:
+        return _read_snapshot(self.path + '.snapshot')
+
+    def compact(self, seq: int) -> None:
+        """ Rewrites the journal without the entries up to seq and atomically replaces the old file. """
+        with self._lock:
+            self.flush()
+            kept = b''.join(_encode(entry) for entry in self.entries(seq))
+            self._file.close()
+            _write_atomic(self.path, kept)
+            self._file = open(self.path, 'ab')
+
+    def last_seq(self) -> int:
+        snapshot = self.load_snapshot()
+        return max(self._last_seq, snapshot[0]) if snapshot else self._last_seq
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.flush()
+            self._file.close()
+
+
+class MmapBackend(JournalBackend):
+    """ Writes entries into preallocated, memory mapped segment files of a directory.
+
+    Appending an entry is a copy into the mapped segment. Segments are flushed (msync) every sync_every entries and
+    on flush. When a segment is full, the next numbered segment is created. Compaction deletes whole segments that
+    only contain entries up to the snapshot. The snapshot is stored in the
+    directory as 'snapshot'.
+
+    Attributes:
+        directory: Directory of the segment files.
+        segment_size: Size of a segment in bytes. Larger entries get a segment of their own.
+        sync_every: Maximum number of entries between two syncs.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 16 * 1024 * 1024, sync_every: int = 1000):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+        self._unsynced = 0
+        self._map: mmap.mmap | None = None
+        self._offset = 0
+        os.makedirs(directory, exist_ok=True)
+        self._segment = 0
+        segments = self._segments()
+        if segments:
+            self._segment = int(os.path.basename(segments[-1])[:-4])
+            self._open(segments[-1])
+            self._offset = _scan(self._map)[1]
+            # clear an entry that has been partially written before a crash
+            self._map[self._offset:] = bytes(len(self._map) - self._offset)
+        self._last_seq = max((entry.seq for entry in self.entries()), default=0)
+
+    def _segments(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(self.directory, '*.seg')))
+
+    def _open(self, path: str, size: int | None = None) -> None:
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+        with open(path, 'a+b') as f:
+            if size is not None:
+                f.truncate(size)
+            self._map = mmap.mmap(f.fileno(), 0)
+        self._offset = 0
+
+    def append(self, entry: JournalEntry) -> None:
+        record = _encode(entry)
+        # a zero length prefix marks the end of a segment, hence space for it has to remain
+        if self._map is None or self._offset + len(record) + _HEADER.size > len(self._map):
+            self._segment += 1
+            path = os.path.join(self.directory, f'{self._segment:010d}.seg')
+            self._open(path, max(self.segment_size, len(record) + _HEADER.size))
+        self._map[self._offset:self._offset + len(record)] = record
+        self._offset += len(record)
+        self._last_seq = max(self._last_seq, entry.seq)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.flush()
+
+    def entries(self, after: int = 0) -> Iterator[JournalEntry]:
+        for path in self._segments():
+            with open(path, 'rb') as f:
+                data = f.read()
+            yield from (entry for entry in _scan(data)[0] if entry.seq > after)
+
+    def flush(self) -> None:
+        if self._map is not None:
+            self._map.flush()
+        self._unsynced = 0
+
+    def save_snapshot(self, seq: int, states: dict[Hashable, str]) -> None:
+        _write_atomic(os.path.join(self.directory, 'snapshot'), pickle.dumps((seq, states), pickle.HIGHEST_PROTOCOL))
+
+    def load_snapshot(self) -> tuple[int, dict[Hashable, str]] | None:
+        return _read_snapshot(os.path.join(self.directory, 'snapshot'))
+
+    def compact(self, seq: int) -> None:
+        """ Deletes all segments but the active one which do not contain entries after seq. """
+        for path in self._segments()[:-1]:
+            with open(path, 'rb') as f:
+                entries = _scan(f.read())[0]
+            if all(entry.seq <= seq for entry in entries):
+                os.remove(path)
+
+    def last_seq(self) -> int:
+        snapshot = self.load_snapshot()
+        return max(self._last_seq, snapshot[0]) if snapshot else self._last_seq
+
+    def close(self) -> None:
+        if self._map is not None:
+            self.flush()
+            self._map.close()
+            self._map = None
+
+
+class Journal:
+    """ Append-only journal of the events processed by a machine which allows to recover the states of its models.
+
+    Pass a Journal to a Machine (journal=...) to record every event that executed a transition. Entries contain a key
+    of the model, the trigger and its arguments as well as the resulting state. Arguments have to be picklable for
+    the file based backends. Entries are numbered when an event starts processing so that events triggered from
+    callbacks are ordered after the event that caused them.
+
+    Attributes:
+        backend: Storage of entries and snapshots.
+        key: Returns a stable key of a model, e.g. its database id. The key has to identify the model across restarts.
+        snapshot_every: When larger than 0, a snapshot is taken and the journal is compacted automatically after this
+        many entries once no event is in progress.
+    """
+
+    def __init__(self, backend: JournalBackend, key: Callable[[Any], Hashable], snapshot_every: int = 0):
+        self.backend = backend
+        self.key = key
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._seq = backend.last_seq()
+        self._in_progress = 0
+        self._since_snapshot = 0
+
+    @property
+    def seq(self) -> int:
+        """ The sequence number of the most recently started event. """
+        return self._seq
+
+    def begin(self) -> int:
+        """ Assigns a sequence number to an event that starts processing. Called by Event._process. """
+        with self._lock:
+            self._seq += 1
+            self._in_progress += 1
+            return self._seq
+
+    def end(self, seq: int, event_data: EventData) -> None:
+        """ Records a processed event if it executed a transition. Called by Event._process. """
+        if event_data.result and event_data.error is None:
+            self._end(seq, event_data.machine, JournalEntry(
+                seq, self.key(event_data.model), event_data.event._name, event_data.args, event_data.kwargs or {},
+                event_data.state.name))
+        else:
+            self._end(seq, event_data.machine, None)
+
+    def record(self, machine: Machine, model: Any, trigger: str, args: tuple, kwargs: dict, state: str) -> int:
+        """ Records an event which has been processed by a copy of machine, e.g. in a worker process of
+        Machine.dispatch_parallel. Events triggered from its callbacks are not recorded separately.
+
+        Returns:
+            The sequence number of the entry.
+        """
+        seq = self.begin()
+        self._end(seq, machine, JournalEntry(seq, self.key(model), trigger, args, kwargs or {}, state))
+        return seq
+
+    def _end(self, seq: int, machine: Machine, entry: JournalEntry | None) -> None:
+        snapshot = False
+        with self._lock:
+            self._in_progress -= 1
+            if entry is not None:
+                self.backend.append(entry)
+                self._since_snapshot += 1
+                snapshot = self.snapshot_every and self._since_snapshot >= self.snapshot_every \
+                    and not self._in_progress
+        if snapshot:
+            self.snapshot(machine)
+
+    def entries(self, after: int = 0) -> list[JournalEntry]:
+        """ Returns all entries after sequence number after ordered by sequence number. """
+        return sorted(self.backend.entries(after), key=lambda entry: entry.seq)
+
+    def snapshot(self, machine: Machine) -> int:
+        """ Stores the states of all models of machine and drops the journal entries covered by it.
+
+        The snapshot should be taken while no event is processed. Otherwise, an event in progress might be reflected
+        by the snapshot as well as by its later journal entry.
+
+        Returns:
+            The sequence number the snapshot covers.
+        """
+        with self._lock:
+            seq = self._seq
+            states = {self.key(model): machine.get_model_state(model).name for model in machine.models}
+            self.backend.flush()
+            self.backend.save_snapshot(seq, states)
+            self.backend.compact(seq)
+            self._since_snapshot = 0
+        return seq
+
+    def replay(self, machine: Machine, models: Mapping[Hashable, Any] | None = None, state_only: bool = True,
+               factory: Callable[[Hashable], Any] | None = None) -> int:
+        """ Restores the states of models from the latest snapshot and the journal entries recorded after it.
+
+        Args:
+            machine: The machine the models belong to. Replayed events are not journaled again.
+            models: Models by key. Defaults to the models of machine.
+            state_only: When True (default), only the last recorded state of every model is assigned which requires a
+            single state change per model and skips all callbacks. Otherwise, the recorded triggers are fired again
+            in order. Triggers fired from callbacks are skipped since they have been recorded themselves and the
+            recorded state is enforced after every event.
+            factory: Creates a model for a key that is not part of models. The model is added to machine. Entries
+            of unknown models are skipped when no factory is passed.
+
+        Returns:
+            The number of applied journal entries.
+        """
+        models = dict(models) if models is not None else {self.key(model): model for model in machine.models}
+
+        def resolve(key: Hashable) -> Any:
+            model = models.get(key)
+            if model is None and factory is not None:
+                model = models[key] = factory(key)
+                machine.add_models(model)
+            return model
+
+        snapshot = self.backend.load_snapshot()
+        after = 0
+        if snapshot is not None:
+            after, states = snapshot
+            for key, state in states.items():
+                model = resolve(key)
+                if model is not None:
+                    machine.set_state(model, state)
+        entries = self.entries(after)
+
+        if state_only:
+            final = {entry.key: entry.state for entry in entries}
+            for key, state in final.items():
+                model = resolve(key)
+                if model is not None:
+                    machine.set_state(model, state)
+            return len(entries)
+
+        if inspect.iscoroutinefunction(type(machine).process):
+            raise ValueError("Triggers of an AsyncMachine cannot be replayed synchronously. Use state_only=True.")
+        # events of machine are not journaled and triggers fired from callbacks are skipped by Machine.process in this
+        # context only, i.e. triggers of other threads, e.g. expired timers, are processed and journaled as usual
+        token = _replaying.set(machine)
+        try:
+            for entry in entries:
+                model = resolve(entry.key)
+                if model is None:
+                    continue
+                machine.events[entry.trigger]._trigger(model, *entry.args, **entry.kwargs)
+                if machine.get_model_state(model).name != entry.state:
+                    machine.set_state(model, entry.state)
+        finally:
+            _replaying.reset(token)
+        return len(entries)
+
+    def flush(self) -> None:
+        with self._lock:
+            self.backend.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self.backend.close()
+
+
+def _encode(entry: JournalEntry) -> bytes:
+    data = pickle.dumps(tuple(entry), pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(data)) + data
+
+
+def _scan(data: bytes | mmap.mmap) -> tuple[list[JournalEntry], int]:
+    """ Decodes entries until the end of data, a zero length prefix or an incomplete entry.
+
+    Returns:
+        The decoded entries and the offset after the last complete entry.
+    """
+    entries = []
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        size, = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        if not size or start + size > len(data):
+            break
+        try:
+            entries.append(JournalEntry(*pickle.loads(data[start:start + size])))
+        except Exception:
+            break
+        offset = start + size
+    return entries, offset
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_snapshot(path: str) -> tuple[int, dict[Hashable, str]] | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
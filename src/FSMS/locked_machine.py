@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from machine import Machine
+
+
+class LockedMachine(Machine):
+    """ A Machine that can be triggered from multiple threads.
+
+    Events of one model are serialized by a reentrant lock of that model while events of different models run in
+    parallel. Hence, callbacks may trigger further events of the same model without deadlocking. Triggering another
+    model from a callback acquires that model's lock as well; callbacks of two models that trigger each other from
+    different threads should use queued='model' to avoid lock order inversion.
+
+    Attributes:
+        lock_stripes: When 0 (default), every model gets its own lock. Otherwise, models share a fixed number of
+        locks selected by model id which bounds memory for large model populations at the cost of false contention.
+        The lock of a model is created with its first event and kept until the model is removed by remove_models,
+        i.e. as long as the machine references the model anyway.
+    """
+
+    def __init__(self, *args, lock_stripes: int = 0, **kwargs):
+        if kwargs.get('queued') is True:
+            raise ValueError("LockedMachine does not support a shared queue. Use queued='model' instead.")
+        self.lock_stripes = lock_stripes
+        self._init_locks()
+        self._contended = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        super().__init__(*args, **kwargs)
+
+    def _init_locks(self) -> None:
+        self._stripes = [threading.RLock() for _ in range(self.lock_stripes)]
+        self._model_locks: dict[int, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        self._models_lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = super().__getstate__()
+        # locks cannot be pickled, copies get fresh ones
+        for attr in ('_stripes', '_model_locks', '_locks_guard', '_models_lock', '_stats_lock'):
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_locks()
+        super().__setstate__(state)
+
+    def get_lock(self, model: Any) -> threading.RLock:
+        """ Returns the lock that serializes events of model. """
+        if self._stripes:
+            # Fibonacci hashing spreads the aligned object addresses evenly over all stripes. The product is truncated
+            # to 64 bits like in C, so the stripe is selected by the well mixed upper half of it.
+            return self._stripes[(((id(model) >> 4) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> 32)
+                                 % self.lock_stripes]
+        lock = self._model_locks.get(id(model))
+        if lock is None:
+            with self._locks_guard:
+                lock = self._model_locks.setdefault(id(model), threading.RLock())
+        return lock
+
+    def process(self, trigger: Callable):
+        lock = self.get_lock(trigger.args[0])
+        if not lock.acquire(blocking=False):
+            start = time.perf_counter()
+            lock.acquire()
+            self._record_wait(time.perf_counter() - start)
+        try:
+            return super().process(trigger)
+        finally:
+            lock.release()
+
+    def _record_wait(self, waited: float) -> None:
+        with self._stats_lock:
+            self._contended += 1
+            self._wait_time += waited
+            if waited > self._max_wait:
+                self._max_wait = waited
+
+    def contention(self) -> dict[str, float]:
+        """ Returns a snapshot of the lock contention observed so far.
+
+        Returns:
+            A dictionary with the number of contended acquisitions ('contended'), the total time spent waiting for
+            model locks ('wait_seconds') and the longest single wait ('max_wait_seconds').
+        """
+        with self._stats_lock:
+            return {'contended': self._contended, 'wait_seconds': self._wait_time, 'max_wait_seconds': self._max_wait}
+
+    def reset_contention(self) -> None:
+        with self._stats_lock:
+            self._contended = 0
+            self._wait_time = 0.0
+            self._max_wait = 0.0
+
+    def add_models(self, models: Any | Iterable[Any], initial=None, restore: bool = True) -> None:
+        with self._models_lock:
+            super().add_models(models, initial, restore)
+
+    def remove_models(self, models: Any | Iterable[Any]) -> None:
+        with self._models_lock:
+            super().remove_models(models)
+
+    def _unbind_model(self, model: Any) -> None:
+        super()._unbind_model(model)
+        self._model_locks.pop(id(model), None)
@@ -1,13 +1,25 @@
 from collections import deque, OrderedDict
-from collections.abc import Callable
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from functools import partial
+from itertools import islice
+from types import FunctionType, MethodType
 from typing import Any
 from enum import Enum
-
-from event import Event, EventData
+from weakref import WeakKeyDictionary
+
+from batch import ERROR, OK, REJECTED, BatchResult, normalize
+from binding import MACHINES, StateCheckDescriptor, TriggerDescriptor, bind2cls, machine_class, model_class
+from event import _MISSING, _replaying, AutoTransitions, Event, EventData
+from exception import MachineError
+from journal import Journal
+from parallel import DispatchResult, pack_chunk, partition, trigger_chunk, trigger_chunk_remote
+import snapshot
 from state import State
+from state_store import StateStore
+from timing_wheel import Timer, TimingWheel
 from transition import Transition
-from util import listify, Callback, Callbacks, StateParam, StatesParam
+from util import iterify, listify, Callback, Callbacks, StateParam, StatesParam
 
 
 class Machine:
@@ -58,6 +70,35 @@ class Machine:
         on_exception: Callable(s) called when an event raises an exception. If not set, the exception will be raised
         instead.
 
+        model_binding: How models are decorated with triggers and is_{state} checks. 'instance' (default) sets
+        partials on every model. 'class' installs descriptors once on a subclass of the model's class, which is
+        generated once per class and shared by all machines, and switches models to it. Models then only hold their
+        state attribute and a reference to their machines. 'lazy' switches models to a generated subclass as well but
+        resolves triggers and state checks on first access and caches them on that class. Adding states and
+        transitions at runtime does not touch attached models with 'class' and 'lazy'. Class and lazy bound models
+        are pickled and copied as instances of their original class.
+
+        index_models: When True, set_state keeps an index of the models in every state which is used by
+        count_in_state, models_in and dispatch(..., only_in=...). The index is not updated when the state attribute
+        of a model is assigned directly.
+
+        queued: When True, events triggered while another event is processed (e.g. from a callback) are appended to
+        a queue and executed after the current event has finished instead of being processed recursively. With
+        'model', every model has its own queue so events of one model do not wait for another model's backlog.
+
+        pool_event_data: When True, EventData objects are recycled after an event has been processed instead of
+        allocating a new one per trigger. Callbacks must not keep references to the passed EventData in this case.
+
+        journal: A Journal that records every event which executed a transition. It can be used to restore the
+        states of models after a restart (see Journal.replay).
+
+        timing_wheel: The TimingWheel serving timeouts of states and triggers passed to schedule. Machines may share a
+        wheel. When omitted, a wheel is created on first use. The wheel has to be driven by a ThreadDriver, an
+        AsyncioDriver or by calling its tick method.
+
+        state_store: A StateStore which persists every state assigned by set_state. add_models restores the stored
+        states of added models (see StateStore).
+
         **kwargs: additional arguments passed to next class in MRO. This can be ignored in most cases.
     """
     SEPARATOR = '_'
@@ -65,6 +106,19 @@ class Machine:
     WILDCARD_SAME = '='
     SELF_LITERAL = 'self'
 
+    EVENT_DATA_POOL_SIZE = 64
+    """ Maximum number of idle EventData objects kept by a machine with pool_event_data enabled. """
+
+    state_cls = State
+    event_cls = Event
+    transition_cls = Transition
+
+    _callable_cache: WeakKeyDictionary[type, dict[str, tuple[bool, Callable[..., None]]]] = WeakKeyDictionary()
+    """ Resolved string callbacks per model type and name. The flag marks functions that have to be bound. Entries are
+    dropped together with their model type. """
+    _import_cache: dict[str, Callable[..., None]] = {}
+    """ Module attributes resolved from dotted paths. """
+
     def __init__(self,
                  model: Any | list[Any] = SELF_LITERAL,
                  states: StatesParam | None = None,
@@ -80,8 +134,25 @@ class Machine:
                  prepare_event: Callback | Callbacks | None = None,  # and so on
                  finalize_event: Callback | Callbacks | None = None,
                  on_exception: Callback | Callbacks | None = None,
+                 model_binding: str = 'instance',
+                 index_models: bool = False,
+                 queued: bool | str = False,
+                 pool_event_data: bool = False,
+                 journal: Journal | None = None,
+                 timing_wheel: TimingWheel | None = None,
+                 state_store: StateStore | None = None,
                  **kwargs):
-        # self._queued = queued
+        if queued not in (False, True, 'model'):
+            raise ValueError(f"Unknown queue mode {repr(queued)}. Use True, False or 'model'.")
+        self._queued = queued
+        self._model_queues: dict[int, deque] = {}
+        self._event_data_pool: list[EventData] | None = [] if pool_event_data else None
+        self.journal = journal
+        self._timing_wheel = timing_wheel
+        self._timers: dict[int, dict[str, list[Timer]]] = {}
+        self.state_store = state_store
+        self._frozen = False
+        self._dispatch: dict[Any, State] | None = None
         self._transition_queue = deque()
         self._before_state_change = []
         self._after_state_change = []
@@ -94,6 +165,8 @@ class Machine:
 
         self.states: OrderedDict[str, State] = OrderedDict()
         self.events: dict[str, Event] = {}
+        self._indexes: tuple[dict[str, int], dict[str, dict[str, None]], dict[str, dict[str, None]],
+                             dict[str, None]] | None = None
         self.auto_transitions = auto_transitions
         self.ignore_invalid_triggers = ignore_invalid_triggers
         self.prepare_event = prepare_event
@@ -102,8 +175,19 @@ class Machine:
         self.finalize_event = finalize_event
         self.on_exception = on_exception
         self.name = name + ": " if name is not None else ""
+        if model_binding not in ('instance', 'class', 'lazy'):
+            raise ValueError(f"Unknown model binding {repr(model_binding)}. Use 'instance', 'class' or 'lazy'.")
+        self.model_binding = model_binding
 
+        self._pickle_models = True
         self._models = []
+        self._model_ids: set[int] = set()
+        self._instance_models = []
+        self._model_classes: dict[type, type] = {}
+        self._binding = (self,)
+        self.index_models = index_models
+        self._models_by_state: dict[str, dict[int, Any]] = {}
+        self._model_states: dict[int, str] = {}
 
         if states is not None:
             self.add_states(states)
@@ -117,6 +201,46 @@ class Machine:
         if model:
             self.add_models(model)
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        # pending timers belong to the wheel of this process
+        state['_timing_wheel'] = None
+        state['_timers'] = {}
+        # states determined by copies are persisted and journaled once they are assigned to the original models
+        state['state_store'] = None
+        state['journal'] = None
+        if not self._pickle_models:
+            for attr in ('_models', '_instance_models'):
+                state[attr] = []
+            for attr in ('_model_ids', '_models_by_state', '_model_states', '_model_queues'):
+                state[attr] = type(state[attr])()
+        # generated model classes cannot be pickled, class and lazy bound models are pickled with their original class
+        state['_model_classes'] = {}
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        if self.model_binding != 'instance':
+            self._instance_models = []
+            for model in self._models:
+                if model is not self:
+                    self._bind_model(model)
+
+    def dump_definition(self) -> bytes:
+        """ Exports states, events, transitions and callbacks as a binary snapshot. See snapshot.dumps. """
+        return snapshot.dumps(self)
+
+    @classmethod
+    def load_definition(cls, data: bytes, model: Any | list[Any] = SELF_LITERAL, **kwargs):
+        """ Creates a machine from a snapshot without configuring states and transitions again. See snapshot.loads.
+
+        Args:
+            data: A snapshot created by dump_definition.
+            model: Model(s) added to the restored machine.
+            **kwargs: Runtime options passed to the initializer, e.g. model_binding or queued.
+        """
+        return snapshot.loads(data, cls, model, **kwargs)
+
     @property
     def initial(self):
         return self._initial
@@ -137,6 +261,10 @@ class Machine:
     def models(self):
         return self._models
 
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
     @property
     def before_state_change(self):
         return self._before_state_change
@@ -144,6 +272,7 @@ class Machine:
     @before_state_change.setter
     def before_state_change(self, value):
         self._before_state_change = listify(value)
+        self._invalidate()
 
     @property
     def after_state_change(self):
@@ -152,6 +281,7 @@ class Machine:
     @after_state_change.setter
     def after_state_change(self, value):
         self._after_state_change = listify(value)
+        self._invalidate()
 
     @property
     def prepare_event(self):
@@ -178,7 +308,19 @@ class Machine:
         self._on_exception = listify(value)
 
     def get_model_state(self, model: Any):
-        return self.get_state(getattr(model, self.state_attribute))
+        try:
+            value = getattr(model, self.state_attribute)
+        except AttributeError:
+            store = self.state_store
+            name = store.get(store.key(model)) if store is not None else None
+            if name is None:
+                raise
+            state = self.get_state(name)
+            self._assign_state(model, state)
+            if state.timeout:
+                self._arm_timeout(model, state)
+            return state
+        return self.get_state(value)
 
     def get_state(self, state: StateParam):
         if isinstance(state, Enum):
@@ -190,15 +332,107 @@ class Machine:
     def set_state(self, model: Any, state: StateParam):
         if not isinstance(state, State):
             state = self.get_state(state)
+        store = self.state_store
         for model in listify(model):
-            setattr(model, self.state_attribute, state.value)
+            if id(model) in self._timers:
+                # transitions have cancelled these timers when exiting; direct assignments leave the state here
+                previous = getattr(model, self.state_attribute, _MISSING)
+                if previous is not _MISSING and self._state_name(previous) != state.name:
+                    self._cancel_timers(model, self._state_name(previous))
+            self._assign_state(model, state)
+            if store is not None:
+                store.set(store.key(model), state.name)
+            if state.timeout:
+                self._arm_timeout(model, state)
+
+    def _assign_state(self, model: Any, state: State) -> None:
+        setattr(model, self.state_attribute, state.value)
+        if self.index_models and id(model) in self._model_ids:
+            self._index_model(model, state.name)
+
+    def _index_model(self, model: Any, name: str | None) -> None:
+        key = id(model)
+        previous = self._model_states.pop(key, None)
+        if previous is not None:
+            del self._models_by_state[previous][key]
+        if name is not None:
+            self._models_by_state.setdefault(name, {})[key] = model
+            self._model_states[key] = name
+
+    def count_in_state(self, state: StateParam | State) -> int:
+        """ Returns the number of models currently in state. This is O(1) when index_models is enabled. """
+        name = self._state_name(state)
+        if self.index_models:
+            return len(self._models_by_state.get(name, ()))
+        return sum(1 for _ in self.models_in(name))
+
+    def models_in(self, state: StateParam | State) -> Iterator[Any]:
+        """ Iterates over all models currently in state.
+
+        With index_models enabled only models in state are visited. The models are collected before the first one is
+        returned, so models may change their state during iteration.
+        """
+        name = self._state_name(state)
+        if self.index_models:
+            return iter(list(self._models_by_state.get(name, {}).values()))
+        return iter([model for model in self.models if self.get_model_state(model).name == name])
+
+    @staticmethod
+    def _state_name(state: StateParam | State) -> str:
+        return state.name if isinstance(state, (State, Enum)) else state
 
-    def _add_state2model(self, model: Any, state: StateParam) -> None:
+    def freeze(self) -> None:
+        """ Compiles the current configuration into a dispatch table used by all subsequent triggers.
+
+        A frozen machine resolves the state of a model with a single lookup keyed by the value stored in the state
+        attribute and keeps per event tuples of transitions with pre-resolved destination states and merged
+        before/after callbacks. Adding states or transitions (or replacing machine callbacks) afterwards invalidates
+        the table which is rebuilt with the next trigger.
+        """
+        self._frozen = True
+        self._compile()
+
+    def unfreeze(self) -> None:
+        """ Drops the dispatch table and returns to resolving states and transitions on every trigger. """
+        self._frozen = False
+        self._dispatch = None
+
+    def _compile(self) -> None:
+        dispatch: dict[Any, State] = {}
+        for state in self.states.values():
+            dispatch[state.value] = state
+            dispatch[state.name] = state
+        for event in self.events.values():
+            event.compile()
+        self._dispatch = dispatch
+
+    def _invalidate(self) -> None:
+        self._dispatch = None
+        self._indexes = None
+
+    def _event_transitions(self, event: Event) -> Mapping[str, Sequence[Transition]]:
+        """ Returns the transitions of event per source state name that are used by triggers. A frozen machine
+        compiles its dispatch table first. """
+        if self._frozen and self._dispatch is None:
+            self._compile()
+        return event._dispatch if self._dispatch is not None else event.transitions
+
+    def _add_state2model(self, model: Any, state: State) -> None:
         func = partial(self.is_state, model, state.value)
-        attr_name = f'is_{state.name}' if self.state_attribute == 'state' \
-            else f'is_{self.state_attribute}_{state.name}'
-        bind2obj(model, attr_name, func)
+        bind2obj(model, self._state_check_name(state), func)
+        self._add_dynamic_methods(model, state)
+
+    def _add_state2class(self, cls: type, state: State) -> None:
+        if self.model_binding == 'class':
+            bind2cls(cls.__fsms_model_class__, self._state_check_name(state),
+                     StateCheckDescriptor(self.state_attribute, state.name))
+        self._add_dynamic_methods(cls, state)
 
+    def _state_check_name(self, state: State) -> str:
+        return f'is_{state.name}' if self.state_attribute == 'state' else f'is_{self.state_attribute}_{state.name}'
+
+    @staticmethod
+    def _add_dynamic_methods(model: Any, state: State) -> None:
         for dynamic_method in State.dynamic_methods:
             method = f'{dynamic_method}_{state.name}'
             # if the model has on_enter/exit_xxx attribute, and it is not registered in the according list of
@@ -209,48 +443,163 @@ class Machine:
     def _add_trigger2model(self, model: Any, trigger: str) -> None:
         bind2obj(model, trigger, partial(self.events[trigger].trigger, model))
 
-    def add_models(self, models: Any | list[Any], initial=None) -> None:
-        models = listify(models)
+    def _add_trigger2class(self, cls: type, trigger: str) -> None:
+        if self.model_binding == 'class':
+            bind2cls(cls.__fsms_model_class__, trigger, TriggerDescriptor(trigger))
+
+    def _binding_descriptor(self, name: str) -> TriggerDescriptor | StateCheckDescriptor | None:
+        """ Returns the descriptor which resolves a trigger or is_{state} check of a lazy bound model or None if name
+        is neither. """
+        if name in self.events:
+            return TriggerDescriptor(name)
+        prefix = 'is_' if self.state_attribute == 'state' else f'is_{self.state_attribute}_'
+        if name.startswith(prefix) and name[len(prefix):] in self.states:
+            return StateCheckDescriptor(self.state_attribute, name[len(prefix):])
+        return None
+
+    def _get_trigger(self, model: Any, trigger_name: str, *args, **kwargs) -> bool:
+        """ Triggers an event by name. This is bound to models as trigger(trigger_name, *args, **kwargs). """
+        try:
+            event = self.events[trigger_name]
+        except KeyError:
+            state = self.get_model_state(model)
+            ignore = state.ignore_invalid_triggers \
+                if state.ignore_invalid_triggers is not None \
+                else self.ignore_invalid_triggers
+            if not ignore:
+                raise AttributeError(f"Do not know event named {trigger_name}")
+            return False
+        return event.trigger(model, *args, **kwargs)
+
+    def _bind_model(self, model: Any) -> None:
+        """ Decorates a model with triggers and state checks according to model_binding. """
+        if self.model_binding != 'instance' and model is not self:
+            cls = type(model)
+            model_cls = self._model_classes.get(cls)
+            if model_cls is None:
+                model_cls = model_class(cls, self.model_binding == 'lazy')
+                for name in self.events:
+                    self._add_trigger2class(model_cls, name)
+                for state in self.states.values():
+                    self._add_state2class(model_cls, state)
+                if not cls.__dictoffset__:
+                    # models without an instance dictionary find their machines on a class generated per machine
+                    model_cls = machine_class(model_cls, getattr(cls, MACHINES, ()) + (self,))
+                self._model_classes[cls] = model_cls
+            try:
+                model.__class__ = model_cls
+            except TypeError:
+                pass  # e.g. builtins or incompatible layouts are decorated per instance
+            else:
+                if cls.__dictoffset__:
+                    # __dict__ is not accessed since this would materialize the compact attribute storage of a model
+                    machines = getattr(model, MACHINES)
+                    object.__setattr__(model, MACHINES, machines + (self,) if machines else self._binding)
+                return
+        if self.model_binding != 'instance':
+            self._instance_models.append(model)
+        bind2obj(model, 'trigger', partial(self._get_trigger, model))  # trigger signature changed
+        for name in self.events:
+            self._add_trigger2model(model, name)
+        for state in self.states.values():
+            self._add_state2model(model, state)
+
+    def _instance_bound_models(self) -> list[Any]:
+        return self.models if self.model_binding == 'instance' else self._instance_models
+
+    def _unbind_model(self, model: Any) -> None:
+        model_cls = type(model)
+        cls = getattr(model_cls, '__fsms_class__', None)
+        if cls is None:
+            return
+        machines = getattr(model, MACHINES)
+        if self not in machines:
+            return
+        machines = tuple(machine for machine in machines if machine is not self)
+        if model_cls.__dictoffset__:
+            if machines:
+                object.__setattr__(model, MACHINES, machines[0]._binding if len(machines) == 1 else machines)
+                return
+            object.__delattr__(model, MACHINES)
+        elif machines:
+            model.__class__ = machine_class(model_class(model_cls, False), machines)
+            return
+        model.__class__ = cls
+
+    def add_models(self, models: Any | Iterable[Any], initial=None, restore: bool = True) -> None:
+        """ Adds models to the machine and decorates them with triggers and state checks.
+
+        Models are identified by identity. Already registered models are skipped in constant time, so adding n models
+        takes O(n).
 
+        Args:
+            models: A model, a list of models or any iterator (e.g. a generator) which is consumed lazily unless
+            states are restored.
+            initial: The initial state of the added models. Defaults to the initial state of the machine.
+            restore: When the machine has a state store, the stored states of all added models are loaded at once and
+            assigned instead of initial. Models without a stored state start in initial which is stored.
+        """
         if initial is None:
             if self.initial is None:
                 raise ValueError("No initial state configured for machine, must specify when adding models.")
             else:
                 initial = self.initial
-
+        if not isinstance(initial, State):
+            initial = self.get_state(initial)
+
+        models = (self if model is self.SELF_LITERAL else model for model in iterify(models))
+        store = self.state_store if restore else None
+        if store is not None:
+            models = list(models)
+            stored = store.load([store.key(model) for model in models if id(model) not in self._model_ids])
         for model in models:
-            model = self if model is self.SELF_LITERAL else model
-            if model not in self.models:
-                def trigger_func(trigger_name: str, *args, **kwargs):
-                    try:
-                        event_local = self.events[trigger_name]
-                    except KeyError:
-                        state_local = self.get_model_state(model)
-                        ignore = state_local.ignore_invalid_triggers \
-                            if state_local.ignore_invalid_triggers is not None \
-                            else self.ignore_invalid_triggers
-                        if not ignore:
-                            raise AttributeError(f"Do not know event named {trigger_name}")
-                        return False
-                    return event_local.trigger(model, *args, **kwargs)
-                bind2obj(model, 'trigger', trigger_func)  # trigger signature changed
+            if id(model) not in self._model_ids:
+                self._bind_model(model)
+                self._models.append(model)
+                self._model_ids.add(id(model))
+                name = stored.get(store.key(model)) if store is not None else None
+                if name is None:
+                    self.set_state(model, initial)
+                else:
+                    state = self.get_state(name)
+                    self._assign_state(model, state)
+                    if state.timeout:
+                        self._arm_timeout(model, state)
+
+    def remove_models(self, models: Any | Iterable[Any]) -> None:
+        """ Removes models from the machine in a single pass over the registered models.
 
-                for name in self.events:
-                    self._add_trigger2model(model, name)
-                for state in self.states.values():
-                    self._add_state2model(model, state)
-
-                self.set_state(model, initial)
-                self.models.append(model)
-
-    def remove_models(self, models: Any | list[Any]) -> None:
-        models = listify(models)
-        for model in models:
-            self.models.remove(model)
-        # if len(self._transition_queue) > 0:
-        #     # possibly filter?
-        #     self._transition_queue = deque(self._transition_queue[0]
-        #                                    + [e for e in self._transition_queue if e.args[0] not in models])
+        Args:
+            models: A model, a list of models or any iterator. Models not attached to the machine are ignored.
+        """
+        removed = {id(model): model for model in iterify(models) if id(model) in self._model_ids}
+        if not removed:
+            return
+        self._models[:] = [model for model in self._models if id(model) not in removed]
+        if self._instance_models:
+            self._instance_models[:] = [model for model in self._instance_models if id(model) not in removed]
+        self._model_ids.difference_update(removed)
+        for model in removed.values():
+            self._unbind_model(model)
+            if self.index_models:
+                self._index_model(model, None)
+            if self._timers:
+                self._cancel_timers(model)
+        self._filter_queue(removed)
+
+    def _filter_queue(self, removed: dict[int, Any]) -> None:
+        """ Drops pending events of removed models. The event currently processed (head of a queue) is kept. """
+        queue = self._transition_queue
+        if len(queue) > 1:
+            current = queue.popleft()
+            pending = [e for e in queue if id(e.args[0]) not in removed]
+            queue.clear()
+            queue.append(current)
+            queue.extend(pending)
+        for key in removed:
+            queue = self._model_queues.get(key)
+            while queue is not None and len(queue) > 1:
+                queue.pop()
 
     def is_state(self, model: Any, state: StateParam) -> bool:
         return getattr(model, self.state_attribute) == state
@@ -263,30 +612,44 @@ class Machine:
         ignore = ignore_invalid_triggers if ignore_invalid_triggers is not None else self.ignore_invalid_triggers
         for state in listify(states):
             if isinstance(state, (str, Enum)):
-                state: State = State(state, on_enter, on_exit, ignore_invalid_triggers)
+                state: State = self.state_cls(state, on_enter, on_exit, ignore_invalid_triggers)
             elif isinstance(state, dict):
                 if 'ignore_invalid_triggers' not in state:
                     state['ignore_invalid_triggers'] = ignore
-                state: State = State(**state)
+                state: State = self.state_cls(**state)
             self.states[state.name] = state
+            self._invalidate()
 
-            for model in self.models:
+            for model in self._instance_bound_models():
                 self._add_state2model(model, state)
+            for model_cls in self._model_classes.values():
+                self._add_state2class(model_cls, state)
 
             if self.auto_transitions:
-                for other in self.states.keys():
-                    if self.state_attribute == 'state':
-                        method = f"to_{other}"
-                    else:
-                        method = f"to_{self.state_attribute}_{other}"
-                    if other == state.name:
-                        self.add_transition(method, self.WILDCARD_ALL, other)
-                    else:
-                        self.add_transition(method, state.name, other)
+                if self.state_attribute == 'state':
+                    method = f"to_{state.name}"
+                else:
+                    method = f"to_{self.state_attribute}_{state.name}"
+                if method not in self.events or not isinstance(self.events[method].transitions, AutoTransitions):
+                    self._add_auto_transition(method, state.name)
 
     """ Alias for add_states """
     add_state = add_states
 
+    def _add_auto_transition(self, trigger: str, dest: str) -> None:
+        """ Adds a to_{state} event which is valid from every state, present or added later, without creating a
+        transition per source state. """
+        if trigger not in self.events:
+            self.events[trigger] = self.event_cls(trigger, self)
+            for model in self._instance_bound_models():
+                self._add_trigger2model(model, trigger)
+            for model_cls in self._model_classes.values():
+                self._add_trigger2class(model_cls, trigger)
+        event = self.events[trigger]
+        trans = self.transition_cls(self.WILDCARD_ALL, dest, None, None, None, None, None)
+        event.transitions = AutoTransitions(self, trans, event.transitions)
+        self._invalidate()
+
     def add_transition(self,
                        trigger: str,
                        source: StateParam | StatesParam,
@@ -300,15 +663,18 @@ class Machine:
         if trigger == self.state_attribute:
             raise ValueError("Trigger name cannot be same as state attribute name for this machine.")
         if trigger not in self.events:
-            self.events[trigger] = Event(trigger, self)
-            for model in self.models:
-                self._add_trigger2model(trigger, model)
+            self.events[trigger] = self.event_cls(trigger, self)
+            for model in self._instance_bound_models():
+                self._add_trigger2model(model, trigger)
+            for model_cls in self._model_classes.values():
+                self._add_trigger2class(model_cls, trigger)
 
         if source == Machine.WILDCARD_ALL:
             source: list[str] = list(self.states.keys())
         else:
             source: list[str] = listify(source)
 
+        self._invalidate()
         for state in source:
             if dest == self.WILDCARD_SAME:
                 dest = state
@@ -316,7 +682,7 @@ class Machine:
                 dest = dest.name if isinstance(dest, Enum) else dest
             else:
                 dest = None
-            trans = Transition(state, dest, conditions, unless, before, after, prepare, **kwargs)
+            trans = self.transition_cls(state, dest, conditions, unless, before, after, prepare, **kwargs)
             self.events[trigger].add_transition(trans)
 
     def add_transitions(self, transitions: list[list | dict]):
@@ -335,11 +701,393 @@ class Machine:
         Returns:
             list of transition/trigger name(s)
         """
-        names = set(state.name if isinstance(state, Enum) else state for state in states)
-        return [trigger for trigger in self.events if any(name in self.events[trigger].transitions for name in names)]
+        order, by_source, _, auto = self._transition_indexes()
+        triggers: dict[str, None] = {}
+        for state in states:
+            name = self._state_name(state)
+            triggers.update(by_source.get(name, ()))
+            if name in self.states:
+                triggers.update(auto)
+        return sorted(triggers, key=order.__getitem__)
+
+    def triggers_to(self, *states: StateParam) -> list[str]:
+        """ Collects all triggers with a transition into the given state(s).
+
+        Args:
+            *states: tuple of destination state(s)
+
+        Returns:
+            list of transition/trigger name(s)
+        """
+        order, _, by_dest, _ = self._transition_indexes()
+        triggers: dict[str, None] = {}
+        for state in states:
+            triggers.update(by_dest.get(self._state_name(state), ()))
+        return sorted(triggers, key=order.__getitem__)
+
+    def trigger_edges(self, trigger: str) -> list[tuple[str, str | None]]:
+        """ Returns the (source, dest) pairs of all transitions of trigger grouped by source state.
+
+        Auto generated to_{state} events are valid from every state and are reported with WILDCARD_ALL as source first.
+        Internal transitions have None as destination.
+        """
+        event = self.events.get(trigger)
+        return list(self._edges(event)) if event is not None else []
+
+    def _edges(self, event: Event) -> Iterator[tuple[str, str | None]]:
+        transitions = event.transitions
+        if isinstance(transitions, AutoTransitions):
+            shared = transitions._shared[0]
+            yield self.WILDCARD_ALL, shared._dest
+            transitions = transitions._custom
+        else:
+            shared = None
+        for source, own in transitions.items():
+            source = self._state_name(source)
+            for trans in own:
+                if trans is not shared:
+                    yield source, trans._dest
+
+    def _transition_indexes(self) -> tuple[dict[str, int], dict[str, dict[str, None]], dict[str, dict[str, None]],
+                                           dict[str, None]]:
+        """ Returns the position of every trigger, the triggers per source and per destination state and the auto
+        generated triggers. The indexes are derived from the events on first use and dropped with the compiled dispatch
+        table whenever the configuration changes. Machines which are never queried do not keep them. """
+        indexes = self._indexes
+        if indexes is None:
+            order: dict[str, int] = {}
+            by_source: dict[str, dict[str, None]] = {}
+            by_dest: dict[str, dict[str, None]] = {}
+            auto: dict[str, None] = {}
+            for trigger, event in self.events.items():
+                order[trigger] = len(order)
+                for source, dest in self._edges(event):
+                    if source == self.WILDCARD_ALL:
+                        auto[trigger] = None
+                    else:
+                        by_source.setdefault(source, {})[trigger] = None
+                    if dest is not None:
+                        by_dest.setdefault(dest, {})[trigger] = None
+            indexes = self._indexes = (order, by_source, by_dest, auto)
+        return indexes
+
+    def may_trigger(self, model: Any, trigger: str, *args, call_prepare: bool = False, **kwargs) -> bool:
+        """ Checks whether trigger would currently cause a transition of model without executing it.
+
+        Only the conditions of the transitions are evaluated. Prepare, before, after and state callbacks are not called
+        and the state of model is not changed.
+
+        Args:
+            model: The model to check.
+            trigger: Name of the trigger.
+            *args: Positional arguments passed to conditions.
+            call_prepare: Call prepare_event and the prepare callbacks of the transitions before their conditions like
+            a regular trigger does. Required when conditions depend on values set by prepare callbacks, which may
+            have side effects.
+            **kwargs: Keyword arguments passed to conditions.
+
+        Returns:
+            True if the conditions of at least one transition of trigger from the current state of model pass.
+        """
+        candidates = self._may_trigger_candidates(model, trigger, args, kwargs)
+        if candidates is None:
+            return False
+        event_data, transitions = candidates
+        if call_prepare:
+            self.callbacks(self.prepare_event, event_data)
+        for trans in transitions:
+            event_data.transition = trans
+            if call_prepare:
+                self.callbacks(trans._prepare, event_data)
+            if trans._eval_conditions(event_data):
+                return True
+        return False
+
+    def _may_trigger_candidates(self, model: Any, trigger: str, args: tuple,
+                                kwargs: dict) -> tuple[EventData, list[Transition]] | None:
+        event = self.events.get(trigger)
+        if event is None:
+            return None
+        state = self.get_model_state(model)
+        transitions = self._event_transitions(event).get(state.name)
+        if not transitions:
+            return None
+        return EventData(state, event, self, model, args, kwargs), transitions
+
+    def dispatch(self, trigger: str, *args, only_in: StateParam | StatesParam | None = None, **kwargs) -> bool:
+        """ Triggers an event on all models.
+
+        Args:
+            trigger: Name of the trigger.
+            *args: Positional arguments passed to the trigger.
+            only_in: Only trigger models in these state(s). Models in states without a transition for trigger are not
+            touched at all. With index_models enabled, only models of the affected states are visited.
+            **kwargs: Keyword arguments passed to the trigger.
+
+        Returns:
+            True if all triggers returned True.
+        """
+        result = True
+        for model in self._dispatch_targets(trigger, only_in):
+            if not getattr(model, trigger)(*args, **kwargs):
+                result = False
+        return result
+
+    def dispatch_parallel(self, trigger: str, *args, executor: Executor | None = None, chunk_size: int = 1000,
+                          only_in: StateParam | StatesParam | None = None, key: Callable[[Any], Hashable] | None = None,
+                          **kwargs) -> Iterator[DispatchResult]:
+        """ Triggers an event on all models in chunks processed by an executor.
+
+        Results are yielded per model as soon as their chunk has completed. Errors are reported per model instead of
+        aborting the dispatch. With a ThreadPoolExecutor (default) the models are triggered in place which suits I/O
+        bound callbacks; a LockedMachine should be used when models are triggered from other threads as well. With a
+        ProcessPoolExecutor, machine and models of a chunk are pickled into the worker process and only the resulting
+        state of every model is applied to the original model afterwards. A journal of the machine then records one
+        entry per model that executed a transition.
+
+        Args:
+            trigger: Name of the trigger.
+            *args: Positional arguments passed to the trigger.
+            executor: A concurrent.futures executor. When None, a ThreadPoolExecutor is created for this call.
+            chunk_size: Number of models per submitted task.
+            only_in: See dispatch.
+            key: Shards models by hash(key(model)) instead of slicing, so that models sharing a key are processed in
+            order by the same task.
+            **kwargs: Keyword arguments passed to the trigger.
+
+        Yields:
+            A DispatchResult(model, result, error) for every triggered model.
+        """
+        chunks = partition(list(self._dispatch_targets(trigger, only_in)), chunk_size, key)
+        owned = executor is None
+        if owned:
+            executor = ThreadPoolExecutor()
+        try:
+            remote = isinstance(executor, ProcessPoolExecutor)
+            if remote:
+                futures = {executor.submit(trigger_chunk_remote, pack_chunk(self, chunk), trigger, args, kwargs): chunk
+                           for chunk in chunks}
+            else:
+                futures = {executor.submit(trigger_chunk, chunk, trigger, args, kwargs): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                if not remote:
+                    yield from future.result()
+                    continue
+                journal = self.journal
+                for model, (state, result, error) in zip(futures[future], future.result()):
+                    self.set_state(model, state)
+                    if journal is not None and result and error is None:
+                        journal.record(self, model, trigger, args, kwargs, state)
+                    yield DispatchResult(model, result, error)
+        finally:
+            if owned:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def apply_batch(self, events: Iterable[tuple], batch_size: int = 10000) -> Iterator[BatchResult]:
+        """ Applies a stream of events to models and reports the outcome of every event instead of raising.
+
+        Events are consumed in windows of batch_size. Transitions are compiled once per call (see freeze), i.e.
+        destination states and merged callbacks are resolved once. A machine which is not frozen drops the compiled
+        table again once all events have been applied or the iterator is closed. Within a window, events are grouped by
+        trigger and source state so that event, state and transitions are resolved once per group, and processed
+        without creating a trigger partial per event. Events of the same model are applied in the order they were
+        passed. Events of different models may be applied in a different order. Machines that queue events or override
+        process (e.g. LockedMachine) trigger every event individually but still benefit from grouping and structured
+        outcomes.
+
+        Args:
+            events: Tuples of (model, trigger), (model, trigger, args) or (model, trigger, args, kwargs). Any
+            iterable including generators is accepted and consumed lazily.
+            batch_size: Number of events consumed per window.
+
+        Yields:
+            A BatchResult(model, trigger, status, error) for every event in the order events were passed. Results of
+            a window are yielded once the window has been applied.
+        """
+        events = iter(events)
+        compiled = self._dispatch is None
+        if compiled:
+            self._compile()
+        try:
+            while True:
+                window = [normalize(item) for item in islice(events, batch_size)]
+                if not window:
+                    return
+                yield from self._apply_rounds(window)
+        finally:
+            if compiled and not self.frozen:
+                # the lazily built transition indexes remain valid
+                self._dispatch = None
+
+    def _apply_rounds(self, window: list[tuple[Any, str, tuple, dict]]) -> list[BatchResult]:
+        outcomes: list[BatchResult | None] = [None] * len(window)
+        # the n-th event of every model is applied in round n which keeps the order of events per model
+        rounds: list[list[int]] = []
+        counts: dict[int, int] = {}
+        for index, item in enumerate(window):
+            key = id(item[0])
+            n = counts.get(key, 0)
+            counts[key] = n + 1
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append(index)
+        attr = self.state_attribute
+        for indices in rounds:
+            groups: dict[tuple[str, Any], list[int]] = {}
+            for index in indices:
+                model, trigger, _, _ = window[index]
+                try:
+                    value = getattr(model, attr, _MISSING)
+                    key = (trigger, value if value is not _MISSING else self.get_model_state(model).value)
+                except Exception as e:
+                    outcomes[index] = BatchResult(model, trigger, ERROR, e)
+                    continue
+                members = groups.get(key)
+                if members is None:
+                    groups[key] = [index]
+                else:
+                    members.append(index)
+            for (trigger, value), members in groups.items():
+                self._apply_group(trigger, value, window, members, outcomes)
+        return outcomes
+
+    def _apply_group(self, trigger: str, value: Any, window: list[tuple[Any, str, tuple, dict]], members: list[int],
+                     outcomes: list[BatchResult | None]) -> None:
+        """ Applies events with the same trigger to models that have been in the state with value value. """
+        event = self.events.get(trigger)
+        if event is None or self._queued or type(self).process is not Machine.process:
+            for index in members:
+                outcomes[index] = self._apply_single(*window[index])
+            return
+        try:
+            if self._dispatch is None:
+                self._compile()
+            state = self.get_state(value)
+        except Exception as e:
+            for index in members:
+                outcomes[index] = BatchResult(window[index][0], trigger, ERROR, e)
+            return
+        transitions = event._dispatch if self._dispatch is not None else event.transitions
+        if state.name not in transitions:
+            ignore = state.ignore_invalid_triggers \
+                if state.ignore_invalid_triggers is not None \
+                else self.ignore_invalid_triggers
+            error = None if ignore else MachineError(f"{self.name} Cannot trigger event {trigger} from state "
+                                                     f"{state.name}")
+            for index in members:
+                outcomes[index] = BatchResult(window[index][0], trigger, REJECTED, error)
+            return
+        attr = self.state_attribute
+        process = event._process
+        for index in members:
+            model, _, args, kwargs = window[index]
+            if getattr(model, attr) != value:
+                # the state has been changed by a callback of an event applied before
+                outcomes[index] = self._apply_single(*window[index])
+                continue
+            try:
+                outcomes[index] = BatchResult(model, trigger, OK if process(EventData(state, event, self, model, args,
+                                                                                      kwargs)) else REJECTED, None)
+            except MachineError as e:
+                # like _apply_single, e.g. for an invalid trigger fired from a callback
+                outcomes[index] = BatchResult(model, trigger, REJECTED, e)
+            except Exception as e:
+                outcomes[index] = BatchResult(model, trigger, ERROR, e)
+
+    def _apply_single(self, model: Any, trigger: str, args: tuple, kwargs: dict) -> BatchResult:
+        try:
+            result = self._get_trigger(model, trigger, *args, **kwargs)
+        except MachineError as e:
+            return BatchResult(model, trigger, REJECTED, e)
+        except Exception as e:
+            return BatchResult(model, trigger, ERROR, e)
+        return BatchResult(model, trigger, OK if result else REJECTED, None)
+
+    @property
+    def timing_wheel(self) -> TimingWheel:
+        if self._timing_wheel is None:
+            self._timing_wheel = TimingWheel()
+        return self._timing_wheel
 
-    def dispatch(self, trigger: str, *args, **kwargs) -> bool:
-        return all([getattr(model, trigger)(*args, **kwargs) for model in self.models])
+    def schedule(self, model: Any, trigger: str, delay: float, *args, **kwargs) -> Timer:
+        """ Fires trigger on model after delay seconds unless the model has left its current state before.
+
+        Timers are kept in the timing wheel of the machine, so scheduling and cancelling costs O(1) regardless of the
+        number of pending timers. The trigger is fired by whatever drives the wheel (see TimingWheel).
+
+        Args:
+            model: The model to trigger.
+            trigger: Name of the trigger.
+            delay: Seconds until the trigger is fired.
+            args and kwargs: Optional arguments passed to the trigger.
+
+        Returns:
+            The Timer which can be cancelled.
+        """
+        return self._schedule(model, trigger, delay, args, kwargs, self.get_model_state(model).name)
+
+    def arm_timeouts(self, models: Any | Iterable[Any] | None = None) -> None:
+        """ Starts the timeouts of the current states of models (all models by default) which are not running.
+
+        Timeouts start when a state is entered by a transition or assigned by add_models, set_state or a state store.
+        Hence, this is only required when state attributes have been assigned directly.
+        """
+        for model in (self.models if models is None else listify(models)):
+            state = self.get_model_state(model)
+            if state.timeout:
+                self._arm_timeout(model, state)
+
+    def _arm_timeout(self, model: Any, state: State) -> None:
+        """ Schedules the timeout trigger of state unless a timer of model for it is pending already. """
+        states = self._timers.get(id(model))
+        if states is not None:
+            for timer in states.get(state.name, ()):
+                if timer.pending and timer.args[1] == state.timeout_trigger:
+                    return
+        self._schedule(model, state.timeout_trigger, state.timeout, (), {}, state.name)
+
+    def _schedule(self, model: Any, trigger: str, delay: float, args: tuple, kwargs: dict, state: str) -> Timer:
+        """ Schedules trigger on the timing wheel. The timer is cancelled when model exits state. """
+        timer = self.timing_wheel.schedule(delay, self._fire_timer, model, trigger, args, kwargs, state)
+        self._timers.setdefault(id(model), {}).setdefault(state, []).append(timer)
+        return timer
+
+    def _fire_timer(self, model: Any, trigger: str, args: tuple, kwargs: dict, state: str) -> Any:
+        self._release_timers(model, state)
+        return self._get_trigger(model, trigger, *args, **kwargs)
+
+    def _release_timers(self, model: Any, state: str) -> None:
+        """ Forgets timers of model bound to state that fired or have been cancelled. """
+        states = self._timers.get(id(model))
+        if states is None:
+            return
+        timers = [timer for timer in states.get(state, ()) if timer.pending]
+        if timers:
+            states[state] = timers
+        else:
+            states.pop(state, None)
+            if not states:
+                del self._timers[id(model)]
+
+    def _cancel_timers(self, model: Any, state: str | None = None) -> None:
+        """ Cancels the timers of model bound to state or all timers of model if state is None. """
+        states = self._timers.get(id(model))
+        if states is None:
+            return
+        for timers in ([states.pop(state, ())] if state is not None else states.values()):
+            for timer in timers:
+                timer.cancel()
+        if state is None or not states:
+            del self._timers[id(model)]
+
+    def _dispatch_targets(self, trigger: str, only_in: StateParam | StatesParam | None) -> list[Any]:
+        if only_in is None:
+            return self.models
+        names = [self._state_name(state) for state in listify(only_in)]
+        if trigger in self.events:
+            transitions = self._event_transitions(self.events[trigger])
+            names = [name for name in names if name in transitions]
+        return [model for name in names for model in self.models_in(name)]
 
     def callbacks(self, funcs: Callbacks, event_data: EventData) -> None:
         for func in funcs:
@@ -353,28 +1101,136 @@ class Machine:
             func(*event_data.args, **event_data.kwargs)
 
     def process(self, trigger: Callable):
-        return trigger()
+        """ Executes a trigger partial (as created by Event.trigger) immediately or queues it.
 
-    @staticmethod
-    def resolve_callable(func: Callback, event_data: EventData) -> Callable[..., None]:
-        if isinstance(func, str):
-            try:
-                func = getattr(event_data.model, func)
-                if not callable(func):
-                    def wrapper(*_, **__):
-                        return func
-                    return wrapper
-            except AttributeError:
-                try:
-                    model, name = func.rsplit('.', 1)
-                    m = __import__(model)
-                    for n in model.split('.')[1:]:
-                        m = getattr(m, n)
-                    func = getattr(m, name)
-                except (ImportError, AttributeError, ValueError):
-                    raise AttributeError(f"Callable with name {func} could neither be retrieved from the passed model "
-                                         f"nor imported from a module.")
-        return func
+        In queued mode the first trigger drains the queue iteratively (run-to-completion). Triggers arriving while the
+        queue is processed return True right away and are executed afterwards. If a queued trigger raises, the queue
+        is cleared and the exception is propagated to the caller that started processing.
+
+        Returns:
+            The result of the trigger. True for triggers that have been queued. False for triggers fired from
+            callbacks while the journal of the machine is replayed (see Journal.replay).
+        """
+        if _replaying.get() is self:
+            return False
+        if not self._queued:
+            return trigger()
+
+        key, queue = self._get_queue(trigger.args[0])
+        queue.append(trigger)
+        if len(queue) > 1:
+            return True
+        try:
+            result = queue[0]()
+            queue.popleft()
+            while queue:
+                queue[0]()
+                queue.popleft()
+        except Exception:
+            queue.clear()
+            raise
+        finally:
+            self._release_queue(key, queue)
+        return result
+
+    def _get_queue(self, model: Any) -> tuple[int | None, deque]:
+        """ Returns the queue triggers of model are appended to and the key of per model queues. """
+        if self._queued == 'model':
+            key = id(model)
+            queue = self._model_queues.get(key)
+            if queue is None:
+                queue = self._model_queues[key] = deque()
+            return key, queue
+        return None, self._transition_queue
+
+    def _release_queue(self, key: int | None, queue: deque) -> None:
+        if key is not None and not queue and self._model_queues.get(key) is queue:
+            del self._model_queues[key]
+
+    @classmethod
+    def resolve_callable(cls, func: Callback, event_data: EventData) -> Callable[..., None]:
+        """ Converts a callback name into a callable.
+
+        Names are looked up on the model first and imported from a module otherwise. Methods defined on the model
+        class and imported module attributes are cached per (model type, name) so that subsequent lookups skip the
+        attribute search and import machinery. Attributes set on the model instance always take precedence.
+        See clear_callable_cache when model classes are patched at runtime.
+
+        Args:
+            func: A callable or the name of a model attribute or a dotted import path.
+            event_data: The EventData of the ongoing transition.
+
+        Returns:
+            The resolved callable.
+        """
+        if not isinstance(func, str):
+            return func
+        model = event_data.model
+        cached = cls._callable_cache.get(type(model))
+        if cached is not None and func in cached and func not in getattr(model, '__dict__', ()):
+            bind, target = cached[func]
+            return MethodType(target, model) if bind else target
+        return cls._resolve_model_callable(func, model)
+
+    @classmethod
+    def _resolve_model_callable(cls, func: str, model: Any) -> Callable[..., None]:
+        try:
+            attr = getattr(model, func)
+        except AttributeError:
+            target = cls._import_callable(func)
+            if not hasattr(type(model), '__getattr__'):
+                cls._cache_callable(type(model), func, False, target)
+            return target
+        if not callable(attr):
+            def wrapper(*_, **__):
+                return attr
+            return wrapper
+        for klass in type(model).__mro__:
+            if func in vars(klass):
+                if isinstance(vars(klass)[func], FunctionType):
+                    cls._cache_callable(type(model), func, True, vars(klass)[func])
+                break
+        return attr
+
+    @classmethod
+    def _cache_callable(cls, model_type: type, func: str, bind: bool, target: Callable[..., None]) -> None:
+        try:
+            cached = cls._callable_cache.setdefault(model_type, {})
+        except TypeError:  # types that cannot be weakly referenced are not cached
+            return
+        cached[func] = (bind, target)
+
+    @classmethod
+    def _import_callable(cls, func: str) -> Callable[..., None]:
+        try:
+            return cls._import_cache[func]
+        except KeyError:
+            pass
+        try:
+            module, name = func.rsplit('.', 1)
+            m = __import__(module)
+            for n in module.split('.')[1:]:
+                m = getattr(m, n)
+            target = getattr(m, name)
+        except (ImportError, AttributeError, ValueError):
+            raise AttributeError(f"Callable with name {func} could neither be retrieved from the passed model "
+                                 f"nor imported from a module.")
+        cls._import_cache[func] = target
+        return target
+
+    @classmethod
+    def clear_callable_cache(cls, model_type: type | None = None) -> None:
+        """ Invalidates cached callback resolutions.
+
+        Args:
+            model_type: Only drop entries of this model class. When None, all entries including imported module
+            attributes are dropped.
+        """
+        if model_type is None:
+            cls._callable_cache.clear()
+            cls._import_cache.clear()
+        else:
+            cls._callable_cache.pop(model_type, None)
 
 
 def bind2obj(model: Any, name: str, func: Callback) -> None:
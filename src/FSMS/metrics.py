@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from collections.abc import Hashable, Iterable
+from typing import Any
+
+DEFAULT_BUCKETS: tuple[float, ...] = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3,
+                                      5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+""" Upper bounds in seconds of the latency histogram buckets. Observations above the last bound count as +Inf. """
+
+FAMILIES: dict[str, tuple[str, ...]] = {
+    'events': ('trigger',),
+    'transitions': ('source', 'dest'),
+    'conditions': ('condition',),
+    'callbacks': ('callback',),
+}
+""" Metric families mapped to the label names of their keys. """
+
+
+class Histogram:
+    """ Latency histogram and outcome counters of a single metric key.
+
+    Attributes:
+        count (int): Number of observations.
+        rejected (int): Observations that completed with a negative result, e.g. a trigger that did not transition or
+        a condition that did not pass.
+        failures (int): Observations that raised an exception.
+        total (float): Sum of all observed durations in seconds.
+        max (float): Longest observed duration in seconds.
+        counts (list[int]): Observations per bucket (not cumulative). The last element counts observations above the
+        largest bound.
+    """
+
+    __slots__ = ('count', 'rejected', 'failures', 'total', 'max', 'counts')
+
+    def __init__(self, buckets: int):
+        self.count = 0
+        self.rejected = 0
+        self.failures = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.counts = [0] * (buckets + 1)
+
+    def to_dict(self, bounds: tuple[float, ...]) -> dict[str, Any]:
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(bounds + (float('inf'),), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'count': self.count, 'rejected': self.rejected, 'failures': self.failures, 'sum': self.total,
+                'max': self.max, 'buckets': buckets}
+
+
+class Metrics:
+    """ Collects counts, failures and latency histograms of an InstrumentedMachine.
+
+    One instance may be shared by several machines to aggregate their metrics.
+
+    Attributes:
+        buckets: Sorted upper bounds in seconds of the latency histogram buckets.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._families: dict[str, dict[Hashable, Histogram]] = {family: {} for family in FAMILIES}
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def observe(self, family: str, key: Hashable, seconds: float, result: bool | None) -> None:
+        """ Records a single observation.
+
+        Args:
+            family: One of 'events', 'transitions', 'conditions' or 'callbacks'.
+            key: Trigger name, (source, dest) tuple, condition name or callback name.
+            seconds: Observed duration.
+            result: True for successful, False for rejected and None for failed (raising) observations.
+        """
+        with self._lock:
+            hist = self._families[family].get(key)
+            if hist is None:
+                hist = self._families[family][key] = Histogram(len(self.buckets))
+            hist.count += 1
+            if result is None:
+                hist.failures += 1
+            elif not result:
+                hist.rejected += 1
+            hist.total += seconds
+            if seconds > hist.max:
+                hist.max = seconds
+            hist.counts[bisect_left(self.buckets, seconds)] += 1
+
+    def snapshot(self) -> dict[str, dict[Hashable, dict[str, Any]]]:
+        """ Returns a consistent copy of all metrics.
+
+        Returns:
+            Metric families mapped to their keys and the values of Histogram.to_dict. Bucket counts are cumulative
+            (bound, count) pairs like in the Prometheus exposition format.
+        """
+        with self._lock:
+            return {family: {key: hist.to_dict(self.buckets) for key, hist in hists.items()}
+                    for family, hists in self._families.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            for hists in self._families.values():
+                hists.clear()
+
+    def export(self, exporter: Exporter) -> Any:
+        return exporter.export(self.snapshot())
+
+
+class Exporter:
+    """ Converts a snapshot of Metrics into an external representation. """
+
+    def export(self, snapshot: dict[str, dict[Hashable, dict[str, Any]]]) -> Any:
+        raise NotImplementedError
+
+
+class DictExporter(Exporter):
+    """ Exports a snapshot as a plain dictionary with string keys, e.g. for logging it as JSON.
+
+    (source, dest) keys of transitions are joined with ' -> '.
+    """
+
+    def export(self, snapshot: dict[str, dict[Hashable, dict[str, Any]]]) -> dict[str, dict[str, dict[str, Any]]]:
+        return {family: {_format_key(key): values for key, values in hists.items()}
+                for family, hists in snapshot.items()}
+
+
+class PrometheusExporter(Exporter):
+    """ Exports a snapshot in the Prometheus text exposition format.
+
+    Every family results in a <prefix>_<family>_duration_seconds histogram as well as <prefix>_<family>_rejected_total
+    and <prefix>_<family>_failures_total counters.
+
+    Attributes:
+        prefix: Prefix of all metric names.
+        labels: Constant labels added to every sample, e.g. {'machine': 'orders'}.
+    """
+
+    def __init__(self, prefix: str = 'fsm', labels: dict[str, str] | None = None):
+        self.prefix = prefix
+        self.labels = labels or {}
+
+    def export(self, snapshot: dict[str, dict[Hashable, dict[str, Any]]]) -> str:
+        lines = []
+        for family, hists in snapshot.items():
+            name = f'{self.prefix}_{family}'
+            lines.append(f'# HELP {name}_duration_seconds Latency of {family}.')
+            lines.append(f'# TYPE {name}_duration_seconds histogram')
+            for key, values in hists.items():
+                labels = self._labels(family, key)
+                for bound, count in values['buckets']:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_duration_seconds_bucket{{{labels}le="{le}"}} {count}')
+                lines.append(f'{name}_duration_seconds_sum{{{labels.rstrip(",")}}} {values["sum"]!r}')
+                lines.append(f'{name}_duration_seconds_count{{{labels.rstrip(",")}}} {values["count"]}')
+            for counter in ('rejected', 'failures'):
+                lines.append(f'# TYPE {name}_{counter}_total counter')
+                for key, values in hists.items():
+                    lines.append(f'{name}_{counter}_total{{{self._labels(family, key).rstrip(",")}}} '
+                                 f'{values[counter]}')
+        return '\n'.join(lines) + '\n'
+
+    def _labels(self, family: str, key: Hashable) -> str:
+        values = key if isinstance(key, tuple) else (key,)
+        pairs = list(self.labels.items()) + list(zip(FAMILIES[family], values))
+        return ''.join(f'{label}="{_escape("" if value is None else value)}",' for label, value in pairs)
+
+
+def _format_key(key: Hashable) -> str:
+    if isinstance(key, tuple):
+        return ' -> '.join(str(part) for part in key)
+    return str(key)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import pickle
+from collections.abc import Callable, Hashable
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from machine import Machine
+
+
+class DispatchResult(NamedTuple):
+    """ Outcome of a trigger for a single model of a parallel dispatch.
+
+    Attributes:
+        model: The model the trigger has been called on.
+        result: The return value of the trigger or None if it raised.
+        error: The raised exception or None.
+    """
+    model: Any
+    result: bool | None
+    error: BaseException | None
+
+
+def partition(models: list[Any], chunk_size: int, key: Callable[[Any], Hashable] | None = None) -> list[list[Any]]:
+    """ Splits models into chunks of (roughly) chunk_size models.
+
+    Args:
+        models: The models to split.
+        chunk_size: Number of models per chunk.
+        key: When passed, models are sharded by hash(key(model)) so that models with the same key end up in the same
+        chunk and are processed in order.
+
+    Returns:
+        A list of chunks.
+    """
+    if key is None:
+        return [models[i:i + chunk_size] for i in range(0, len(models), chunk_size)]
+    shards = [[] for _ in range(max(1, -(-len(models) // chunk_size)))]
+    for model in models:
+        shards[hash(key(model)) % len(shards)].append(model)
+    return [shard for shard in shards if shard]
+
+
+def trigger_chunk(models: list[Any], trigger: str, args: tuple, kwargs: dict) -> list[DispatchResult]:
+    """ Calls trigger on every model of a chunk and collects the outcome instead of stopping at the first error. """
+    results = []
+    for model in models:
+        try:
+            results.append(DispatchResult(model, getattr(model, trigger)(*args, **kwargs), None))
+        except Exception as e:
+            results.append(DispatchResult(model, None, e))
+    return results
+
+
+async def trigger_chunk_async(models: list[Any], trigger: str, args: tuple, kwargs: dict) -> list[DispatchResult]:
+    """ Coroutine variant of trigger_chunk which awaits the triggers of an AsyncMachine one after another. """
+    results = []
+    for model in models:
+        try:
+            results.append(DispatchResult(model, await getattr(model, trigger)(*args, **kwargs), None))
+        except Exception as e:
+            results.append(DispatchResult(model, None, e))
+    return results
+
+
+def pack_chunk(machine: Machine, models: list[Any]) -> bytes:
+    """ Pickles machine and a chunk of its models for a worker process.
+
+    The models of the machine are decorated with partials referencing the machine. To avoid sending all models with
+    every chunk, the machine is pickled without its model registry.
+    """
+    machine._pickle_models = False
+    try:
+        return pickle.dumps((machine, models), pickle.HIGHEST_PROTOCOL)
+    finally:
+        machine._pickle_models = True
+
+
+def trigger_chunk_remote(payload: bytes, trigger: str, args: tuple,
+                         kwargs: dict) -> list[tuple[Any, bool | None, BaseException | None]]:
+    """ Process pool variant of trigger_chunk. Machine and models are unpickled copies (see pack_chunk), so only the
+    resulting states, results and errors are sent back. """
+    machine, models = pickle.loads(payload)
+    # class and lazy bound models arrive as instances of their original class and are attached to the copied machine
+    attr = machine.state_attribute
+    for model in models:
+        machine.add_models(model, initial=getattr(model, attr), restore=False)
+    return [(getattr(res.model, machine.state_attribute), res.result, res.error)
+            for res in trigger_chunk(models, trigger, args, kwargs)]
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable
+from functools import partial
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any
+
+from state_store import StateStore
+
+_MAGIC = b'FSMS'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQQQQQ')
+""" Magic, layout version, sequence, capacity, max_states, names_size and names_len. """
+_SEQ = 8
+""" Offset of the sequence counter within the header. """
+_NAMES_LEN = 40
+""" Offset of the length of the names blob within the header. """
+_SEPARATOR = '\0'
+_SPINS = 100
+""" Number of attempts of a read before the reader yields the CPU between further attempts. """
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """ Attaches to an existing segment without leaving it registered with the resource tracker, which would destroy
+    the segment when the attaching process exits. """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 always registers the segment. If the creating process shares the tracker (e.g. a reader started by
+    # multiprocessing), this drops its registration as well which is restored by SharedStateStore.unlink.
+    memory = shared_memory.SharedMemory(name)
+    if os.name == 'posix':
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+def _layout(capacity: int, max_states: int, names_size: int) -> tuple[int, int, int]:
+    """ Returns the offsets of the counts and the codes and the total size of a segment. """
+    counts = (_HEADER.size + names_size + 7) // 8 * 8
+    codes = counts + 8 * (max_states + 1)
+    return counts, codes, codes + 2 * capacity
+
+
+class _SharedStates:
+    """ Layout of a shared memory segment holding the state codes of up to capacity model slots.
+
+    The segment starts with a header followed by the names of all registered states (UTF-8, separated by NUL), one
+    64 bit counter per state code and one 16 bit state code per slot. Code 0 marks a slot without state, state names
+    are registered with codes starting at 1 in the order they are first assigned.
+
+    Only one process writes to a segment. It increments the sequence counter of the header before and after every
+    change (seqlock). Readers retry a read while the counter is odd or has changed during the read and thereby never
+    observe a partially applied transition. This relies on aligned 64 bit stores being atomic and becoming visible to
+    other processes in program order. Python cannot issue memory fences, so the guarantee only holds on platforms with
+    total store order like x86-64. On weakly ordered platforms like ARM64, readers may observe torn states.
+    """
+
+    def _map(self, memory: shared_memory.SharedMemory) -> None:
+        self._memory = memory
+        buffer = memory.buf
+        magic, version, _, capacity, max_states, names_size, _ = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Shared memory {repr(memory.name)} does not contain state codes of version {_VERSION}.")
+        self.capacity = capacity
+        self.max_states = max_states
+        self._names_size = names_size
+        counts, codes, _ = _layout(capacity, max_states, names_size)
+        self._seq = buffer[_SEQ:_SEQ + 8].cast('Q')
+        self._names_len = buffer[_NAMES_LEN:_NAMES_LEN + 8].cast('Q')
+        self._names_blob = buffer[_HEADER.size:_HEADER.size + names_size]
+        self._counts = buffer[counts:codes].cast('q')
+        self.codes = buffer[codes:codes + 2 * capacity].cast('H')
+        self._names: list[str | None] = [None]
+        self._read_names()
+
+    @property
+    def name(self) -> str:
+        """ Name of the shared memory segment which is passed to readers. """
+        return self._memory.name
+
+    def _read_names(self) -> None:
+        length = self._names_len[0]
+        blob = bytes(self._names_blob[:length]).decode()
+        self._names = [None] + (blob.split(_SEPARATOR)[:-1] if blob else [])
+
+    def _release(self) -> None:
+        # views into the buffer have to be released before the segment can be closed
+        for view in ('_seq', '_names_len', '_names_blob', '_counts', 'codes'):
+            if view in self.__dict__:
+                self.__dict__.pop(view).release()
+        if '_memory' in self.__dict__:
+            self._memory.close()
+
+    def __del__(self):
+        self._release()
+
+
+class SharedStateStore(StateStore, _SharedStates):
+    """ Writes the state codes of models into a shared memory segment which other processes read with a
+    SharedStateReader.
+
+    The key of a model is its slot in the segment, i.e. an integer in range(capacity). Every state assigned by
+    Machine.set_state is written immediately together with the number of models per state. Slots keep their state when
+    a model is removed from a machine; use clear to free a slot. A created segment lives until unlink is called or the
+    creating process exits. Before Python 3.13, a segment is only destroyed by unlink if a reader has been started by
+    multiprocessing from the creating process since both share a resource tracker (see _attach). A store may attach to
+    a segment created by another process (create=False) in which case Machine.add_models restores the states from it.
+    Only one store may write to a segment at a time.
+
+    Attributes:
+        key: Returns the slot of a model.
+        capacity: Number of slots.
+        max_states: Maximum number of distinct state names.
+        codes (memoryview): The state code of every slot. Code 0 means no state, see names for the others.
+    """
+
+    def __init__(self, key: Callable[[Any], int], capacity: int = 0, name: str | None = None, create: bool = True,
+                 max_states: int = 255, names_size: int = 16384):
+        super().__init__(key)
+        if create:
+            if capacity < 1 or not 0 < max_states < 2 ** 16:
+                raise ValueError("SharedStateStore requires a positive capacity and between 1 and 65535 max_states.")
+            memory = shared_memory.SharedMemory(name, create=True, size=_layout(capacity, max_states, names_size)[2])
+            _HEADER.pack_into(memory.buf, 0, _MAGIC, _VERSION, 0, capacity, max_states, names_size, 0)
+        else:
+            memory = _attach(name)
+        self._map(memory)
+        self._codes_by_name = {name: code for code, name in enumerate(self._names) if code}
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> list[str | None]:
+        """ State names by code. """
+        return list(self._names)
+
+    def _register(self, state: str) -> int:
+        code = len(self._names)
+        if code > self.max_states:
+            raise ValueError(f"More than {self.max_states} states cannot be stored in {repr(self.name)}.")
+        data = (state + _SEPARATOR).encode()
+        start = self._names_len[0]
+        if start + len(data) > self._names_size:
+            raise ValueError(f"The names of all states do not fit into {self._names_size} bytes.")
+        self._names_blob[start:start + len(data)] = data
+        self._names_len[0] = start + len(data)
+        self._names.append(state)
+        self._codes_by_name[state] = code
+        return code
+
+    def set(self, key: int, state: str) -> None:
+        with self._lock:
+            code = self._codes_by_name.get(state)
+            seq = self._seq
+            seq[0] += 1
+            try:
+                if code is None:
+                    code = self._register(state)
+                self._assign(key, code)
+            finally:
+                seq[0] += 1
+
+    def _assign(self, slot: int, code: int) -> None:
+        codes = self.codes
+        previous = codes[slot]
+        if previous != code:
+            codes[slot] = code
+            counts = self._counts
+            if previous:
+                counts[previous] -= 1
+            if code:
+                counts[code] += 1
+
+    def clear(self, slot: int) -> None:
+        """ Removes the state of slot. """
+        with self._lock:
+            self._seq[0] += 1
+            try:
+                self._assign(slot, 0)
+            finally:
+                self._seq[0] += 1
+
+    def load(self, keys: Iterable[Hashable]) -> dict[Hashable, str]:
+        codes, names = self.codes, self._names
+        return {key: names[codes[key]] for key in keys if 0 <= key < self.capacity and codes[key]}
+
+    def close(self) -> None:
+        self._release()
+
+    def unlink(self) -> None:
+        """ Closes the store and destroys the segment. Readers that are still attached keep their mapping. """
+        self.close()
+        memory = self._memory
+        if os.name == 'posix' and getattr(memory, '_track', True):
+            # a reader sharing the resource tracker may have dropped the registration (see _attach), registering a
+            # segment twice has no effect
+            resource_tracker.register(memory._name, 'shared_memory')
+        memory.unlink()
+
+
+class SharedStateReader(_SharedStates):
+    """ Reads the states written by a SharedStateStore of another process without copying the segment.
+
+    All reads are consistent with respect to transitions, i.e. a state and the counts never reflect a half applied
+    transition. The reader does not take part in the lifetime of the segment which is destroyed by the writer.
+
+    A read which collides with a write is retried. After a few attempts the reader yields the CPU between attempts and
+    gives up after timeout seconds, e.g. when the writer died during a write.
+
+    Attributes:
+        capacity: Number of slots.
+        codes (memoryview): The state code of every slot. Reading it directly, e.g. with numpy.frombuffer, bypasses
+        the sequence check.
+        timeout: Maximum number of seconds a read is retried.
+    """
+
+    def __init__(self, name: str, timeout: float = 1.0):
+        self.timeout = timeout
+        self._map(_attach(name))
+
+    def _read(self, read: Callable[[], Any]) -> Any:
+        """ Returns the result of read once it did not overlap with a write.
+
+        Raises:
+            TimeoutError: If no read succeeded within timeout seconds.
+        """
+        seq = self._seq
+        attempt = 0
+        deadline = None
+        while True:
+            start = seq[0]
+            if not start & 1:
+                result = read()
+                if seq[0] == start:
+                    return result
+            attempt += 1
+            if attempt >= _SPINS:
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                elif time.monotonic() >= deadline:
+                    raise TimeoutError(f"Shared memory {repr(self.name)} has been written for more than "
+                                       f"{self.timeout} seconds.")
+                time.sleep(0)
+
+    def _name(self, code: int) -> str | None:
+        if code >= len(self._names):
+            self._read_names()
+        return self._names[code]
+
+    def get_model_state(self, slot: int) -> str | None:
+        """ Returns the name of the state of the model in slot or None if the slot is empty. """
+        return self._name(self._read(partial(self.codes.__getitem__, slot)))
+
+    def states(self) -> list[str | None]:
+        """ Returns the state names of all slots. """
+        codes = self._read(self.codes.tolist)
+        if max(codes, default=0) >= len(self._names):
+            self._read_names()
+        names = self._names
+        return [names[code] for code in codes]
+
+    def counts(self) -> dict[str, int]:
+        """ Returns the number of models per state. """
+        counts = self._read(self._counts.tolist)
+        if len(self._names) < len(counts) and any(counts[len(self._names):]):
+            self._read_names()
+        names = self._names
+        return {names[code]: count for code, count in enumerate(counts) if code and count}
+
+    def count_in_state(self, state: str) -> int:
+        return self.counts().get(state, 0)
+
+    def close(self) -> None:
+        self._release()
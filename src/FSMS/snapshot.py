@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import marshal
+import struct
+import sys
+from enum import Enum
+from typing import Any, TYPE_CHECKING
+
+from condition import Condition
+from event import AutoTransitions
+from transition import Transition
+from util import Callback, Callbacks
+
+if TYPE_CHECKING:
+    from machine import Machine
+
+SNAPSHOT_VERSION = 3
+""" Incremented whenever the layout of a snapshot changes. Snapshots of other versions are rejected by loads. """
+
+_HEADER = struct.Struct('<BBBB')
+""" Snapshot version, marshal format and major and minor Python version which precede the marshalled definition. The
+marshal format may change between Python versions, so snapshots are only loaded by the version that wrote them. """
+
+
+def dumps(machine: Machine) -> bytes:
+    """ Exports the definition of a machine (states, events, transitions and callbacks) as a compact binary snapshot.
+
+    Callbacks are stored by name. Callables are converted into dotted import paths which requires them to be module
+    level functions. Equal names and callback collections are stored once and shared by the restored transitions.
+    Models, their states and runtime options like queued or model_binding are not part of a snapshot. Only the
+    attributes of the base State, Transition and Condition classes are exported. Snapshots can only be loaded by the
+    Python version that created them.
+
+    Args:
+        machine: The machine to export.
+
+    Returns:
+        The snapshot as bytes (see loads).
+
+    Raises:
+        ValueError: If a callback cannot be referenced by name.
+    """
+    # marshal writes a back reference for objects it has already written, so values are deduplicated by a memo
+    memo: dict[Any, Any] = {}
+    states = []
+    for state in machine.states.values():
+        enum = _import_path(type(state.value)) if isinstance(state.value, Enum) else None
+        states.append((state.name, enum, _names(memo, state.on_enter), _names(memo, state.on_exit),
+                       state.ignore_invalid_triggers, state.timeout, state.timeout_trigger))
+    events = []
+    for trigger, event in machine.events.items():
+        if isinstance(event.transitions, AutoTransitions):
+            shared = event.transitions._shared[0]
+            custom = {_share(memo, source): [None if trans is shared else _transition(memo, trans)
+                                             for trans in transitions]
+                      for source, transitions in event.transitions._custom.items()}
+            events.append((trigger, shared._dest, custom))
+        else:
+            events.append((trigger, None, {_share(memo, source): [_transition(memo, trans) for trans in transitions]
+                                           for source, transitions in event.transitions.items()}))
+    config = (machine.state_attribute, machine.initial, machine.send_event, machine.auto_transitions,
+              machine.name[:-2] if machine.name else None, machine.ignore_invalid_triggers,
+              _names(memo, machine.before_state_change), _names(memo, machine.after_state_change),
+              _names(memo, machine.prepare_event), _names(memo, machine.finalize_event),
+              _names(memo, machine.on_exception))
+    header = _HEADER.pack(SNAPSHOT_VERSION, marshal.version, *sys.version_info[:2])
+    return header + marshal.dumps((config, states, events))
+
+
+def loads(data: bytes, machine_cls: type[Machine] | None = None, model: Any = 'self', **kwargs) -> Machine:
+    """ Creates a machine from a snapshot created by dumps.
+
+    States, events and transitions are restored directly. Definitions are not validated again and wildcards are not
+    expanded since this already happened when the exported machine has been configured. Restored transitions share
+    equal callback collections and conditions.
+
+    Args:
+        data: The snapshot.
+        machine_cls: The class of the created machine. Defaults to Machine.
+        model: Model(s) added to the machine once it has been restored.
+        **kwargs: Further arguments passed to the initializer of machine_cls, e.g. model_binding or queued.
+
+    Returns:
+        The restored machine.
+
+    Raises:
+        ValueError: If the snapshot has been created by another snapshot version, marshal format or Python version.
+    """
+    if machine_cls is None:
+        from machine import Machine
+        machine_cls = Machine
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated snapshot without header.")
+    version, marshal_version, major, minor = _HEADER.unpack_from(data)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}. Expected {SNAPSHOT_VERSION}.")
+    if (marshal_version, major, minor) != (marshal.version, *sys.version_info[:2]):
+        raise ValueError(f"Snapshot has been created with marshal format {marshal_version} by Python {major}.{minor} "
+                         f"but Python {sys.version_info[0]}.{sys.version_info[1]} uses marshal format "
+                         f"{marshal.version}. Create the snapshot again with this Python version.")
+    config, states, events = marshal.loads(memoryview(data)[_HEADER.size:])
+    (state_attribute, initial, send_event, auto_transitions, name, ignore_invalid_triggers,
+     before_state_change, after_state_change, prepare_event, finalize_event, on_exception) = config
+    machine = machine_cls(model=None, states=None, initial=None, transitions=None, state_attribute=state_attribute,
+                          send_event=send_event, auto_transitions=auto_transitions, name=name,
+                          ignore_invalid_triggers=ignore_invalid_triggers,
+                          before_state_change=list(before_state_change), after_state_change=list(after_state_change),
+                          prepare_event=list(prepare_event), finalize_event=list(finalize_event),
+                          on_exception=list(on_exception), **kwargs)
+
+    state_cls = machine.state_cls
+    for state_name, enum, on_enter, on_exit, ignore, timeout, timeout_trigger in states:
+        state = state_cls.__new__(state_cls)
+        state._name = getattr(machine._import_callable(enum), state_name) if enum is not None else state_name
+        state._on_enter = on_enter
+        state._on_exit = on_exit
+        state.ignore_invalid_triggers = ignore
+        state.timeout = timeout
+        state.timeout_trigger = timeout_trigger
+        machine.states[state_name] = state
+    machine._initial = initial
+
+    transition_cls = machine.transition_cls
+    condition_cls = transition_cls.condition_cls
+    conditions: dict[tuple, tuple[Condition, ...]] = {}
+    for trigger, auto_dest, transitions in events:
+        if auto_dest is not None:
+            machine._add_auto_transition(trigger, auto_dest)
+            event = machine.events[trigger]
+            shared = event.transitions._shared[0]
+            for source, definitions in transitions.items():
+                restored = event.transitions._custom[source] = []
+                for definition in definitions:
+                    if definition is None:
+                        restored.append(shared)
+                    else:
+                        trans = _restore(transition_cls, condition_cls, conditions, source, definition)
+                        restored.append(trans)
+        else:
+            event = machine.events[trigger] = machine.event_cls(trigger, machine)
+            for source, definitions in transitions.items():
+                restored = event.transitions[source] = []
+                for definition in definitions:
+                    trans = _restore(transition_cls, condition_cls, conditions, source, definition)
+                    restored.append(trans)
+    machine._invalidate()
+
+    if model:
+        machine.add_models(model)
+    return machine
+
+
+def _transition(memo: dict[Any, Any], trans: Transition) -> tuple:
+    conditions = _share(memo, tuple((_share(memo, _name(cond._func)), cond._target) for cond in trans._conditions))
+    return (_share(memo, trans._dest), conditions, _names(memo, trans._before), _names(memo, trans._after),
+            _names(memo, trans._prepare))
+
+
+def _restore(transition_cls: type[Transition], condition_cls: type[Condition],
+             conditions: dict[tuple, tuple[Condition, ...]], source: str, definition: tuple) -> Transition:
+    # Collections are only ever replaced (see add_callback) and never modified in place which allows sharing them
+    dest, funcs, before, after, prepare = definition
+    trans = transition_cls.__new__(transition_cls)
+    trans.source = source
+    trans._dest = dest
+    trans._before = before
+    trans._after = after
+    trans._prepare = prepare
+    trans._conditions = conditions.get(funcs)
+    if trans._conditions is None:
+        trans._conditions = conditions[funcs] = tuple(condition_cls(func, target) for func, target in funcs)
+    trans._compiled = None
+    return trans
+
+
+def _share(memo: dict[Any, Any], value: Any) -> Any:
+    return memo.setdefault(value, value)
+
+
+def _names(memo: dict[Any, Any], funcs: Callbacks) -> tuple[str, ...]:
+    return _share(memo, tuple(_share(memo, _name(func)) for func in funcs))
+
+
+def _name(func: Callback) -> str:
+    if isinstance(func, str):
+        return func
+    return _import_path(func)
+
+
+def _import_path(obj: Any) -> str:
+    """ Returns the dotted path Machine.resolve_callable uses to import obj. """
+    module = getattr(obj, '__module__', None)
+    qualname = getattr(obj, '__qualname__', None)
+    if module is None or qualname is None or '.' in qualname or '<' in qualname:
+        raise ValueError(f"{repr(obj)} cannot be referenced by name in a snapshot. Use the name of a model method or "
+                         f"a module level function instead.")
+    return f'{module}.{qualname}'
@@ -14,24 +14,35 @@ class State:
 
     Attributes:
         _name (str | Enum): State name which is also assigned to the model(s).
-        _on_enter (list): Callbacks executed when a state is entered.
-        _on_exit (list): Callbacks executed when a state is exit.
+        _on_enter (list): Callbacks executed when a state is entered. Empty collections are a shared empty tuple.
+        _on_exit (list): Callbacks executed when a state is exit. Empty collections are a shared empty tuple.
         ignore_invalid_triggers (bool): Indicates if unhandled/invalid triggers should raise an exception.
+        timeout (float): Seconds after which timeout_trigger is fired on a model that is still in the state. 0 disables
+        the timeout.
+        timeout_trigger (str): Name of the trigger fired on timeout.
     """
 
     dynamic_methods: list[str] = ['on_enter', 'on_exit']
     """ A list of dynamic methods which can be resolved by a Machine instance for convenience functions. """
 
+    __slots__ = ('_name', '_on_enter', '_on_exit', 'ignore_invalid_triggers', 'timeout', 'timeout_trigger')
+
     def __init__(self,
                  name: str | Enum,
                  on_enter: Callback | Callbacks | None = None,
                  on_exit: Callback | Callbacks | None = None,
-                 ignore_invalid_triggers: bool | None = None):
+                 ignore_invalid_triggers: bool | None = None,
+                 timeout: float = 0,
+                 timeout_trigger: str | None = None):
+        if timeout and not timeout_trigger:
+            raise ValueError(f"State {name} has a timeout but no timeout_trigger.")
         self._name = name
-        self._on_enter: Callbacks = listify(on_enter)
-        self._on_exit: Callbacks = listify(on_exit)
+        self._on_enter: Callbacks = listify(on_enter) or ()
+        self._on_exit: Callbacks = listify(on_exit) or ()
 
         self.ignore_invalid_triggers = ignore_invalid_triggers
+        self.timeout = timeout
+        self.timeout_trigger = timeout_trigger
 
     @property
     def name(self):
@@ -44,13 +55,25 @@ class State:
     def value(self):
         return self._name
 
+    @property
+    def on_enter(self) -> Callbacks:
+        return self._on_enter
+
+    @property
+    def on_exit(self) -> Callbacks:
+        return self._on_exit
+
     def enter(self, event_data: EventData) -> None:
-        """ Triggered when a state is entered. """
+        """ Triggered when a state is entered. Starts the timeout of the state before the callbacks are called. """
+        if self.timeout:
+            event_data.machine._arm_timeout(event_data.model, self)
         event_data.machine.callbacks(self._on_enter, event_data)
 
     def exit(self, event_data) -> None:
-        """ Triggered when a state is exited. """
+        """ Triggered when a state is exited. Cancels the timers of the model bound to this state. """
         event_data.machine.callbacks(self._on_exit, event_data)
+        if event_data.machine._timers:
+            event_data.machine._cancel_timers(event_data.model, self.name)
 
     def add_callback(self, trigger: str, func: str) -> None:
         """ Add a new enter or exit callback.
@@ -58,8 +81,8 @@ class State:
             trigger: The type of triggering event. Must be one of 'enter' or 'exit'.
             func: The callback function.
         """
-        callbacks: list = getattr(self, 'on_' + trigger)
-        callbacks.append(func)
+        attr = '_on_' + trigger
+        setattr(self, attr, [*getattr(self, attr), func])
 
     def __repr__(self):
         return f"<{type(self).__name__}('{self._name}')@{id(self)}>"
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from collections.abc import Callable, Hashable, Iterable
+from typing import Any
+
+
+class StateStore:
+    """ Persists the state names of models by a stable key.
+
+    Pass a StateStore to a Machine (state_store=...) to write every state assigned by Machine.set_state through to the
+    store. The state attribute of a model remains the live value used by triggers. Machine.add_models loads the states
+    of all added models with a single call of load and Machine.get_model_state falls back to the store for models
+    without a state attribute.
+
+    Attributes:
+        key: Returns a stable key of a model, e.g. its database id. The key has to identify the model across restarts.
+    """
+
+    def __init__(self, key: Callable[[Any], Hashable]):
+        self.key = key
+
+    def get(self, key: Hashable) -> str | None:
+        """ Returns the stored state name of key or None. """
+        return self.load((key,)).get(key)
+
+    def load(self, keys: Iterable[Hashable]) -> dict[Hashable, str]:
+        """ Returns the stored state names of keys. Keys without a stored state are omitted. """
+        raise NotImplementedError
+
+    def set(self, key: Hashable, state: str) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """ Blocks until all states passed to set are persisted. """
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MemoryStore(StateStore):
+    """ Keeps the states in a dictionary, e.g. to share them between machines of one process or for tests. """
+
+    def __init__(self, key: Callable[[Any], Hashable]):
+        super().__init__(key)
+        self.states: dict[Hashable, str] = {}
+
+    def load(self, keys: Iterable[Hashable]) -> dict[Hashable, str]:
+        states = self.states
+        return {key: states[key] for key in keys if key in states}
+
+    def set(self, key: Hashable, state: str) -> None:
+        self.states[key] = state
+
+
+class SQLiteStore(StateStore):
+    """ Stores the states in a table of a local SQLite database with write-behind batching.
+
+    States passed to set are buffered and coalesced per key, so a model that changes its state several times between
+    two flushes causes a single write. The buffer is written in one transaction when it holds batch_size keys, on
+    flush, which acts as a barrier, and by a timer at most flush_interval seconds after a state has been buffered, even
+    if no further states are set. If the timer fails to write the buffer, the states remain buffered and the error is
+    raised by the next flush. Buffered states are lost on a crash. Reads see buffered states.
+
+    Keys are stored as they are, so they must be values SQLite can store (e.g. int or str). Loading many keys uses a
+    single query which passes the keys as a JSON array and therefore requires the JSON functions of SQLite.
+
+    Attributes:
+        path: Path of the database file or ':memory:'.
+        table: Name of the table which is created if it does not exist.
+        batch_size: Maximum number of buffered keys.
+        flush_interval: Maximum number of seconds a state stays buffered. States are written immediately if it is 0.
+    """
+
+    def __init__(self, path: str, key: Callable[[Any], Hashable], table: str = 'states', batch_size: int = 1000,
+                 flush_interval: float = 1.0):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {repr(table)}.")
+        super().__init__(key)
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: dict[Hashable, str] = {}
+        self._timer: threading.Timer | None = None
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY, state TEXT NOT NULL) "
+                                 f"WITHOUT ROWID")
+        self._select = f"SELECT key, state FROM {table} WHERE key IN (SELECT value FROM json_each(?))"
+        self._upsert = f"INSERT OR REPLACE INTO {table} (key, state) VALUES (?, ?)"
+
+    def load(self, keys: Iterable[Hashable]) -> dict[Hashable, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            states = dict(self._connection.execute(self._select, (json.dumps(keys),)))
+            pending = self._pending
+            if pending:
+                states.update((key, pending[key]) for key in keys if key in pending)
+        return states
+
+    def set(self, key: Hashable, state: str) -> None:
+        with self._lock:
+            self._pending[key] = state
+            if len(self._pending) >= self.batch_size or self.flush_interval <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_due)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_due(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._connection is None:
+                return
+            try:
+                self.flush()
+            except Exception:
+                # the states stay buffered and the next flush raises again
+                pass
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                connection.executemany(self._upsert, pending.items())
+            except BaseException:
+                connection.execute("ROLLBACK")
+                pending.update(self._pending)
+                self._pending = pending
+                raise
+            connection.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is None:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.flush()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import copy
+from collections import OrderedDict, defaultdict
+from typing import Any
+from weakref import WeakKeyDictionary
+
+from event import AutoTransitions
+from machine import Machine
+from state import State
+from transition import Transition
+
+_DEFINITION = ('states', 'transitions', 'initial', 'auto_transitions', 'state_attribute')
+""" Arguments of a machine which are fixed by a template. """
+
+_SHARED = ('states', '_initial', '_indexes', '_dispatch', '_chains')
+""" Attributes of the prototype which are shared by all instances of a template until they are modified. """
+
+_instance_classes: dict[type, type] = {}
+
+
+class MachineTemplate:
+    """ A machine definition which is built and validated once and instantiated many times.
+
+    All instances share the states, transitions, conditions, indexes and compiled dispatch tables of a prototype
+    machine. An instance only owns its models, queues, machine callbacks and one lightweight Event per trigger. The
+    first change of the definition of an instance (adding states or transitions, replacing before_state_change or
+    after_state_change or assigning on_enter_/on_exit_ attributes to a model instance) gives the instance private
+    copies of the graph. Other instances are not affected.
+
+    Models whose class defines on_enter_<state>/on_exit_<state> methods that are not part of the definition need a
+    graph with these callbacks. It is built once per set of such methods, resolved once per model class, and shared
+    by all instances with models of these classes.
+
+    Instances are frozen (see Machine.freeze). States and transitions returned by an instance (e.g. by get_state) are
+    shared and must not be modified directly.
+
+        template = MachineTemplate(states=['new', 'paid', 'shipped'], initial='new',
+                                   transitions=[['pay', 'new', 'paid'], ['ship', 'paid', 'shipped']])
+        machines = [template.create(order) for order in orders]
+
+    Attributes:
+        machine_cls: The class of the created machines.
+        options: Keyword arguments passed to every created machine.
+    """
+
+    def __init__(self, machine_cls: type[Machine] = Machine, **kwargs):
+        self.machine_cls = machine_cls
+        self.options = {key: value for key, value in kwargs.items() if key not in _DEFINITION}
+        self._kwargs = kwargs
+        self._prototype = self._build(frozenset())
+        self._variants: dict[frozenset[tuple[str, str]], Machine] = {frozenset(): self._prototype}
+        self._conventions: WeakKeyDictionary[type, frozenset[tuple[str, str]]] = WeakKeyDictionary()
+
+    def _build(self, conventions: frozenset[tuple[str, str]]) -> Machine:
+        """ Builds and compiles a prototype with the (state name, dynamic method) callbacks in conventions. """
+        prototype = self.machine_cls(model=None, **self._kwargs)
+        for state in prototype.states.values():
+            for method in State.dynamic_methods:
+                if (state.name, method) in conventions:
+                    state.add_callback(method[3:], f'{method}_{state.name}')
+        prototype._compile()
+        prototype._transition_indexes()
+        return prototype
+
+    def _variant(self, conventions: frozenset[tuple[str, str]]) -> Machine:
+        variant = self._variants.get(conventions)
+        if variant is None:
+            variant = self._variants[conventions] = self._build(conventions)
+        return variant
+
+    def _class_conventions(self, cls: type) -> frozenset[tuple[str, str]]:
+        """ Returns the on_enter_/on_exit_ methods defined by cls which are not callbacks of the definition. """
+        conventions = self._conventions.get(cls)
+        if conventions is None:
+            conventions = frozenset((state.name, method) for state in self._prototype.states.values()
+                                    for method in State.dynamic_methods
+                                    if hasattr(cls, f'{method}_{state.name}')
+                                    and f'{method}_{state.name}' not in getattr(state, method))
+            try:
+                self._conventions[cls] = conventions
+            except TypeError:  # classes that cannot be weakly referenced are resolved again
+                pass
+        return conventions
+
+    def create(self, model: Any = Machine.SELF_LITERAL, **options) -> Machine:
+        """ Creates a machine of the template.
+
+        Args:
+            model: Model(s) added to the machine like for Machine.
+            options: Arguments of the machine like queued, model_binding or journal which override those of the
+            template. States, transitions, initial, auto_transitions and state_attribute are defined by the template.
+
+        Returns:
+            The new machine.
+        """
+        fixed = [key for key in options if key in _DEFINITION]
+        if fixed:
+            raise ValueError(f"{', '.join(fixed)} cannot be changed for instances of a template.")
+        cls = _instance_classes.get(self.machine_cls)
+        if cls is None:
+            cls = _instance_classes[self.machine_cls] = type(self.machine_cls.__name__,
+                                                             (_TemplateInstance, self.machine_cls), {})
+        machine = cls(model=None, states=None, transitions=None, initial=None, **{**self.options, **options})
+        machine._share(self)
+        if 'before_state_change' in options or 'after_state_change' in options:
+            # compiled transitions of the template contain its machine callbacks
+            machine._detach()
+        if model:
+            machine.add_models(model)
+        return machine
+
+
+class _TemplateInstance(Machine):
+    """ Shares the graph of a template and copies it before the first modification. """
+
+    _template: MachineTemplate | None = None
+
+    def _share(self, template: MachineTemplate) -> None:
+        prototype = template._prototype
+        self.events = {name: event.bind(self) for name, event in prototype.events.items()}
+        self._frozen = True
+        self._template = template
+        self._conventions: frozenset[tuple[str, str]] = frozenset()
+        self._use(prototype)
+
+    def _use(self, prototype: Machine) -> None:
+        """ Shares the graph of prototype. Events keep their identity since models may be bound to them. """
+        shared = prototype.__dict__
+        self.__dict__.update((attr, shared[attr]) for attr in _SHARED if attr in shared)
+        for name, event in self.events.items():
+            event.transitions = prototype.events[name].transitions
+            event._dispatch = prototype.events[name]._dispatch
+        self._prototype = prototype
+
+    def _detach(self) -> None:
+        """ Replaces the shared graph with private copies. Events keep their identity since models may be bound to
+        them. """
+        self._template = None
+        self.__dict__.pop('_prototype', None)
+        copies: dict[int, Transition] = {}
+
+        def private(trans: Transition) -> Transition:
+            trans_copy = copies.get(id(trans))
+            if trans_copy is None:
+                trans_copy = copies[id(trans)] = copy.copy(trans)
+            return trans_copy
+
+        self.states = OrderedDict((name, _copy_state(state)) for name, state in self.states.items())
+        for event in self.events.values():
+            transitions = event.transitions
+            if isinstance(transitions, AutoTransitions):
+                auto = AutoTransitions(self, private(transitions._shared[0]))
+                auto._custom = {source: [private(trans) for trans in custom]
+                                for source, custom in transitions._custom.items()}
+                event.transitions = auto
+            else:
+                event.transitions = defaultdict(list, {source: [private(trans) for trans in own]
+                                                       for source, own in transitions.items()})
+            event._dispatch = None
+        self._indexes = None
+        self._dispatch = None
+        if '_chains' in self.__dict__:
+            self._chains = {}
+
+    def add_states(self, *args, **kwargs) -> None:
+        if self._template is not None:
+            self._detach()
+        super().add_states(*args, **kwargs)
+
+    add_state = add_states
+
+    def add_transition(self, *args, **kwargs) -> None:
+        if self._template is not None:
+            self._detach()
+        super().add_transition(*args, **kwargs)
+
+    def _invalidate(self) -> None:
+        if self._template is not None:
+            self._detach()
+        super()._invalidate()
+
+    def _compile(self) -> None:
+        if self._template is None:
+            super()._compile()
+            return
+        prototype = self._prototype
+        self._dispatch = prototype._dispatch
+        for name, event in self.events.items():
+            event._dispatch = prototype.events[name]._dispatch
+
+    def _add_dynamic_methods(self, model: Any, state: State) -> None:
+        template = self._template
+        if template is not None:
+            cls = model if isinstance(model, type) else type(model)
+            conventions = template._class_conventions(cls)
+            if not conventions <= self._conventions:
+                # callbacks are resolved by name, so the graph with the methods of all models serves every model
+                self._conventions |= conventions
+                self._use(template._variant(self._conventions))
+            attrs = getattr(model, '__dict__', None) if cls is not model else None
+            if not attrs or not any(f'{method}_{state.name}' in attrs
+                                    and f'{method}_{state.name}' not in getattr(self.states[state.name], method)
+                                    for method in State.dynamic_methods):
+                return
+            self._detach()
+        super()._add_dynamic_methods(model, self.states[state.name])
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = super().__getstate__()
+        for attr in ('_template', '_prototype', '_conventions'):
+            state.pop(attr, None)
+        return state
+
+    def __reduce_ex__(self, protocol):
+        # the generated class cannot be pickled by reference, copies are instances of the template's machine class
+        return _new_machine, (type(self).__bases__[1],), self.__getstate__()
+
+
+def _new_machine(cls: type[Machine]) -> Machine:
+    return cls.__new__(cls)
+
+
+def _copy_state(state: State) -> State:
+    state_copy = copy.copy(state)
+    for cls in type(state).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            value = getattr(state_copy, slot, None)
+            if isinstance(value, list):
+                setattr(state_copy, slot, list(value))
+    return state_copy
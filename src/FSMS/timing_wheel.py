@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Callable
+from math import ceil
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Timer:
+    """ A callback scheduled on a TimingWheel.
+
+    Attributes:
+        deadline (int): The tick at which the timer fires.
+        callback (Callable): The function called when the timer fires.
+        args (tuple): Positional arguments passed to callback.
+        _bucket (dict): The bucket of the wheel holding the timer. None once the timer fired or has been cancelled.
+        _wheel (TimingWheel): The wheel the timer is scheduled on.
+    """
+
+    __slots__ = ('deadline', 'callback', 'args', '_bucket', '_wheel')
+
+    def __init__(self, wheel: TimingWheel, deadline: int, callback: Callable[..., Any], args: tuple):
+        self._wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self._bucket: dict[Timer, None] | None = None
+
+    @property
+    def pending(self) -> bool:
+        """ True while the timer has neither fired nor been cancelled. """
+        return self._bucket is not None
+
+    def cancel(self) -> bool:
+        """ Cancels the timer in O(1). Returns False if the timer already fired or has been cancelled. """
+        return self._wheel.cancel(self)
+
+    def __repr__(self):
+        callback = getattr(self.callback, '__name__', self.callback)
+        return f"<{type(self).__name__}({self.deadline}, {callback})@{id(self)}>"
+
+
+class TimingWheel:
+    """ A hierarchical timing wheel which serves any number of timers with constant cost per insert and cancel.
+
+    Time advances in ticks of a fixed resolution. Level 0 has one bucket per tick, every further level covers slots
+    times the span of the level below. A timer is stored in the lowest level whose span covers its remaining delay
+    and moves to a lower level whenever the wheel reaches the window of its bucket. Timers beyond the span of the
+    highest level wait in an overflow bucket which is redistributed whenever the highest level wraps.
+
+    The wheel does not keep time itself. It advances when tick is called, either manually (e.g. for deterministic
+    tests) or by a ThreadDriver or an AsyncioDriver that follow the monotonic clock.
+
+    Attributes:
+        resolution (float): Seconds per tick. Delays are rounded up to whole ticks.
+        slots (int): Buckets per level.
+        levels (int): Number of levels.
+    """
+
+    def __init__(self, resolution: float = 0.1, slots: int = 64, levels: int = 4):
+        if resolution <= 0 or slots < 2 or levels < 1:
+            raise ValueError("TimingWheel requires a positive resolution, at least 2 slots and at least 1 level.")
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._wheels: list[list[dict[Timer, None]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._overflow: dict[Timer, None] = {}
+        self._tick = 0
+        self._count = 0
+        self._lock = threading.RLock()
+
+    @property
+    def now(self) -> float:
+        """ Seconds the wheel has advanced since it was created. """
+        return self._tick * self.resolution
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args) -> Timer:
+        """ Calls callback(*args) once the wheel has advanced by delay seconds.
+
+        Args:
+            delay: Seconds until the timer fires. Timers with a delay of zero fire with the next tick.
+            callback: The function to call.
+            *args: Positional arguments passed to callback.
+
+        Returns:
+            The Timer which can be used to cancel the call.
+        """
+        with self._lock:
+            timer = Timer(self, self._tick + max(1, ceil(delay / self.resolution)), callback, args)
+            self._insert(timer)
+            self._count += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        """ Cancels timer. Returns False if the timer already fired or has been cancelled. """
+        with self._lock:
+            bucket = timer._bucket
+            if bucket is None:
+                return False
+            del bucket[timer]
+            timer._bucket = None
+            self._count -= 1
+            return True
+
+    def _insert(self, timer: Timer) -> None:
+        remaining = timer.deadline - self._tick
+        spans = self._spans
+        for level in range(self.levels):
+            if remaining < spans[level + 1]:
+                bucket = self._wheels[level][timer.deadline // spans[level] % self.slots]
+                break
+        else:
+            bucket = self._overflow
+        bucket[timer] = None
+        timer._bucket = bucket
+
+    def tick(self, count: int = 1) -> int:
+        """ Advances the wheel by count ticks and calls the callbacks of all expired timers.
+
+        Callbacks are called in order of their deadline after the wheel has been advanced and outside of its lock, so
+        they may schedule or cancel timers. All expired callbacks are called even if one of them raises. The first
+        exception is raised afterwards.
+
+        Returns:
+            The number of timers that fired.
+        """
+        expired: list[Timer] = []
+        with self._lock:
+            remaining = count
+            while remaining and self._count:
+                self._advance(expired)
+                remaining -= 1
+            # without pending timers there is nothing to cascade or fire, so the remaining ticks are skipped at once
+            self._tick += remaining
+        error = None
+        for timer in expired:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+        return len(expired)
+
+    def _advance(self, expired: list[Timer]) -> None:
+        self._tick += 1
+        tick = self._tick
+        spans = self._spans
+        for level in range(1, self.levels):
+            if tick % spans[level]:
+                break
+            self._cascade(self._wheels[level], tick // spans[level] % self.slots)
+        else:
+            if self._overflow and not tick % spans[self.levels]:
+                overflow, self._overflow = self._overflow, {}
+                for timer in overflow:
+                    self._insert(timer)
+        wheel = self._wheels[0]
+        bucket = wheel[tick % self.slots]
+        if bucket:
+            wheel[tick % self.slots] = {}
+            for timer in bucket:
+                timer._bucket = None
+            self._count -= len(bucket)
+            expired.extend(bucket)
+
+    def _cascade(self, wheel: list[dict[Timer, None]], index: int) -> None:
+        bucket = wheel[index]
+        if bucket:
+            wheel[index] = {}
+            for timer in bucket:
+                self._insert(timer)
+
+    def advance(self, seconds: float) -> int:
+        """ Advances the wheel by the whole ticks within seconds. See tick. """
+        return self.tick(int(seconds / self.resolution))
+
+
+class ThreadDriver:
+    """ Advances a TimingWheel from a daemon thread following the monotonic clock.
+
+    Callbacks run in the driver thread. Machines whose models are triggered by timers and from other threads should
+    therefore be LockedMachines. Exceptions raised by callbacks are passed to on_error which logs them by default.
+
+    Attributes:
+        wheel (TimingWheel): The driven wheel.
+        on_error (Callable): Called with every exception raised by a tick.
+    """
+
+    def __init__(self, wheel: TimingWheel, on_error: Callable[[Exception], Any] | None = None):
+        self.wheel = wheel
+        self.on_error = on_error or (lambda e: _LOGGER.error("Timer callback failed", exc_info=e))
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> ThreadDriver:
+        if self._thread is not None:
+            raise RuntimeError("Driver has already been started.")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='TimingWheel', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        wheel = self.wheel
+        start = time.monotonic()
+        done = 0
+        while not self._stopped.wait(wheel.resolution):
+            due = int((time.monotonic() - start) / wheel.resolution)
+            try:
+                wheel.tick(due - done)
+            except Exception as e:
+                self.on_error(e)
+            done = due
+
+
+class AsyncioDriver:
+    """ Advances a TimingWheel from a task of the running asyncio loop following the loop's clock.
+
+    Callbacks run in the event loop which is required for timers of an AsyncMachine.
+
+    Attributes:
+        wheel (TimingWheel): The driven wheel.
+        on_error (Callable): Called with every exception raised by a tick.
+    """
+
+    def __init__(self, wheel: TimingWheel, on_error: Callable[[Exception], Any] | None = None):
+        self.wheel = wheel
+        self.on_error = on_error or (lambda e: _LOGGER.error("Timer callback failed", exc_info=e))
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> AsyncioDriver:
+        """ Starts driving the wheel. Must be called while the loop is running. """
+        if self._task is not None:
+            raise RuntimeError("Driver has already been started.")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        wheel = self.wheel
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        done = 0
+        while True:
+            await asyncio.sleep(wheel.resolution)
+            due = int((loop.time() - start) / wheel.resolution)
+            try:
+                wheel.tick(due - done)
+            except Exception as e:
+                self.on_error(e)
+            done = due
@@ -7,6 +7,8 @@ from util import listify, Callback, Callbacks
 
 if TYPE_CHECKING:
     from event import EventData
+    from machine import Machine
+    from state import State
 
 
 class Transition:
@@ -21,11 +23,17 @@ class Transition:
         been successful.
         _prepare (Callbacks): Callbacks executed before conditions checks.
         _conditions (list[Condition]): Callbacks evaluated to determine if the transition should be executed.
+
+    Empty callback and condition collections are a shared empty tuple.
     """
 
     dynamic_methods: list[str] = ['before', 'after', 'prepare']
     """ A list of dynamic methods which can be resolved by a Machine instance for convenience functions. """
 
+    condition_cls = Condition
+
+    __slots__ = ('source', '_dest', '_before', '_after', '_prepare', '_conditions', '_compiled')
+
     def __init__(self,
                  source: str,
                  dest: str,
@@ -37,20 +45,35 @@ class Transition:
                  **kwargs):
         self.source = source
         self._dest = dest
-        self._before: Callbacks = listify(before)
-        self._after: Callbacks = listify(after)
-        self._prepare: Callbacks = listify(prepare)
-        self._conditions: list[Condition] = (list(Condition(func, target=True) for func in listify(conditions))
-                                             + list(Condition(func, target=False) for func in listify(unless)))
+        self._before: Callbacks = listify(before) or ()
+        self._after: Callbacks = listify(after) or ()
+        self._prepare: Callbacks = listify(prepare) or ()
+        self._conditions: list[Condition] = (
+            list(self.condition_cls(func, target=True) for func in listify(conditions))
+            + list(self.condition_cls(func, target=False) for func in listify(unless))) or ()
+        self._compiled: tuple[State | None, tuple[Callback, ...], tuple[Callback, ...]] | None = None
 
     def _eval_conditions(self, event_data: EventData) -> bool:
-        return all([cond.check(event_data) for cond in self._conditions])
+        for cond in self._conditions:
+            if not cond.check(event_data):
+                return False
+        return True
 
-    def _change2dest(self, event_data: EventData) -> None:
-        event_data.machine.get_state(self.source).exit(event_data)
-        event_data.machine.set_state(event_data.model, self._dest)
-        event_data.update(getattr(event_data.model, event_data.machine.state_attribute))
-        event_data.machine.get_state(self._dest).enter(event_data)
+    def _change2dest(self, event_data: EventData, dest: State | None = None) -> None:
+        machine = event_data.machine
+        if dest is None:
+            dest = machine.get_state(self._dest)
+        event_data.state.exit(event_data)
+        machine.set_state(event_data.model, dest)
+        event_data.update(dest)
+        dest.enter(event_data)
+
+    def compile(self, machine: Machine) -> None:
+        """ Resolves the destination state and merges machine and transition callbacks for a frozen machine. """
+        dest = machine.get_state(self._dest) if self._dest else None
+        self._compiled = (dest,
+                          tuple(machine.before_state_change) + tuple(self._before),
+                          tuple(machine.after_state_change) + tuple(self._after))
 
     def add_callback(self, trigger: str, func: Callback) -> None:
         """ Add a new before, after, or prepare callback.
@@ -59,8 +82,9 @@ class Transition:
             trigger: The type of triggering event. Must be one of 'before', 'after' or 'prepare'.
             func: The callback function.
         """
-        callbacks: Callbacks = getattr(self, trigger)
-        callbacks.append(func)
+        attr = '_' + trigger
+        setattr(self, attr, [*getattr(self, attr), func])
+        self._compiled = None
 
     def execute(self, event_data: EventData) -> bool:
         """ Execute the transition.
@@ -71,14 +95,25 @@ class Transition:
         Returns:
             Indicates whether the transition was successfully executed (True if successful, False if not).
         """
-        event_data.machine.callbacks(self._prepare, event_data)
+        machine = event_data.machine
+        machine.callbacks(self._prepare, event_data)
         if not self._eval_conditions(event_data):
             return False
-        event_data.machine.callbacks(event_data.machine.before_state_change + self._before, event_data)
-
-        if self._dest:
-            self._change2dest(event_data)
-        event_data.machine.callbacks(event_data.machine.after_state_change + self._after, event_data)
+        compiled = self._compiled if machine._dispatch is not None else None
+        if compiled is None:
+            machine.callbacks(machine.before_state_change, event_data)
+            machine.callbacks(self._before, event_data)
+            if self._dest:
+                self._change2dest(event_data)
+            machine.callbacks(machine.after_state_change, event_data)
+            machine.callbacks(self._after, event_data)
+            return True
+
+        dest, before, after = compiled
+        machine.callbacks(before, event_data)
+        if dest is not None:
+            self._change2dest(event_data, dest)
+        machine.callbacks(after, event_data)
         return True
 
     def __repr__(self):
@@ -1,4 +1,4 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Iterator
 from enum import Enum, EnumMeta
 from typing import TypeVar
 
@@ -24,3 +24,16 @@ def listify(obj: T | list[T]) -> list[T]:
         return obj if isinstance(obj, (list, tuple, EnumMeta)) else [obj]
     except ReferenceError:
         return [obj]
+
+
+def iterify(obj: T | Iterable[T]) -> Iterable[T]:
+    """Like listify but passes iterators (e.g. generators) and sets through so that they can be consumed lazily.
+
+    Args:
+        obj: object or collection of objects.
+    Returns:
+        An iterable over "obj", empty in case "obj" is None.
+    """
+    if isinstance(obj, (Iterator, set, frozenset)):
+        return obj
+    return listify(obj)
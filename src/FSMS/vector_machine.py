@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from event import AutoTransitions
+from exception import MachineError
+from machine import Machine
+from util import listify, StateParam, StatesParam
+
+_NO_TRANSITION = -1
+_CONDITIONAL = -2
+
+
+class VectorMachine(Machine):
+    """ A machine for large populations of identical models stored as a struct of arrays.
+
+    States and transitions are defined like for a Machine but models are not objects. Instead, the state of every model
+    is an integer code in the NumPy array model_states. When the configuration is compiled, every trigger is turned
+    into a lookup row (state code -> destination code) so that dispatch processes all selected models with a few
+    vectorized operations.
+
+    Conditions are array predicates: callables (or names of attributes of the machine) which receive the indices of
+    the models that are about to transition plus the arguments passed to dispatch and return a boolean array of the
+    same length. Per model callbacks (before, after, prepare, on_enter, on_exit and the machine wide callbacks) are not
+    supported.
+
+    Attributes:
+        model_states (numpy.ndarray): State codes of all models. The code of a state is its position in states.
+        size: Number of models.
+    """
+
+    def __init__(self,
+                 size: int = 0,
+                 states: StatesParam | None = None,
+                 initial: StateParam = 'initial',
+                 transitions: list[list[str]] | list[dict[str, str]] | None = None,
+                 auto_transitions: bool = True,
+                 name: str | None = None,
+                 ignore_invalid_triggers: bool | None = None,
+                 **kwargs):
+        if np is None:
+            raise ImportError("VectorMachine requires NumPy to be installed.")
+        self._codes: dict[str, int] = {}
+        self._state_list = []
+        self._rows: dict[str, Any] = {}
+        self._rules: dict[str, dict[int, list[tuple[list[tuple[Callable, bool]], int]]]] = {}
+        self._ignore = None
+        self.model_states = np.zeros(0, dtype=np.int8)
+        super().__init__(model=None, states=states, initial=initial, transitions=transitions,
+                         auto_transitions=auto_transitions, name=name,
+                         ignore_invalid_triggers=ignore_invalid_triggers, **kwargs)
+        if size:
+            self.add_population(size)
+
+    @property
+    def size(self) -> int:
+        return len(self.model_states)
+
+    def add_population(self, size: int, initial: StateParam | None = None) -> range:
+        """ Adds size models in state initial (defaults to the initial state of the machine).
+
+        Returns:
+            The indices of the added models.
+        """
+        if self._dispatch is None:
+            self._compile()
+        initial = self.get_state(initial if initial is not None else self.initial)
+        start = len(self.model_states)
+        added = np.full(size, self._codes[initial.name], dtype=self.model_states.dtype)
+        self.model_states = np.concatenate((self.model_states, added))
+        return range(start, start + size)
+
+    def _compile(self) -> None:
+        super()._compile()
+        try:
+            self._vectorize()
+        except BaseException:
+            # otherwise the next dispatch would skip compiling and use the tables of the previous configuration
+            self._dispatch = None
+            raise
+
+    def _vectorize(self) -> None:
+        self._codes = {name: code for code, name in enumerate(self.states)}
+        self._state_list = list(self.states.values())
+        dtype = np.min_scalar_type(-len(self._codes) - 1)
+        if np.dtype(dtype).itemsize > self.model_states.dtype.itemsize:
+            self.model_states = self.model_states.astype(dtype)
+
+        if self.before_state_change or self.after_state_change:
+            raise MachineError(f"{self.name}VectorMachine does not support state change callbacks.")
+        for state in self.states.values():
+            if state.on_enter or state.on_exit:
+                raise MachineError(f"{self.name}VectorMachine does not support callbacks of state {state.name}.")
+        self._ignore = np.array([state.ignore_invalid_triggers if state.ignore_invalid_triggers is not None
+                                 else bool(self.ignore_invalid_triggers) for state in self.states.values()], dtype=bool)
+
+        self._rows = {}
+        self._rules = {}
+        for trigger, event in self.events.items():
+            if isinstance(event.transitions, AutoTransitions):
+                continue
+            row = np.full(len(self._codes), _NO_TRANSITION, dtype=np.int32)
+            rules = {}
+            for source, transitions in event.transitions.items():
+                code = self._codes[source]
+                candidates = []
+                for trans in transitions:
+                    if trans._before or trans._after or trans._prepare:
+                        raise MachineError(f"{self.name}VectorMachine does not support callbacks of {trans}.")
+                    dest = self._codes[trans._dest] if trans._dest else code
+                    conditions = [(cond._func, cond._target) for cond in trans._conditions]
+                    candidates.append((conditions, dest))
+                    if not conditions:
+                        break
+                if len(candidates) == 1 and not candidates[0][0]:
+                    row[code] = candidates[0][1]
+                elif candidates:
+                    row[code] = _CONDITIONAL
+                    rules[code] = candidates
+            self._rows[trigger] = row
+            self._rules[trigger] = rules
+
+    def dispatch(self, trigger: str, *args, mask=None, **kwargs):
+        """ Triggers an event on all (or the selected) models at once.
+
+        Args:
+            trigger: Name of the trigger.
+            *args: Positional arguments passed to conditions.
+            mask: Boolean array of length size or an array of model indices. Defaults to all models.
+            **kwargs: Keyword arguments passed to conditions.
+
+        Returns:
+            A boolean array aligned with the selected models which indicates whether a transition has been executed.
+        """
+        if self._dispatch is None:
+            self._compile()
+        try:
+            event = self.events[trigger]
+        except KeyError:
+            raise AttributeError(f"Do not know event named {trigger}")
+        if mask is None:
+            index = None
+            current = self.model_states
+        else:
+            mask = np.asarray(mask)
+            index = np.flatnonzero(mask) if mask.dtype == bool else mask
+            current = self.model_states[index]
+
+        if isinstance(event.transitions, AutoTransitions):
+            dest = self._codes[event.transitions._shared[0]._dest]
+            if index is None:
+                self.model_states.fill(dest)
+            else:
+                self.model_states[index] = dest
+            return np.ones(len(current), dtype=bool)
+
+        dest = self._rows[trigger][current]
+        invalid = dest == _NO_TRANSITION
+        if invalid.any():
+            invalid &= ~self._ignore[current]
+            if invalid.any():
+                state = self._state_list[current[np.argmax(invalid)]]
+                raise MachineError(f"{self.name} Cannot trigger event {trigger} from state {state.name}")
+        success = dest >= 0
+
+        conditional = dest == _CONDITIONAL
+        if conditional.any():
+            positions = np.flatnonzero(conditional)
+            if index is None:
+                index = np.arange(len(self.model_states))
+            for code in np.unique(current[positions]):
+                pending = positions[current[positions] == code]
+                for conditions, target in self._rules[trigger][code]:
+                    passed = np.ones(len(pending), dtype=bool)
+                    for func, expected in conditions:
+                        predicate = getattr(self, func) if isinstance(func, str) else func
+                        passed &= np.asarray(predicate(index[pending], *args, **kwargs), dtype=bool) == expected
+                    dest[pending[passed]] = target
+                    success[pending[passed]] = True
+                    pending = pending[~passed]
+                    if not len(pending):
+                        break
+
+        if index is None:
+            np.copyto(self.model_states, dest, where=success, casting='unsafe')
+        else:
+            self.model_states[index[success]] = dest[success]
+        return success
+
+    def get_model_state(self, index: int):
+        if self._dispatch is None:
+            self._compile()
+        return self._state_list[self.model_states[index]]
+
+    def set_state(self, index, state: StateParam):
+        """ Assigns state to the model(s) at index (an integer, index array or boolean mask). """
+        if self._dispatch is None:
+            self._compile()
+        self.model_states[index] = self._codes[self.get_state(state).name]
+
+    def count_in_state(self, state) -> int:
+        if self._dispatch is None:
+            self._compile()
+        return int(np.count_nonzero(self.model_states == self._codes[self._state_name(state)]))
+
+    def models_in(self, state):
+        """ Returns the indices of all models currently in state. """
+        if self._dispatch is None:
+            self._compile()
+        return np.flatnonzero(self.model_states == self._codes[self._state_name(state)])
+
+    def add_models(self, models, initial=None) -> None:
+        raise MachineError(f"{self.name}VectorMachine does not manage model objects. Use add_population instead.")
+
+    def states_of(self, states: StateParam | StatesParam):
+        """ Returns a boolean mask of all models in one of the passed states. Can be passed as mask to dispatch. """
+        if self._dispatch is None:
+            self._compile()
+        codes = [self._codes[self._state_name(state)] for state in listify(states)]
+        return np.isin(self.model_states, codes)
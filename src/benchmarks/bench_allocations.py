@@ -0,0 +1,75 @@
+""" Memory allocated per trigger on the hot path.
+
+For every configuration a warmed up model is triggered while tracemalloc records the peak of transient allocations
+(bytes alive at once during a single trigger) and the number of bytes left behind.
+
+Usage:
+    python bench_allocations.py
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from machine import Machine  # noqa: E402
+
+
+class Model:
+
+    def passes(self):
+        return True
+
+    def fails(self):
+        return False
+
+    def noop(self):
+        pass
+
+
+CONFIGS = {
+    'plain': {},
+    'conditions': {'conditions': ['passes', 'passes'], 'unless': 'fails'},
+    'callbacks': {'before': 'noop', 'after': ['noop', 'noop']},
+}
+
+
+def build(transition: dict, frozen: bool, pooled: bool) -> Model:
+    model = Model()
+    machine = Machine(model, states=['a', 'b'], initial='a', auto_transitions=False, pool_event_data=pooled,
+                      transitions=[dict(trigger='go', source='a', dest='b', **transition),
+                                   dict(trigger='go', source='b', dest='a', **transition)])
+    if frozen:
+        machine.freeze()
+    return model
+
+
+def measure(model: Model) -> dict:
+    for _ in range(100):
+        model.go()
+    tracemalloc.start()
+    model.go()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    model.go()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'peak_transient_bytes': peak - baseline, 'retained_bytes': size - baseline}
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+    results = []
+    for name, transition in CONFIGS.items():
+        for frozen in (False, True):
+            for pooled in (False, True):
+                result = {'config': name, 'frozen': frozen, 'pooled': pooled}
+                result.update(measure(build(transition, frozen, pooled)))
+                results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
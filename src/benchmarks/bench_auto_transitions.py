@@ -0,0 +1,56 @@
+""" Construction time and memory of machines with auto transitions.
+
+Every size is measured in a fresh interpreter so that the peak resident set size (RSS) is not shared between runs.
+
+Usage:
+    python bench_auto_transitions.py [--sizes 100 1000 10000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from machine import Machine  # noqa: E402
+
+
+def measure(n_states: int) -> dict:
+    states = [f's{i}' for i in range(n_states)]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    machine = Machine(None, states=states, initial=states[0], auto_transitions=True)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'states': n_states,
+        'events': len(machine.events),
+        'construction_s': elapsed,
+        'peak_rss_kb': rss_after,
+        'rss_growth_kb': rss_after - rss_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(measure(args.single)))
+        return
+
+    results = []
+    for size in args.sizes:
+        out = subprocess.run([sys.executable, __file__, '--single', str(size)],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+""" Overhead of recording a journal per backend and speed of replaying it.
+
+For every backend a population of models is triggered --events times while the journal records. Afterwards the states
+are recovered into fresh models, once by assigning the recorded states only and once by firing the triggers again.
+
+Usage:
+    python bench_journal.py --models 1000 --events 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from journal import FileBackend, Journal, MemoryBackend, MmapBackend  # noqa: E402
+from machine import Machine  # noqa: E402
+
+
+class Model:
+
+    def __init__(self, key: int):
+        self.key = key
+
+
+def build(models: list[Model], journal: Journal | None) -> Machine:
+    return Machine(models, states=['a', 'b', 'c'], initial='a', auto_transitions=False, journal=journal,
+                   transitions=[dict(trigger='next', source='a', dest='b'), dict(trigger='next', source='b', dest='c'),
+                                dict(trigger='next', source='c', dest='a')])
+
+
+def run(backend_factory, models: int, events: int) -> dict:
+    population = [Model(i) for i in range(models)]
+    journal = Journal(backend_factory(), key=lambda model: model.key) if backend_factory else None
+    build(population, journal)
+    start = time.perf_counter()
+    for i in range(events):
+        population[i % models].next(i)
+    if journal is not None:
+        journal.flush()
+    result = {'record_seconds': time.perf_counter() - start}
+    if journal is None:
+        return result
+    for state_only in (True, False):
+        fresh = [Model(i) for i in range(models)]
+        machine = build(fresh, None)
+        start = time.perf_counter()
+        journal.replay(machine, state_only=state_only)
+        result['replay_state_only_seconds' if state_only else 'replay_triggers_seconds'] = \
+            time.perf_counter() - start
+        assert [model.state for model in fresh] == [model.state for model in population]
+    journal.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        backends = {
+            'none': None,
+            'memory': lambda: MemoryBackend(capacity=args.events),
+            'file': lambda: FileBackend(os.path.join(directory, 'journal.log')),
+            'mmap': lambda: MmapBackend(os.path.join(directory, 'segments')),
+        }
+        results = {name: run(factory, args.models, args.events) for name, factory in backends.items()}
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+""" Memory used per state and per transition.
+
+Usage:
+    python bench_memory.py [--count 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from machine import Machine  # noqa: E402
+
+
+def bytes_per_state(count: int) -> float:
+    machine = Machine(None, states=['s0'], initial='s0', auto_transitions=False)
+    names = [f's{i}' for i in range(1, count + 1)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    machine.add_states(names)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def bytes_per_transition(count: int, conditions: bool) -> float:
+    names = [f's{i}' for i in range(count)]
+    machine = Machine(None, states=names, initial='s0', auto_transitions=False)
+    machine.add_transition('warmup', 's0', 's1')
+    extra = {'conditions': 'is_ready'} if conditions else {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        machine.add_transition('next', names[i], names[(i + 1) % count], **extra)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps({
+        'count': args.count,
+        'bytes_per_state': bytes_per_state(args.count),
+        'bytes_per_transition': bytes_per_transition(args.count, conditions=False),
+        'bytes_per_transition_with_condition': bytes_per_transition(args.count, conditions=True),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
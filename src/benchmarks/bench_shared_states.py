@@ -0,0 +1,80 @@
+""" Cost of publishing states through a SharedStateStore and of reading them from another process.
+
+A population of models is triggered --events times without a store and with a SharedStateStore. Meanwhile a reader
+process attached to the segment queries single states and the counts per state and reports how many reads it completed
+per second.
+
+Usage:
+    python bench_shared_states.py --models 10000 --events 100000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from machine import Machine  # noqa: E402
+from shared_states import SharedStateReader, SharedStateStore  # noqa: E402
+
+
+class Model:
+
+    def __init__(self, slot: int):
+        self.slot = slot
+
+
+def trigger(models: int, events: int, store: SharedStateStore | None) -> float:
+    population = [Model(i) for i in range(models)]
+    Machine(population, states=['a', 'b', 'c'], initial='a', auto_transitions=False, state_store=store,
+            transitions=[dict(trigger='next', source='a', dest='b'), dict(trigger='next', source='b', dest='c'),
+                         dict(trigger='next', source='c', dest='a')])
+    start = time.perf_counter()
+    for i in range(events):
+        population[i % models].next()
+    return time.perf_counter() - start
+
+
+def read(name: str, models: int, started, done, results) -> None:
+    reader = SharedStateReader(name)
+    started.set()
+    states = counts = 0
+    start = time.perf_counter()
+    while not done.is_set():
+        for slot in range(0, models, 97):
+            reader.get_model_state(slot)
+            states += 1
+        reader.counts()
+        counts += 1
+    seconds = time.perf_counter() - start
+    results.put({'get_model_state_per_second': states / seconds, 'counts_per_second': counts / seconds})
+    reader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=100000)
+    args = parser.parse_args()
+
+    result = {'trigger_seconds[none]': trigger(args.models, args.events, None)}
+    store = SharedStateStore(lambda model: model.slot, capacity=args.models)
+    context = multiprocessing.get_context('spawn')
+    started, done, results = context.Event(), context.Event(), context.Queue()
+    process = context.Process(target=read, args=(store.name, args.models, started, done, results))
+    process.start()
+    started.wait()
+    try:
+        result['trigger_seconds[shared]'] = trigger(args.models, args.events, store)
+        done.set()
+        result.update(results.get())
+        process.join()
+    finally:
+        store.unlink()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
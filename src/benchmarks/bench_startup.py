@@ -0,0 +1,59 @@
+""" Startup time of a machine configured from a transitions list compared to loading a definition snapshot.
+
+The configured machine uses string callbacks and conditions on every transition. Timings are the best of several
+repetitions in seconds.
+
+Usage:
+    python bench_startup.py --states 1000 --transitions 30000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from machine import Machine  # noqa: E402
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--states', type=int, default=1000)
+    parser.add_argument('--transitions', type=int, default=30000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    states = [f's{i}' for i in range(args.states)]
+    transitions = [dict(trigger=f't{i % 500}', source=rnd.choice(states), dest=rnd.choice(states),
+                        conditions='is_valid', before='prepare_order', after=['notify', 'persist'])
+                   for i in range(args.transitions)]
+
+    def configure():
+        return Machine(None, states=states, transitions=transitions, initial='s0')
+
+    data = configure().dump_definition()
+    results = {
+        'states': args.states,
+        'transitions': args.transitions,
+        'snapshot_bytes': len(data),
+        'configure_seconds': best_of(configure, args.repeat),
+        'load_definition_seconds': best_of(lambda: Machine.load_definition(data, None), args.repeat),
+    }
+    results['speedup'] = results['configure_seconds'] / results['load_definition_seconds']
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+""" Cost of persisting states through a SQLiteStore with and without write-behind batching.
+
+A population of models is triggered --events times while every state change is written to the store, once with a
+commit per transition (batch_size=1) and once with write-behind batching. Afterwards the states are restored into fresh
+models with add_models. Loading all states with one query is compared to one lookup per model.
+
+Usage:
+    python bench_state_store.py --models 10000 --events 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from machine import Machine  # noqa: E402
+from state_store import SQLiteStore  # noqa: E402
+
+
+class Model:
+
+    def __init__(self, key: int):
+        self.key = key
+
+
+def build(models: list[Model], store: SQLiteStore | None) -> Machine:
+    return Machine(models, states=['a', 'b', 'c'], initial='a', auto_transitions=False, state_store=store,
+                   transitions=[dict(trigger='next', source='a', dest='b'), dict(trigger='next', source='b', dest='c'),
+                                dict(trigger='next', source='c', dest='a')])
+
+
+def run(path: str, batch_size: int | None, models: int, events: int) -> dict:
+    population = [Model(i) for i in range(models)]
+    store = SQLiteStore(path, key=lambda model: model.key, batch_size=batch_size) if batch_size else None
+    build(population, store)
+    start = time.perf_counter()
+    for i in range(events):
+        population[i % models].next()
+    if store is None:
+        return {'trigger_seconds': time.perf_counter() - start}
+    store.flush()
+    result = {'trigger_seconds': time.perf_counter() - start}
+
+    fresh = [Model(i) for i in range(models)]
+    start = time.perf_counter()
+    build(fresh, store)
+    result['restore_bulk_seconds'] = time.perf_counter() - start
+    assert [model.state for model in fresh] == [model.state for model in population]
+    start = time.perf_counter()
+    store.load([model.key for model in fresh])
+    result['load_bulk_seconds'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for model in fresh:
+        store.get(model.key)
+    result['lookup_per_model_seconds'] = time.perf_counter() - start
+    store.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = {name: run(os.path.join(directory, f'{name}.db'), batch_size, args.models, args.events)
+                   for name, batch_size in (('none', None), ('write_through', 1), ('write_behind', 1000))}
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+""" Runs the benchmark suite with pyperf (pip install pyperf) for statistically robust, process isolated results.
+
+Usage:
+    python pyperf_suite.py -o results.json
+    python -m pyperf compare_to baseline.json results.json
+"""
+import pyperf
+
+from suite import BENCHMARKS, LARGE_BENCHMARKS
+
+
+def main():
+    runner = pyperf.Runner()
+    runner.argparser.add_argument('--full', action='store_true', help='include benchmarks with 10^6 models')
+    runner.argparser.add_argument('--filter', default='', help='only run benchmarks whose name contains this string')
+    args = runner.parse_args()
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name or (name in LARGE_BENCHMARKS and not args.full):
+            continue
+        runner.bench_func(name, setup())
+
+
+if __name__ == '__main__':
+    main()
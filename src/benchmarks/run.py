@@ -0,0 +1,76 @@
+""" Runs the benchmark suite with the standard library timer and emits the results as JSON.
+
+Every benchmark is calibrated to run for roughly 0.2 seconds per repetition. Timings are seconds per call; 'best' is the
+fastest repetition and is used to compare against a baseline. Benchmarks with more than 10^5 models are skipped unless
+--full is passed.
+
+Usage:
+    python run.py -o results.json
+    python run.py --filter trigger --compare baseline.json --threshold 1.2
+"""
+import argparse
+import json
+import statistics
+import sys
+import timeit
+
+from suite import BENCHMARKS, LARGE_BENCHMARKS, peak_memory
+
+
+def measure(func, repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    timings = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {'best': min(timings), 'mean': statistics.mean(timings),
+            'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0, 'loops': number}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """ Returns the names of all benchmarks which are slower than threshold times their baseline. """
+    regressions = []
+    for name, result in results['timings'].items():
+        reference = baseline.get('timings', {}).get(name)
+        if reference and result['best'] > reference['best'] * threshold:
+            regressions.append(f"{name}: {reference['best']:.3e}s -> {result['best']:.3e}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-o', '--output', help='write results to this file instead of stdout')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--full', action='store_true', help='include benchmarks with 10^6 models')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurements')
+    parser.add_argument('--compare', metavar='BASELINE', help='fail if a benchmark regressed against this file')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='allowed slowdown factor of the best timing when comparing (default: 1.1)')
+    args = parser.parse_args()
+
+    results = {'python': sys.version.split()[0], 'timings': {}}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name or (name in LARGE_BENCHMARKS and not args.full):
+            continue
+        results['timings'][name] = measure(setup(), args.repeat)
+        print(f"{name}: {results['timings'][name]['best']:.3e}s", file=sys.stderr)
+    if not args.no_memory:
+        results['peak_memory_bytes'] = peak_memory()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
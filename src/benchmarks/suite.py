@@ -0,0 +1,223 @@
+""" Benchmark definitions shared by run.py (standard library timer) and pyperf_suite.py (pyperf).
+
+Every benchmark is a setup function which builds its fixtures and returns the callable that is timed. Setup time is not
+measured unless construction itself is the subject of the benchmark.
+"""
+import itertools
+import os
+import sys
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'FSMS'))
+
+from hierarchical_machine import HierarchicalMachine  # noqa: E402
+from instrumented_machine import InstrumentedMachine  # noqa: E402
+from machine import Machine  # noqa: E402
+from template import MachineTemplate  # noqa: E402
+from timing_wheel import TimingWheel  # noqa: E402
+
+QUICK_SIZES = (10 ** 3, 10 ** 4, 10 ** 5)
+FULL_SIZES = QUICK_SIZES + (10 ** 6,)
+
+BENCHMARKS: dict[str, Callable[[], Callable[[], Any]]] = {}
+""" Benchmark names mapped to setup functions returning the callable to time. """
+
+LARGE_BENCHMARKS: set[str] = set()
+""" Benchmarks that are only run with --full. """
+
+
+def benchmark(name: str, large: bool = False):
+    def decorator(setup: Callable[[], Callable[[], Any]]):
+        BENCHMARKS[name] = setup
+        if large:
+            LARGE_BENCHMARKS.add(name)
+        return setup
+    return decorator
+
+
+class Model:
+
+    def __init__(self):
+        self.counter = 0
+
+    def passes(self):
+        return True
+
+    def fails(self):
+        return False
+
+    def increase(self):
+        self.counter += 1
+
+
+def _increase(model=None):
+    pass
+
+
+def _states(count: int) -> list[str]:
+    return [f's{i}' for i in range(count)]
+
+
+def _ring(count: int, **transition) -> list[dict]:
+    names = _states(count)
+    return [dict(trigger='next', source=names[i], dest=names[(i + 1) % count], **transition) for i in range(count)]
+
+
+def _register_construction(states: int, auto_transitions: bool, template: bool = False):
+    @benchmark(f'construction[states={states},auto={auto_transitions}{",template" if template else ""}]')
+    def setup():
+        names = _states(states)
+        transitions = _ring(states)
+        if template:
+            return partial(MachineTemplate(states=names, transitions=transitions, initial='s0',
+                                           auto_transitions=auto_transitions).create, None)
+        return lambda: Machine(None, states=names, transitions=transitions, initial='s0',
+                               auto_transitions=auto_transitions)
+
+
+for _count in (10, 100, 1000):
+    _register_construction(_count, auto_transitions=False)
+    _register_construction(_count, auto_transitions=True)
+    _register_construction(_count, auto_transitions=True, template=True)
+
+
+def _register_add_models(count: int, binding: str):
+    @benchmark(f'add_models[models={count},binding={binding}]', large=count > 10 ** 4)
+    def setup():
+        def run():
+            machine = Machine(None, states=_states(10), transitions=_ring(10), initial='s0', model_binding=binding)
+            machine.add_models(Model() for _ in range(count))
+        return run
+
+
+for _count in (10 ** 3, 10 ** 4, 10 ** 5):
+    _register_add_models(_count, 'instance')
+    _register_add_models(_count, 'class')
+    _register_add_models(_count, 'lazy')
+
+
+def _register_runtime_growth(count: int, binding: str):
+    @benchmark(f'add_transition_at_runtime[models={count},binding={binding}]')
+    def setup():
+        machine = Machine(None, states=_states(10), transitions=_ring(10), initial='s0', model_binding=binding)
+        machine.add_models(Model() for _ in range(count))
+        triggers = (f'grow{i}' for i in itertools.count())
+        return lambda: machine.add_transition(next(triggers), 's0', 's1')
+
+
+for _binding in ('instance', 'class', 'lazy'):
+    _register_runtime_growth(10 ** 4, _binding)
+
+
+def _register_trigger(name: str, frozen: bool, **transition):
+    @benchmark(f'trigger[{name},frozen={frozen}]')
+    def setup():
+        model = Model()
+        machine = Machine(model, states=_states(2), transitions=_ring(2, **transition), initial='s0')
+        if frozen:
+            machine.freeze()
+        return model.next
+
+
+for _frozen in (False, True):
+    _register_trigger('no_callbacks', _frozen)
+    _register_trigger('string_callbacks', _frozen, before='increase', after='increase')
+    _register_trigger('callable_callbacks', _frozen, before=_increase, after=_increase)
+    _register_trigger('conditions_pass', _frozen, conditions=['passes', 'passes'], unless='fails')
+
+
+@benchmark('trigger[conditions_fail]')
+def setup_conditions_fail():
+    model = Model()
+    Machine(model, states=_states(2), transitions=_ring(2, conditions='fails'), initial='s0')
+    return model.next
+
+
+@benchmark('trigger[string_callbacks,instrumented]')
+def setup_instrumented():
+    model = Model()
+    InstrumentedMachine(model, states=_states(2), transitions=_ring(2, before='increase', after='increase'),
+                        initial='s0')
+    return model.next
+
+
+@benchmark('trigger[timeout_states]')
+def setup_timeout_states():
+    model = Model()
+    states = [dict(name=name, timeout=60, timeout_trigger='next') for name in _states(2)]
+    Machine(model, states=states, transitions=_ring(2), initial='s0', timing_wheel=TimingWheel())
+    return model.next
+
+
+@benchmark('trigger[nested,bubbling]')
+def setup_nested():
+    model = Model()
+    states = ['s0', {'name': 'p', 'initial': 'q', 'children': [{'name': 'q', 'initial': 's1', 'children': ['s1']}]}]
+    HierarchicalMachine(model, states=states, transitions=[['next', 's0', 'p'], ['next', 'p', 's0']], initial='s0')
+    return model.next
+
+
+def _register_dispatch(count: int):
+    @benchmark(f'dispatch[models={count}]', large=count > QUICK_SIZES[-1])
+    def setup():
+        machine = Machine(None, states=_states(2), transitions=_ring(2), initial='s0', model_binding='class')
+        machine.add_models(Model() for _ in range(count))
+        return lambda: machine.dispatch('next')
+
+
+for _count in FULL_SIZES:
+    _register_dispatch(_count)
+
+
+def _register_batch(count: int, batched: bool):
+    @benchmark(f'{"apply_batch" if batched else "trigger_loop"}[events={count}]')
+    def setup():
+        models = [Model() for _ in range(1000)]
+        machine = Machine(models, states=_states(2), transitions=_ring(2, after='increase'), initial='s0')
+        events = [(models[i % len(models)], 'next') for i in range(count)]
+        if batched:
+            return lambda: sum(1 for _ in machine.apply_batch(events))
+
+        def run():
+            for model, trigger in events:
+                getattr(model, trigger)()
+        return run
+
+
+for _batched in (False, True):
+    _register_batch(10 ** 4, _batched)
+
+
+def _register_triggers_from(states: int):
+    @benchmark(f'triggers_from[states={states}]')
+    def setup():
+        machine = Machine(None, states=_states(states), transitions=_ring(states), initial='s0')
+        return lambda: machine.triggers_from('s0')
+
+
+for _count in (10, 100, 1000):
+    _register_triggers_from(_count)
+
+
+def peak_memory() -> dict[str, int]:
+    """ Peak traced memory in bytes while building reference configurations. """
+    import tracemalloc
+
+    def measure(func: Callable[[], Any]) -> int:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    return {
+        'machine[states=1000,auto=True]': measure(
+            lambda: Machine(None, states=_states(1000), transitions=_ring(1000), initial='s0')),
+        'models[count=100000,binding=instance]': measure(
+            lambda: Machine([Model() for _ in range(10 ** 5)], states=_states(10), initial='s0')),
+        'models[count=100000,binding=class]': measure(
+            lambda: Machine([Model() for _ in range(10 ** 5)], states=_states(10), initial='s0',
+                            model_binding='class')),
+    }
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from async_machine import AsyncMachine
+from batch import ERROR, OK, REJECTED
+
+
+class Device:
+
+    def __init__(self, key=0):
+        self.key = key
+        self.gate = None
+        self.log = []
+
+    async def wait_for_gate(self):
+        await self.gate.wait()
+        return True
+
+    async def on_enter_running(self):
+        self.log.append('running')
+        await self.finish()
+        self.log.append('after finish')
+
+    def on_enter_done(self):
+        self.log.append('done')
+
+    def fail(self):
+        raise RuntimeError('broken')
+
+
+STATES = ['idle', 'running', 'done', 'paused']
+
+
+def device_machine(models, transitions):
+    return AsyncMachine(models, states=STATES, transitions=transitions, initial='idle')
+
+
+def test_newer_transitions_cancel_waiting_triggers():
+    async def run():
+        device = Device()
+        device.gate = asyncio.Event()
+        device_machine(device, [['start', 'idle', 'running', 'wait_for_gate'], ['pause', 'idle', 'paused']])
+        waiting = asyncio.ensure_future(device.start())
+        await asyncio.sleep(0)
+        assert await device.pause()
+        assert await waiting is False
+        assert device.state == 'paused'
+    asyncio.run(run())
+
+
+def test_cancellation_from_outside_is_propagated():
+    async def run():
+        device = Device()
+        device.gate = asyncio.Event()
+        machine = device_machine(device, [['start', 'idle', 'running', 'wait_for_gate']])
+        waiting = asyncio.ensure_future(device.start())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert device.state == 'idle'
+        assert not machine.async_tasks
+    asyncio.run(run())
+
+
+def test_triggers_fired_from_callbacks_run_inline():
+    async def run():
+        device = Device()
+        machine = device_machine(device, [['start', 'idle', 'running'], ['finish', 'running', 'done']])
+        assert await device.start()
+        assert device.state == 'done'
+        # the nested trigger neither waits for nor cancels the task of the outer one
+        assert device.log == ['running', 'done', 'after finish']
+        assert not machine.async_tasks
+    asyncio.run(run())
+
+
+def test_apply_batch_reports_outcomes_in_order():
+    async def run():
+        devices = [Device(key) for key in range(3)]
+        machine = device_machine(devices, [['pause', 'idle', 'paused'], ['resume', 'paused', 'idle'],
+                                           ['crash', 'idle', 'done', None, None, 'fail']])
+        events = [(devices[0], 'pause'), (devices[1], 'resume'), (devices[0], 'resume'), (devices[2], 'crash'),
+                  (devices[1], 'pause')]
+        results = [result async for result in machine.apply_batch(events, batch_size=2)]
+        assert [(result.model.key, result.trigger, result.status) for result in results] == [
+            (0, 'pause', OK), (1, 'resume', REJECTED), (0, 'resume', OK), (2, 'crash', ERROR), (1, 'pause', OK)]
+        assert isinstance(results[3].error, RuntimeError)
+    asyncio.run(run())
+
+
+def test_dispatch_parallel_reports_results_per_model():
+    async def run():
+        devices = [Device(key) for key in range(5)]
+        machine = device_machine(devices, [['pause', 'idle', 'paused'], ['crash', 'paused', 'done', None, None,
+                                                                         'fail']])
+        await devices[3].to_paused()
+        results = [result async for result in machine.dispatch_parallel('pause', chunk_size=2)]
+        assert sorted(result.model.key for result in results) == list(range(5))
+        failed = [result for result in results if result.error is not None]
+        assert [result.model.key for result in failed] == [3]
+        assert all(result.result for result in results if result.error is None)
+        assert all(device.state == 'paused' for device in devices)
+        with pytest.raises(ValueError):
+            async for _ in machine.dispatch_parallel('crash', executor=object()):
+                pass
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import pickle
+
+import pytest
+
+from machine import Machine
+
+
+class Light:
+
+    def __init__(self, name='light'):
+        self.name = name
+
+
+class SlottedLight:
+    __slots__ = ('state',)
+
+
+@pytest.fixture(params=['class', 'lazy'])
+def binding(request):
+    return request.param
+
+
+def light_machine(models, binding, **kwargs):
+    return Machine(models, states=['off', 'on'], transitions=[['switch', 'off', 'on'], ['switch', 'on', 'off']],
+                   initial='off', model_binding=binding, **kwargs)
+
+
+def test_bound_models_pickle_as_their_original_class(binding):
+    light = Light()
+    machine = light_machine(light, binding)
+    light.switch()
+    copy = pickle.loads(pickle.dumps(light))
+    assert type(copy) is Light
+    assert copy.state == 'on'
+    assert not hasattr(copy, 'switch')
+
+    machine_copy = pickle.loads(pickle.dumps(machine))
+    model = machine_copy.models[0]
+    assert isinstance(model, Light)
+    assert model.is_on()
+    model.switch()
+    assert model.state == 'off'
+    assert light.state == 'on'
+
+
+def test_several_machines_bound_to_one_model(binding):
+    light, slotted = Light(), SlottedLight()
+    power = light_machine([light, slotted], binding)
+    brightness = Machine([light], states=['dim', 'bright'], transitions=[['brighten', 'dim', 'bright']],
+                         initial='dim', state_attribute='level', model_binding=binding)
+    light.switch()
+    light.brighten()
+    assert (light.state, light.level) == ('on', 'bright')
+    assert light.is_on() and light.is_level_bright()
+    assert light.trigger('switch') and light.state == 'off'
+
+    brightness.remove_models(light)
+    assert not hasattr(light, 'brighten')
+    light.switch()
+    assert light.is_on()
+    power.remove_models([light, slotted])
+    assert type(light) is Light
+    assert type(slotted) is SlottedLight
+    assert not hasattr(light, 'switch')
+
+
+def test_removing_models_restores_their_original_class(binding):
+    light, slotted = Light(), SlottedLight()
+    machine = light_machine([light, slotted], binding)
+    assert type(light) is not Light and isinstance(light, Light)
+    slotted.switch()
+    machine.remove_models([light, slotted])
+    assert type(light) is Light
+    assert type(slotted) is SlottedLight
+    assert slotted.state == 'on'
+
+
+def test_states_and_transitions_added_at_runtime_resolve_on_bound_models(binding):
+    light = Light()
+    machine = light_machine(light, binding)
+    if binding == 'lazy':
+        # nothing is resolved before the first access
+        assert 'switch' not in vars(light)
+    machine.add_states('broken')
+    machine.add_transition('break_down', ['off', 'on'], 'broken')
+    assert not light.is_broken()
+    light.break_down()
+    assert light.is_broken()
+    with pytest.raises(AttributeError):
+        light.repair()
@@ -0,0 +1,116 @@
+import pytest
+
+from exception import MachineError
+from hierarchical_machine import HierarchicalMachine
+
+
+class Job:
+
+    def __init__(self, ready=True):
+        self.ready = ready
+        self.log = []
+
+    def is_ready(self):
+        return self.ready
+
+
+def logged(states, log):
+    """ Returns state definitions which append 'enter <name>' and 'exit <name>' to log. Compound states are passed as
+    (name, children) tuples and start in their first child. """
+    definitions = []
+    for state in states:
+        name, children = state if isinstance(state, tuple) else (state, [])
+        definition = {'name': name, 'on_enter': lambda *args, n=name: log.append(f'enter {n}'),
+                      'on_exit': lambda *args, n=name: log.append(f'exit {n}')}
+        if children:
+            definition['children'] = logged(children, log)
+            definition['initial'] = definition['children'][0]['name']
+        definitions.append(definition)
+    return definitions
+
+
+@pytest.fixture
+def job():
+    return Job()
+
+
+def build(job, transitions, index_models=False):
+    # idle, busy > (loading > (reading, parsing), saving)
+    states = logged(['idle', ('busy', [('loading', ['reading', 'parsing']), 'saving'])], job.log)
+    return HierarchicalMachine(job, states=states, transitions=transitions, initial='idle', index_models=index_models)
+
+
+def test_transitions_exit_and_enter_every_level_below_the_common_ancestor(job):
+    build(job, [['start', 'idle', 'busy'], ['save', 'busy_loading_parsing', 'busy_saving'],
+                ['parse', 'busy_loading_reading', 'busy_loading_parsing'], ['cancel', 'busy', 'idle']])
+    job.start()
+    assert job.state == 'busy_loading_reading'
+    assert job.log == ['exit idle', 'enter busy', 'enter loading', 'enter reading']
+    job.log.clear()
+    job.parse()
+    assert job.log == ['exit reading', 'enter parsing']
+    job.log.clear()
+    job.save()
+    assert job.log == ['exit parsing', 'exit loading', 'enter saving']
+    job.log.clear()
+    job.cancel()
+    assert job.state == 'idle'
+    assert job.log == ['exit saving', 'exit busy', 'enter idle']
+
+
+def test_transitions_to_an_ancestor_exit_and_enter_it_again(job):
+    build(job, [['start', 'idle', 'busy'], ['parse', 'busy_loading_reading', 'busy_loading_parsing'],
+                ['restart', 'busy_loading', 'busy'], ['reload', 'busy_loading', 'busy_loading']])
+    job.start()
+    job.parse()
+    job.log.clear()
+    job.reload()
+    assert job.state == 'busy_loading_reading'
+    assert job.log == ['exit parsing', 'exit loading', 'enter loading', 'enter reading']
+    job.log.clear()
+    job.restart()
+    assert job.state == 'busy_loading_reading'
+    assert job.log == ['exit reading', 'exit loading', 'exit busy', 'enter busy', 'enter loading', 'enter reading']
+
+
+def test_models_start_in_the_initial_leaf_of_compound_states():
+    log = []
+    jobs = [Job(), Job()]
+    machine = HierarchicalMachine(None, states=logged(['idle', ('busy', [('loading', ['reading']), 'saving'])], log),
+                                  initial='busy')
+    machine.add_models(jobs[0])
+    machine.add_models(jobs[1], initial='busy_saving')
+    assert [job.state for job in jobs] == ['busy_loading_reading', 'busy_saving']
+    jobs[0].to_idle()
+    jobs[0].to_busy()
+    assert jobs[0].state == 'busy_loading_reading'
+
+
+def test_events_bubble_to_parents_when_conditions_of_children_fail(job):
+    build(job, [['start', 'idle', 'busy'], ['finish', 'busy_loading_reading', 'busy_saving', 'is_ready'],
+                ['finish', 'busy', 'idle']])
+    job.start()
+    job.ready = False
+    job.finish()
+    assert job.state == 'idle'
+    job.start()
+    job.ready = True
+    job.finish()
+    assert job.state == 'busy_saving'
+    with pytest.raises(MachineError):
+        build(Job(), [['finish', 'busy', 'idle']]).models[0].finish()
+
+
+@pytest.mark.parametrize('index_models', [False, True])
+def test_models_in_and_count_in_state_cover_descendants(index_models):
+    jobs = [Job() for _ in range(4)]
+    machine = build(jobs[0], [], index_models=index_models)
+    machine.add_models(jobs[1:])
+    jobs[1].to_busy()
+    jobs[2].to_busy_saving()
+    jobs[3].to_busy_loading_parsing()
+    assert machine.count_in_state('busy') == 3
+    assert machine.count_in_state('busy_loading') == 2
+    assert machine.count_in_state('idle') == 1
+    assert set(map(id, machine.models_in('busy_loading'))) == {id(jobs[1]), id(jobs[3])}
+    assert list(machine.models_in('busy_saving')) == [jobs[2]]
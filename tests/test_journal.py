@@ -0,0 +1,205 @@
+import threading
+import time
+
+import pytest
+
+from journal import FileBackend, Journal, MemoryBackend, MmapBackend
+from machine import Machine
+
+STATES = ['new', 'paid', 'shipped', 'done']
+TRANSITIONS = [['pay', 'new', 'paid'], ['ship', 'paid', 'shipped', None, None, None, 'finish_early'],
+               ['finish', 'shipped', 'done'], ['cancel', 'paid', 'new', 'is_refundable']]
+
+
+class Order:
+
+    def __init__(self, key, early=False):
+        self.key = key
+        self.early = early
+        self.amounts = []
+
+    def on_enter_paid(self, amount=0):
+        self.amounts.append(amount)
+
+    def is_refundable(self):
+        return False
+
+    def finish_early(self, *args):
+        if self.early:
+            self.finish()
+
+
+def machine(models, journal):
+    return Machine(models, states=STATES, transitions=TRANSITIONS, initial='new', journal=journal)
+
+
+@pytest.fixture(params=['memory', 'file', 'mmap'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return lambda: MemoryBackend()
+    if request.param == 'file':
+        return lambda: FileBackend(str(tmp_path / 'journal'), sync_every=1)
+    return lambda: MmapBackend(str(tmp_path / 'segments'), segment_size=256, sync_every=1)
+
+
+def record(backend):
+    orders = [Order(0), Order(1, early=True), Order(2)]
+    journal = Journal(backend, key=lambda order: order.key)
+    machine(orders, journal)
+    orders[0].pay(amount=5)
+    orders[1].pay(7)
+    orders[1].ship()
+    orders[0].cancel()
+    orders[2].pay()
+    journal.flush()
+    return journal
+
+
+def test_only_transitions_are_recorded(backend):
+    journal = record(backend())
+    entries = journal.entries()
+    assert [(entry.key, entry.trigger, entry.state) for entry in entries] == [
+        (0, 'pay', 'paid'), (1, 'pay', 'paid'), (1, 'ship', 'shipped'), (1, 'finish', 'done'), (2, 'pay', 'paid')]
+    assert entries[0].kwargs == {'amount': 5}
+    assert entries[1].args == (7,)
+    # the trigger fired from a callback has been numbered after the event which fired it
+    assert [entry.seq for entry in entries] == sorted(entry.seq for entry in entries)
+
+
+def test_replay_state_only(backend):
+    journal = record(backend())
+    orders = {key: Order(key) for key in range(3)}
+    assert journal.replay(machine(list(orders.values()), None), orders) == 5
+    assert [order.state for order in orders.values()] == ['paid', 'done', 'paid']
+    assert all(not order.amounts for order in orders.values())
+
+
+def test_replay_triggers_runs_callbacks_once(backend):
+    journal = record(backend())
+    orders = [Order(0), Order(1, early=True), Order(2)]
+    restored = machine(orders, None)
+    journal.replay(restored, state_only=False)
+    assert [order.state for order in orders] == ['paid', 'done', 'paid']
+    assert [order.amounts for order in orders] == [[5], [7], [0]]
+    assert 'process' not in restored.__dict__
+
+
+def test_replay_creates_missing_models_with_factory(backend):
+    journal = record(backend())
+    restored = machine([], None)
+    journal.replay(restored, factory=Order)
+    assert sorted((order.key, order.state) for order in restored.models) == [(0, 'paid'), (1, 'done'), (2, 'paid')]
+
+
+def test_replay_skips_unknown_models(backend):
+    journal = record(backend())
+    order = Order(1)
+    journal.replay(machine(order, None), {1: order})
+    assert order.state == 'done'
+
+
+def test_snapshot_compacts_entries_and_replay_continues_after_it(backend):
+    journal = record(backend())
+    orders = [Order(0), Order(1), Order(2)]
+    recorded = machine(orders, journal)
+    journal.replay(recorded)
+    journal.snapshot(recorded)
+    orders[2].ship()
+    journal.flush()
+
+    restored = {key: Order(key) for key in range(3)}
+    assert journal.replay(machine(list(restored.values()), None), restored) == 1
+    assert [order.state for order in restored.values()] == ['paid', 'done', 'shipped']
+
+
+def test_automatic_snapshots():
+    backend = MemoryBackend()
+    journal = Journal(backend, key=lambda order: order.key, snapshot_every=2)
+    orders = [Order(0), Order(1)]
+    machine(orders, journal)
+    orders[0].pay()
+    orders[1].pay()
+    assert backend.load_snapshot() == (2, {0: 'paid', 1: 'paid'})
+    assert not journal.entries()
+
+
+def test_file_journal_survives_restart_and_torn_entry(tmp_path):
+    path = str(tmp_path / 'journal')
+    record(FileBackend(path, sync_every=1)).close()
+    with open(path, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00partial')
+    journal = Journal(FileBackend(path), key=lambda order: order.key)
+    assert journal.seq == 6
+    assert len(journal.entries()) == 5
+    orders = {key: Order(key) for key in range(3)}
+    journal.replay(machine(list(orders.values()), None), orders)
+    assert [order.state for order in orders.values()] == ['paid', 'done', 'paid']
+    journal.close()
+
+
+def test_mmap_journal_spans_segments(tmp_path):
+    directory = str(tmp_path / 'segments')
+    backend = MmapBackend(directory, segment_size=128, sync_every=1)
+    journal = record(backend)
+    assert len(backend._segments()) > 1
+    journal.close()
+    reopened = Journal(MmapBackend(directory, segment_size=128), key=lambda order: order.key)
+    assert [entry.seq for entry in reopened.entries()] == [entry.seq for entry in journal.entries()]
+    reopened.close()
+
+
+def test_mmap_compaction_deletes_covered_segments(tmp_path):
+    backend = MmapBackend(str(tmp_path / 'segments'), segment_size=128, sync_every=1)
+    journal = record(backend)
+    orders = [Order(0), Order(1), Order(2)]
+    recorded = machine(orders, journal)
+    journal.replay(recorded)
+    segments = len(backend._segments())
+    seq = journal.snapshot(recorded)
+    assert len(backend._segments()) == 1 < segments
+    assert all(entry.seq <= seq for entry in journal.entries())
+    journal.close()
+
+
+def test_replay_keeps_processing_and_journaling_triggers_of_other_threads(backend):
+    journal = record(backend())
+    orders = [Order(0), Order(1, early=True), Order(2)]
+    other = Order(3)
+    restored = machine(orders + [other], journal)
+
+    def pay_other(amount=0):
+        # e.g. an expired timer which fires on the thread of a timing wheel driver while the journal is replayed
+        thread = threading.Thread(target=other.pay)
+        thread.start()
+        thread.join()
+
+    orders[2].on_enter_paid = pay_other
+    count = len(journal.entries())
+    journal.replay(restored, {order.key: order for order in orders}, state_only=False)
+    assert [order.state for order in orders] == ['paid', 'done', 'paid']
+    assert other.state == 'paid'
+    assert [(entry.key, entry.trigger) for entry in journal.entries()[count:]] == [(3, 'pay')]
+    # triggers of the replaying thread are processed again after the replay
+    orders[0].ship()
+    assert journal.entries()[-1].key == 0
+
+
+def test_file_journal_syncs_unsynced_entries_after_sync_interval(tmp_path):
+    backend = FileBackend(str(tmp_path / 'journal'), sync_every=100, sync_interval=0.05)
+    journal = Journal(backend, key=lambda order: order.key)
+    order = Order(0)
+    machine(order, journal)
+    order.pay()
+    assert backend._unsynced == 1
+    deadline = time.monotonic() + 5
+    while (backend._unsynced or backend._timer is not None) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend._unsynced == 0
+    assert backend._timer is None
+    order.ship()
+    assert backend._timer is not None
+    journal.close()
+    assert backend._timer is None
+    reopened = Journal(FileBackend(backend.path), key=lambda order: order.key)
+    assert [entry.trigger for entry in reopened.entries()] == ['pay', 'ship']
+    reopened.close()
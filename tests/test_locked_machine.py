@@ -0,0 +1,121 @@
+import threading
+import time
+
+from locked_machine import LockedMachine
+
+
+class Model:
+
+    def __init__(self):
+        self.active = 0
+        self.overlaps = 0
+        self.entered = 0
+
+    def on_enter_b(self):
+        self.active += 1
+        if self.active > 1:
+            self.overlaps += 1
+        time.sleep(0.01)
+        self.entered += 1
+        self.active -= 1
+
+
+def create(*models, **kwargs):
+    return LockedMachine(list(models), states=['a', 'b'], initial='a', auto_transitions=False,
+                         transitions=[['go', 'a', 'b'], ['go', 'b', 'b'], ['back', 'b', 'a']], **kwargs)
+
+
+def run(threads):
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+def test_events_of_a_model_are_serialized():
+    model = Model()
+    create(model)
+    run([threading.Thread(target=model.go) for _ in range(8)])
+    assert model.entered == 8
+    assert model.overlaps == 0
+
+
+def test_events_of_a_model_are_serialized_with_lock_stripes():
+    models = [Model() for _ in range(4)]
+    create(*models, lock_stripes=2)
+    run([threading.Thread(target=model.go) for model in models for _ in range(4)])
+    assert [model.entered for model in models] == [4] * 4
+    assert sum(model.overlaps for model in models) == 0
+
+
+def test_events_of_different_models_run_in_parallel():
+    started, released = threading.Event(), threading.Event()
+    results = []
+
+    class Waiting:
+
+        def on_enter_b(self):
+            started.set()
+            results.append(released.wait(5))
+
+    class Releasing:
+
+        def on_enter_b(self):
+            released.set()
+
+    first, second = Waiting(), Releasing()
+    create(first, second)
+    thread = threading.Thread(target=first.go)
+    thread.start()
+    assert started.wait(5)
+    second.go()
+    thread.join(5)
+    assert results == [True]
+
+
+def test_callbacks_may_trigger_the_same_model():
+
+    class Reentrant:
+
+        def __init__(self):
+            self.entered = 0
+
+        def on_enter_b(self):
+            self.entered += 1
+            self.back()
+
+    model = Reentrant()
+    create(model)
+    run([threading.Thread(target=model.go)])
+    assert model.entered == 1
+    assert model.state == 'a'
+
+
+def test_lock_stripes_are_used_evenly():
+    models = [Model() for _ in range(800)]
+    machine = create(*models, lock_stripes=8)
+    stripes = [machine._stripes.index(machine.get_lock(model)) for model in models]
+    assert all(60 <= stripes.count(stripe) <= 140 for stripe in range(8))
+
+
+def test_remove_models_drops_their_locks():
+    model = Model()
+    machine = create(model)
+    lock = machine.get_lock(model)
+    model.go()
+    assert machine._model_locks
+    machine.remove_models(model)
+    assert not machine._model_locks
+    assert lock.acquire(blocking=False)
+
+
+def test_contention_is_recorded():
+    model = Model()
+    machine = create(model)
+    run([threading.Thread(target=model.go) for _ in range(4)])
+    stats = machine.contention()
+    assert stats['contended'] >= 1
+    assert stats['max_wait_seconds'] > 0
+    machine.reset_contention()
+    assert machine.contention() == {'contended': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
@@ -0,0 +1,145 @@
+import pytest
+
+from batch import ERROR, OK, REJECTED
+from exception import MachineError
+from machine import Machine
+
+
+class Account:
+
+    def __init__(self, key=0):
+        self.key = key
+        self.log = []
+
+    def notify(self):
+        self.log.append('class')
+
+    def fail(self):
+        raise RuntimeError('broken')
+
+    def close_other(self, other=None):
+        # triggers an event which is invalid in the state of other
+        other.close()
+
+
+def notify_module():
+    pass
+
+
+STATES = ['open', 'frozen', 'closed']
+TRANSITIONS = [['freeze', 'open', 'frozen'], ['thaw', 'frozen', 'open'], ['close', 'open', 'closed']]
+
+
+def test_adding_states_and_transitions_invalidates_frozen_dispatch():
+    account = Account()
+    machine = Machine(account, states=STATES, transitions=TRANSITIONS, initial='open')
+    machine.freeze()
+    assert machine.frozen and machine._dispatch is not None
+    account.freeze()
+    machine.add_states('audited')
+    assert machine._dispatch is None
+    machine.add_transition('audit', 'frozen', 'audited', after='notify')
+    account.audit()
+    assert account.state == 'audited'
+    assert account.log == ['class']
+    assert machine._dispatch is not None
+    machine.after_state_change = 'notify'
+    assert machine._dispatch is None
+    account.to_open()
+    assert account.log == ['class', 'class']
+    machine.unfreeze()
+    assert not machine.frozen and machine._dispatch is None
+    assert account.freeze()
+
+
+def test_cached_callbacks_yield_to_instance_attributes_and_can_be_cleared():
+    Machine.clear_callable_cache()
+    account = Account()
+    Machine(account, states=STATES, transitions=TRANSITIONS, initial='open', after_state_change='notify')
+    account.freeze()
+    assert 'notify' in Machine._callable_cache[Account]
+    account.notify = lambda: account.log.append('instance')
+    account.thaw()
+    assert account.log == ['class', 'instance']
+
+    del account.notify
+    notify = Account.notify
+    Account.notify = lambda self: self.log.append('patched')
+    try:
+        # the class has been patched after its methods were cached
+        account.freeze()
+        assert account.log[-1] == 'class'
+        Machine.clear_callable_cache(Account)
+        assert Account not in Machine._callable_cache
+        account.thaw()
+        assert account.log[-1] == 'patched'
+    finally:
+        Account.notify = notify
+        Machine.clear_callable_cache(Account)
+
+    Machine.resolve_callable(f'{__name__}.notify_module', type('EventData', (), {'model': account})())
+    assert Machine._import_cache[f'{__name__}.notify_module'] is notify_module
+    Machine.clear_callable_cache()
+    assert not Machine._import_cache
+
+
+@pytest.mark.parametrize('frozen', [False, True])
+def test_batches_keep_the_order_of_events_per_model(frozen):
+    accounts = [Account(key) for key in range(3)]
+    machine = Machine(accounts, states=STATES, transitions=TRANSITIONS, initial='open')
+    if frozen:
+        machine.freeze()
+    events = [(accounts[0], 'freeze'), (accounts[1], 'close'), (accounts[0], 'thaw'), (accounts[2], 'thaw'),
+              (accounts[0], 'close'), (accounts[1], 'freeze'), (accounts[2], 'freeze', (), None)]
+    results = list(machine.apply_batch(events, batch_size=4))
+    assert [(result.model.key, result.trigger, result.status) for result in results] == [
+        (0, 'freeze', OK), (1, 'close', OK), (0, 'thaw', OK), (2, 'thaw', REJECTED), (0, 'close', OK),
+        (1, 'freeze', REJECTED), (2, 'freeze', OK)]
+    assert isinstance(results[3].error, MachineError)
+    assert [account.state for account in accounts] == ['closed', 'closed', 'frozen']
+    assert machine.frozen == frozen
+    assert (machine._dispatch is not None) == frozen
+
+
+@pytest.mark.parametrize('queued', [False, True])
+def test_batches_classify_errors_of_grouped_and_single_events_alike(queued):
+    # queued machines apply every event individually, others apply events with the same trigger and state in groups
+    accounts = [Account(key) for key in range(4)]
+    machine = Machine(accounts, states=STATES, initial='open', queued=queued,
+                      transitions=TRANSITIONS + [['fail', 'open', 'frozen', None, None, 'fail'],
+                                                 ['close_other', 'open', 'frozen', None, None, 'close_other']])
+    accounts[3].freeze()
+    events = [(accounts[0], 'close_other', (accounts[3],)), (accounts[1], 'fail'),
+              (accounts[2], 'close_other', (accounts[3],)), (accounts[1], 'unknown')]
+    results = list(machine.apply_batch(events))
+    assert [result.status for result in results] == [REJECTED, ERROR, REJECTED, ERROR]
+    assert isinstance(results[0].error, MachineError)
+    assert isinstance(results[1].error, RuntimeError)
+    assert isinstance(results[3].error, AttributeError)
+
+
+def test_batches_keep_transition_indexes_of_machines_that_are_not_frozen():
+    account = Account()
+    machine = Machine(account, states=STATES, transitions=TRANSITIONS, initial='open')
+    assert {'freeze', 'close'} <= set(machine.triggers_from('open'))
+    indexes = machine._indexes
+    assert [result.status for result in machine.apply_batch([(account, 'freeze')])] == [OK]
+    assert machine._dispatch is None
+    assert machine._indexes is indexes
+    machine.add_transition('close', 'frozen', 'closed')
+    assert machine._indexes is None
+    assert 'close' in machine.triggers_from('frozen')
+
+
+def test_may_trigger_calls_prepare_callbacks_only_on_request():
+    account = Account()
+    prepared = []
+    machine = Machine(account, states=STATES, initial='open', prepare_event=lambda: prepared.append('event'),
+                      transitions=[{'trigger': 'freeze', 'source': 'open', 'dest': 'frozen',
+                                    'prepare': lambda: prepared.append('transition')}])
+    assert machine.may_trigger(account, 'freeze')
+    assert prepared == []
+    assert machine.may_trigger(account, 'freeze', call_prepare=True)
+    assert prepared == ['event', 'transition']
+    assert not machine.may_trigger(account, 'thaw')
+    assert account.state == 'open'
@@ -0,0 +1,51 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from journal import Journal, MemoryBackend
+from locked_machine import LockedMachine
+from machine import Machine
+
+STATES = ['a', 'b']
+TRANSITIONS = [['go', 'a', 'b']]
+
+
+class Model:
+
+    def __init__(self, key):
+        self.key = key
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+def test_journaled_machines_can_be_pickled():
+    machine = Machine(states=STATES, initial='a', journal=Journal(MemoryBackend(), key=id))
+    assert pickle.loads(pickle.dumps(machine)).journal is None
+    assert machine.journal is not None
+
+
+def test_locked_machines_get_fresh_locks_when_unpickled():
+    machine = LockedMachine(Model(0), states=STATES, transitions=TRANSITIONS, initial='a')
+    copied = pickle.loads(pickle.dumps(machine))
+    assert copied.get_lock(copied.models[0]) is not machine.get_lock(machine.models[0])
+    copied.models[0].go()
+    assert copied.models[0].state == 'b'
+    assert machine.models[0].state == 'a'
+
+
+@pytest.mark.parametrize('machine_cls', [Machine, LockedMachine])
+def test_dispatch_parallel_in_processes(executor, machine_cls):
+    models = [Model(key) for key in range(10)]
+    journal = Journal(MemoryBackend(), key=lambda model: model.key)
+    machine = machine_cls(models, states=STATES, transitions=TRANSITIONS, initial='a', journal=journal)
+    results = list(machine.dispatch_parallel('go', executor=executor, chunk_size=3))
+    assert sorted(result.model.key for result in results if result.result) == list(range(10))
+    assert all(result.error is None for result in results)
+    assert [model.state for model in models] == ['b'] * 10
+    assert sorted((entry.key, entry.trigger, entry.state) for entry in journal.entries()) == \
+        [(key, 'go', 'b') for key in range(10)]
@@ -0,0 +1,102 @@
+import pytest
+
+from machine import Machine
+
+STATES = ['a', 'b', 'c']
+TRANSITIONS = [['go', 'a', 'b'], ['go', 'b', 'c'], ['go', 'c', 'a'], ['fail', 'a', 'b', None, None, 'boom']]
+
+
+class Model:
+
+    def __init__(self):
+        self.log = []
+
+    def on_enter_b(self):
+        self.log.append('enter b')
+        self.go()
+        self.log.append('left callback b')
+
+    def on_enter_c(self):
+        self.log.append('enter c')
+
+    def boom(self):
+        self.go()
+        raise RuntimeError('boom')
+
+
+@pytest.mark.parametrize('queued', [True, 'model'])
+def test_triggers_from_callbacks_run_after_the_current_one(queued):
+    model = Model()
+    machine = Machine(model, states=STATES, transitions=TRANSITIONS, initial='a', queued=queued)
+    assert model.go()
+    assert model.log == ['enter b', 'left callback b', 'enter c']
+    assert model.state == 'c'
+    assert not machine._transition_queue
+    assert not machine._model_queues
+
+
+def test_unqueued_triggers_from_callbacks_run_inline():
+    model = Model()
+    Machine(model, states=STATES, transitions=TRANSITIONS, initial='a')
+    model.go()
+    assert model.log == ['enter b', 'enter c', 'left callback b']
+
+
+def test_queue_drains_long_chains_without_recursion():
+
+    class Counter:
+
+        def __init__(self):
+            self.count = 0
+
+        def on_enter_b(self):
+            self.count += 1
+            if self.count < 5000:
+                self.next()
+
+    model = Counter()
+    Machine(model, states=['a', 'b'], initial='a', queued=True, transitions=[['next', 'a', 'b'], ['next', 'b', 'b']])
+    model.next()
+    assert model.count == 5000
+
+
+@pytest.mark.parametrize('queued', [True, 'model'])
+def test_queue_is_cleared_when_a_trigger_raises(queued):
+    model = Model()
+    machine = Machine(model, states=STATES, transitions=TRANSITIONS, initial='a', queued=queued)
+    with pytest.raises(RuntimeError):
+        model.fail()
+    assert model.state == 'a'
+    assert not machine._transition_queue
+    assert not machine._model_queues
+    assert model.go()
+    assert model.state == 'c'
+
+
+def test_model_queues_are_independent():
+
+    class Relay:
+
+        def __init__(self, name, log):
+            self.name = name
+            self.log = log
+            self.other = None
+
+        def on_enter_b(self):
+            self.log.append(f'{self.name} enter b')
+            if self.other is not None:
+                self.other.go()
+            self.log.append(f'{self.name} left callback b')
+
+    log = []
+    first, second = Relay('first', log), Relay('second', log)
+    first.other = second
+    Machine([first, second], states=STATES, transitions=TRANSITIONS, initial='a', queued='model')
+    first.go()
+    # the trigger of another model is not queued behind the running one
+    assert log == ['first enter b', 'second enter b', 'second left callback b', 'first left callback b']
+
+
+def test_unknown_queue_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Machine(states=STATES, queued='global')
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from machine import Machine
+from shared_states import SharedStateReader, SharedStateStore
+
+
+class Worker:
+
+    def __init__(self, slot):
+        self.slot = slot
+
+
+@pytest.fixture
+def store():
+    store = SharedStateStore(lambda model: model.slot, capacity=8, max_states=4, names_size=64)
+    yield store
+    store.unlink()
+
+
+def test_readers_see_states_and_counts(store):
+    machine = Machine(None, states=['idle', 'busy'], transitions=[['work', 'idle', 'busy']], initial='idle',
+                      state_store=store)
+    workers = [Worker(slot) for slot in range(3)]
+    machine.add_models(workers)
+    reader = SharedStateReader(store.name)
+    try:
+        workers[1].work()
+        assert reader.get_model_state(1) == 'busy'
+        assert reader.states()[:4] == ['idle', 'busy', 'idle', None]
+        assert reader.counts() == {'idle': 2, 'busy': 1}
+        store.clear(0)
+        assert reader.count_in_state('idle') == 1
+    finally:
+        reader.close()
+
+
+def test_reads_overlapping_a_write_are_retried(store):
+    store.set(0, 'idle')
+    reader = SharedStateReader(store.name, timeout=5)
+    try:
+        results = iter(['torn', 'consistent'])
+
+        def read():
+            # a write completes while the first attempt reads
+            result = next(results)
+            if result == 'torn':
+                store.set(1, 'busy')
+            return result
+
+        assert reader._read(read) == 'consistent'
+
+        # a write in progress blocks readers until it completes
+        store._seq[0] += 1
+        finish = threading.Timer(0.05, store._seq.__setitem__, (0, store._seq[0] + 1))
+        finish.start()
+        assert reader.get_model_state(1) == 'busy'
+        finish.join()
+    finally:
+        reader.close()
+
+
+def test_reads_give_up_when_a_write_does_not_complete(store):
+    reader = SharedStateReader(store.name, timeout=0.05)
+    try:
+        store._seq[0] += 1
+        with pytest.raises(TimeoutError):
+            reader.get_model_state(0)
+        store._seq[0] += 1
+        assert reader.get_model_state(0) is None
+    finally:
+        reader.close()
@@ -0,0 +1,67 @@
+import pytest
+
+import snapshot
+from machine import Machine
+
+
+class Door:
+
+    def __init__(self):
+        self.log = []
+        self.unlocked = True
+
+    def can_open(self):
+        return self.unlocked
+
+    def on_enter_open(self):
+        self.log.append('open')
+
+    def count(self):
+        self.log.append('count')
+
+
+def door_machine(model):
+    return Machine(model, states=['closed', 'open', {'name': 'ajar', 'timeout': 5, 'timeout_trigger': 'close'}],
+                   transitions=[{'trigger': 'open', 'source': 'closed', 'dest': 'open', 'conditions': 'can_open',
+                                 'after': 'count'},
+                                ['close', ['open', 'ajar'], 'closed'], ['nudge', 'closed', 'ajar']],
+                   initial='closed', name='door', before_state_change='count')
+
+
+def test_definitions_round_trip():
+    data = door_machine(None).dump_definition()
+    door = Door()
+    machine = Machine.load_definition(data, model=door)
+    assert list(machine.states) == ['closed', 'open', 'ajar']
+    assert machine.get_state('ajar').timeout == 5
+    assert machine.get_state('ajar').timeout_trigger == 'close'
+    assert machine.name == 'door: '
+    door.unlocked = False
+    assert not door.open()
+    door.unlocked = True
+    assert door.open()
+    assert door.log == ['count', 'open', 'count']
+    door.close()
+    door.to_ajar()
+    assert door.state == 'ajar'
+    # restored machines can be exported again
+    again = Machine.load_definition(machine.dump_definition(), model=None)
+    assert list(again.states) == list(machine.states)
+    assert {trigger: list(event.transitions) for trigger, event in again.events.items()} == \
+        {trigger: list(event.transitions) for trigger, event in machine.events.items()}
+
+
+@pytest.mark.parametrize('position', [0, 1, 2, 3])
+def test_snapshots_of_other_versions_are_rejected(position):
+    data = bytearray(door_machine(None).dump_definition())
+    data[position] ^= 0xFF
+    with pytest.raises(ValueError):
+        snapshot.loads(bytes(data))
+
+
+def test_truncated_snapshots_and_anonymous_callbacks_are_rejected():
+    with pytest.raises(ValueError):
+        snapshot.loads(b'\x03')
+    machine = Machine(None, states=['a', 'b'], transitions=[['go', 'a', 'b', lambda: True]], initial='a')
+    with pytest.raises(ValueError):
+        machine.dump_definition()
@@ -0,0 +1,100 @@
+import sqlite3
+import time
+
+import pytest
+
+from hierarchical_machine import HierarchicalMachine
+from machine import Machine
+from state_store import MemoryStore, SQLiteStore
+
+
+class Model:
+
+    def __init__(self, key):
+        self.key = key
+
+
+@pytest.mark.parametrize('frozen', [False, True])
+def test_models_without_state_load_it_from_the_store(frozen):
+    store = MemoryStore(lambda model: model.key)
+    machine = Machine(None, states=['a', 'b', 'c'], transitions=[['go', 'b', 'c']], initial='a', state_store=store)
+    if frozen:
+        machine.freeze()
+    model = Model(1)
+    machine.add_models(model, restore=False)
+    del model.state
+    store.set(1, 'b')
+    assert model.go()
+    assert model.state == 'c'
+    assert store.states[1] == 'c'
+
+
+def test_hierarchical_models_load_their_state_from_the_store():
+    store = MemoryStore(lambda model: model.key)
+    machine = HierarchicalMachine(None, states=['idle', {'name': 'busy', 'children': ['loading', 'saving']}],
+                                        transitions=[['cancel', 'busy', 'idle']], initial='idle', state_store=store)
+    model = Model(1)
+    machine.add_models(model, restore=False)
+    del model.state
+    store.set(1, 'busy_saving')
+    assert model.cancel()
+    assert model.state == 'idle'
+
+
+def test_apply_batch_loads_states_from_the_store():
+    store = MemoryStore(lambda model: model.key)
+    machine = Machine(None, states=['a', 'b', 'c'], transitions=[['go', 'b', 'c']], initial='a', state_store=store)
+    model = Model(1)
+    machine.add_models(model, restore=False)
+    del model.state
+    store.set(1, 'b')
+    assert [result.status for result in machine.apply_batch([(model, 'go')])] == ['ok']
+    assert model.state == 'c'
+
+
+def stored(path):
+    connection = sqlite3.connect(path)
+    try:
+        return dict(connection.execute("SELECT key, state FROM states"))
+    finally:
+        connection.close()
+
+
+def test_sqlite_store_writes_buffered_states_after_flush_interval(tmp_path):
+    path = str(tmp_path / 'states.db')
+    store = SQLiteStore(path, lambda model: model.key, flush_interval=0.05)
+    try:
+        machine = Machine(None, states=['a', 'b'], transitions=[['go', 'a', 'b']], initial='a', state_store=store)
+        model = Model(1)
+        machine.add_models(model)
+        model.go()
+        # reads see buffered states
+        assert store.load([1, 2]) == {1: 'b'}
+        deadline = time.monotonic() + 5
+        while stored(path) != {1: 'b'} and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert stored(path) == {1: 'b'}
+    finally:
+        store.close()
+
+
+def test_sqlite_store_writes_buffered_states_on_close_and_when_the_batch_is_full(tmp_path):
+    path = str(tmp_path / 'states.db')
+    store = SQLiteStore(path, lambda model: model.key, batch_size=3, flush_interval=60)
+    store.set(1, 'a')
+    store.set(1, 'b')
+    store.set(2, 'a')
+    assert stored(path) == {}
+    store.set(3, 'a')
+    assert stored(path) == {1: 'b', 2: 'a', 3: 'a'}
+    store.set(2, 'b')
+    store.close()
+    assert store._timer is None
+    assert stored(path) == {1: 'b', 2: 'b', 3: 'a'}
+
+    store = SQLiteStore(path, lambda model: model.key)
+    machine = Machine(None, states=['a', 'b'], initial='a', state_store=store)
+    models = [Model(key) for key in range(1, 5)]
+    machine.add_models(models)
+    assert [model.state for model in models] == ['b', 'b', 'a', 'a']
+    store.close()
@@ -0,0 +1,140 @@
+import pickle
+
+import pytest
+
+from machine import Machine
+from template import MachineTemplate
+
+STATES = ['new', 'paid', 'shipped']
+TRANSITIONS = [['pay', 'new', 'paid'], ['ship', 'paid', 'shipped']]
+
+
+class Order:
+
+    def __init__(self):
+        self.log = []
+
+
+class LoggingOrder(Order):
+
+    def on_enter_paid(self):
+        self.log.append('paid')
+
+
+@pytest.fixture
+def template():
+    return MachineTemplate(states=STATES, transitions=TRANSITIONS, initial='new')
+
+
+def test_instances_share_the_graph_of_the_template(template):
+    first, second = template.create(Order()), template.create(Order())
+    prototype = template._prototype
+    for machine in (first, second):
+        assert machine.states is prototype.states
+        assert machine._dispatch is prototype._dispatch
+        assert machine.events['pay'].transitions['new'][0] is prototype.events['pay'].transitions['new'][0]
+        assert machine.events['pay'] is not prototype.events['pay']
+
+
+def test_instances_trigger_independently(template):
+    first, second = Order(), Order()
+    template.create(first)
+    template.create(second)
+    first.pay()
+    assert first.state == 'paid'
+    assert second.state == 'new'
+    second.pay()
+    second.ship()
+    assert (first.state, second.state) == ('paid', 'shipped')
+
+
+def test_adding_transitions_copies_the_graph(template):
+    first, second = Order(), Order()
+    changed, shared = template.create(first), template.create(second)
+    changed.add_transition('refund', 'paid', 'new')
+    assert changed.states is not shared.states
+    assert changed.events['pay'].transitions['new'][0] is not shared.events['pay'].transitions['new'][0]
+    first.pay()
+    first.refund()
+    assert first.state == 'new'
+    assert 'refund' not in shared.events
+    assert 'refund' not in template._prototype.events
+    assert not hasattr(second, 'refund')
+    assert shared.states is template._prototype.states
+
+
+def test_adding_states_copies_the_graph(template):
+    machine = template.create(Order())
+    machine.add_states('returned')
+    assert 'returned' in machine.states
+    assert 'returned' not in template._prototype.states
+    assert 'returned' not in template.create(Order()).states
+
+
+def test_changing_machine_callbacks_copies_the_graph(template):
+    first, second = Order(), Order()
+    changed = template.create(first)
+    template.create(second)
+    changed.before_state_change = lambda: first.log.append('before')
+    assert changed.states is not template._prototype.states
+    first.pay()
+    second.pay()
+    assert first.log == ['before']
+    assert second.log == []
+
+
+def test_state_callbacks_of_model_classes_are_shared_per_class(template):
+    plain = template.create(Order())
+    first, second = LoggingOrder(), LoggingOrder()
+    machines = [template.create(first), template.create(second)]
+    assert plain.states is template._prototype.states
+    assert machines[0].states is machines[1].states
+    assert machines[0].states is not template._prototype.states
+    first.pay()
+    assert first.log == ['paid']
+    assert second.log == []
+    assert not template._prototype.get_state('paid').on_enter
+    assert template._conventions[LoggingOrder] == {('paid', 'on_enter')}
+
+    # a model with the methods joins the graph serving both kinds of models
+    mixed = template.create(Order())
+    mixed.add_models(LoggingOrder())
+    assert mixed.states is machines[0].states
+    mixed.models[-1].pay()
+    assert mixed.models[-1].log == ['paid']
+
+
+def test_state_callbacks_of_model_instances_copy_the_graph(template):
+    shared = template.create(LoggingOrder())
+    order = Order()
+    order.on_exit_new = lambda: order.log.append('left')
+    machine = template.create(order)
+    assert machine.states is not shared.states
+    assert machine.states is not template._prototype.states
+    order.pay()
+    assert order.log == ['left']
+    assert not shared.get_state('new').on_exit
+
+
+def test_machine_callbacks_passed_to_create_do_not_leak(template):
+    log = []
+    first, second = Order(), Order()
+    template.create(first, after_state_change=lambda: log.append('after'))
+    template.create(second)
+    first.pay()
+    second.pay()
+    assert log == ['after']
+
+
+def test_definition_cannot_be_overridden(template):
+    with pytest.raises(ValueError):
+        template.create(Order(), initial='paid')
+
+
+def test_instances_can_be_pickled(template):
+    machine = template.create(Order())
+    copied = pickle.loads(pickle.dumps(machine))
+    assert type(copied) is Machine
+    copied.models[0].pay()
+    assert copied.models[0].state == 'paid'
+    assert machine.models[0].state == 'new'
@@ -0,0 +1,176 @@
+import pytest
+
+from journal import Journal, MemoryBackend
+from machine import Machine
+from state_store import MemoryStore
+from timing_wheel import TimingWheel
+
+
+def collect(wheel, delays):
+    fired = []
+    timers = {delay: wheel.schedule(delay, lambda d=delay: fired.append((d, wheel._tick))) for delay in delays}
+    return fired, timers
+
+
+def test_timers_fire_at_their_deadline():
+    wheel = TimingWheel(resolution=1, slots=4, levels=2)
+    fired, _ = collect(wheel, [1, 3, 4, 5, 15])
+    assert len(wheel) == 5
+    for _ in range(15):
+        wheel.tick()
+    assert fired == [(1, 1), (3, 3), (4, 4), (5, 5), (15, 15)]
+    assert len(wheel) == 0
+
+
+def test_timers_cascade_through_all_levels():
+    wheel = TimingWheel(resolution=1, slots=4, levels=3)
+    delays = [2, 5, 17, 21, 63, 64]
+    fired, timers = collect(wheel, delays)
+    # every timer starts in the lowest level whose span covers its delay, 64 ticks exceed all levels
+    assert timers[2]._bucket is wheel._wheels[0][2]
+    assert timers[5]._bucket is wheel._wheels[1][1]
+    assert timers[17]._bucket is wheel._wheels[2][1]
+    assert timers[64]._bucket is wheel._overflow
+    for _ in range(16):
+        wheel.tick()
+    assert timers[17]._bucket is wheel._wheels[0][1]
+    for _ in range(64):
+        wheel.tick()
+    assert fired == [(delay, delay) for delay in delays]
+
+
+def test_ticking_in_one_call_fires_in_deadline_order():
+    wheel = TimingWheel(resolution=1, slots=4, levels=2)
+    fired, _ = collect(wheel, [9, 2, 30, 5])
+    assert wheel.tick(40) == 4
+    assert fired == [(2, 40), (5, 40), (9, 40), (30, 40)]
+    assert wheel.now == 40
+
+
+def test_delays_are_rounded_up_to_ticks():
+    wheel = TimingWheel(resolution=0.1)
+    fired = []
+    wheel.schedule(0.25, fired.append, 'a')
+    wheel.schedule(0, fired.append, 'b')
+    wheel.tick()
+    assert fired == ['b']
+    wheel.tick(2)
+    assert fired == ['b', 'a']
+
+
+def test_cancelled_timers_do_not_fire():
+    wheel = TimingWheel(resolution=1, slots=4, levels=2)
+    fired, timers = collect(wheel, [3, 6, 40])
+    assert timers[6].cancel()
+    assert not timers[6].cancel()
+    assert not timers[6].pending
+    wheel.tick(20)
+    assert timers[40].cancel()
+    wheel.tick(30)
+    assert fired == [(3, 20)]
+    assert not timers[3].cancel()
+    assert len(wheel) == 0
+
+
+def test_callbacks_may_schedule_and_cancel_timers():
+    wheel = TimingWheel(resolution=1, slots=4, levels=2)
+    fired = []
+    later = wheel.schedule(2, fired.append, 'cancelled')
+    wheel.schedule(1, lambda: (later.cancel(), wheel.schedule(1, fired.append, 'rescheduled')))
+    wheel.tick()
+    wheel.tick(2)
+    assert fired == ['rescheduled']
+
+
+def test_all_callbacks_run_before_the_first_error_is_raised():
+    wheel = TimingWheel(resolution=1)
+    fired = []
+
+    def fail(name):
+        raise RuntimeError(name)
+
+    wheel.schedule(1, fail, 'first')
+    wheel.schedule(1, fail, 'second')
+    wheel.schedule(1, fired.append, 'ok')
+    with pytest.raises(RuntimeError, match='first'):
+        wheel.tick()
+    assert fired == ['ok']
+
+
+def test_state_timeouts_are_cancelled_when_the_state_is_left():
+    wheel = TimingWheel(resolution=1)
+    model = Machine(states=['idle', {'name': 'waiting', 'timeout': 3, 'timeout_trigger': 'expire'}, 'expired'],
+                    transitions=[['wait', 'idle', 'waiting'], ['expire', 'waiting', 'expired'],
+                                 ['abort', 'waiting', 'idle']],
+                    initial='idle', timing_wheel=wheel)
+    model.wait()
+    model.abort()
+    assert len(wheel) == 0
+    model.wait()
+    wheel.tick(2)
+    assert model.state == 'waiting'
+    wheel.tick()
+    assert model.state == 'expired'
+
+
+def test_scheduled_triggers_pass_arguments():
+    wheel = TimingWheel(resolution=1)
+    received = []
+    machine = Machine(states=['a', 'b'], transitions=[['go', 'a', 'b', None, None, received.append]], initial='a',
+                      timing_wheel=wheel)
+    machine.schedule(machine, 'go', 2, 'payload')
+    wheel.tick(2)
+    assert machine.state == 'b'
+    assert received == ['payload']
+
+
+WAITING = ['idle', {'name': 'waiting', 'timeout': 3, 'timeout_trigger': 'expire'}, 'expired']
+
+
+class Item:
+
+    def __init__(self, key):
+        self.key = key
+
+
+def test_timeouts_start_for_models_added_or_restored_in_a_timeout_state():
+    wheel = TimingWheel(resolution=1)
+    store = MemoryStore(lambda model: model.key)
+    store.set('restored', 'waiting')
+    machine = Machine(None, states=WAITING, transitions=[['expire', 'waiting', 'expired']], initial='idle',
+                      timing_wheel=wheel, state_store=store)
+    added, restored, idle = Item('added'), Item('restored'), Item('idle')
+    machine.add_models(added, initial='waiting')
+    machine.add_models([restored, idle])
+    assert restored.state == 'waiting'
+    wheel.tick(3)
+    assert (added.state, restored.state, idle.state) == ('expired', 'expired', 'idle')
+
+
+def test_timeouts_start_when_states_are_assigned_outside_transitions():
+    wheel = TimingWheel(resolution=1)
+    machine = Machine(None, states=WAITING, transitions=[['expire', 'waiting', 'expired']], initial='idle',
+                      timing_wheel=wheel)
+    assigned, left, direct = Item('assigned'), Item('left'), Item('direct')
+    machine.add_models([assigned, left, direct])
+    machine.set_state([assigned, left], 'waiting')
+    machine.set_state(left, 'idle')
+    assert len(wheel) == 1
+    direct.state = 'waiting'
+    machine.arm_timeouts()
+    # already running timeouts are not started twice
+    machine.arm_timeouts(assigned)
+    assert len(wheel) == 2
+    wheel.tick(3)
+    assert (assigned.state, left.state, direct.state) == ('expired', 'idle', 'expired')
+
+    journal = Journal(MemoryBackend(), key=lambda model: model.key)
+    recorded = Machine(None, states=WAITING, transitions=[['wait', 'idle', 'waiting']], initial='idle',
+                       journal=journal)
+    recorded.add_models(Item('replayed'))
+    recorded.models[0].wait()
+    replayed = Item('replayed')
+    machine.add_models(replayed)
+    journal.replay(machine, {'replayed': replayed})
+    wheel.tick(3)
+    assert replayed.state == 'expired'
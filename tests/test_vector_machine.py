@@ -0,0 +1,27 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from exception import MachineError  # noqa: E402
+from vector_machine import VectorMachine  # noqa: E402
+
+
+def create():
+    return VectorMachine(4, states=['a', 'b', 'c'], initial='a', transitions=[['go', 'a', 'b'], ['go', 'b', 'c']])
+
+
+def test_dispatch_moves_all_models():
+    machine = create()
+    assert machine.dispatch('go').all()
+    assert machine.dispatch('go', mask=[0, 2]).all()
+    assert [machine.get_model_state(i).name for i in range(4)] == ['c', 'b', 'c', 'b']
+
+
+def test_unsupported_callbacks_keep_failing():
+    machine = create()
+    machine.dispatch('go')
+    machine.add_transition('jump', 'b', 'a', before='unsupported')
+    for _ in range(2):
+        with pytest.raises(MachineError):
+            machine.dispatch('jump')
+    assert machine._dispatch is None